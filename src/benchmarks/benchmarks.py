@@ -0,0 +1,223 @@
+import os
+import time
+import json
+import random
+import sqlite3
+import platform
+import numpy as np
+
+from features.draftstate import DraftState
+import features.experience_replay as er
+import features.match_processing as mp
+from features.state_encoding import pack_experience
+import data.database_ops as dbo
+
+PERCENTILES = [50, 90, 99]
+
+def time_function(fn, setup=None, n_warmup=10, n_repeat=100, ops_per_call=1):
+    """
+    Times repeated calls to fn after a number of untimed warmup calls.
+    Args:
+        fn (function): function to time
+        setup (function, optional): called before every call to fn (untimed). Its return value is passed as the arguments to fn.
+        n_warmup (int): number of untimed calls to make before timing
+        n_repeat (int): number of timed calls
+        ops_per_call (int): number of operations performed by each call to fn. Reported times are per operation.
+    Returns:
+        stats (dict): dictionary of per-operation timings (in seconds) with keys "n", "mean", "std", "min", "max" and
+            "p50", "p90", "p99"
+    """
+    timings = []
+    for k in range(n_warmup+n_repeat):
+        args = setup() if setup else ()
+        t0 = time.perf_counter()
+        fn(*args)
+        dt = time.perf_counter()-t0
+        if k >= n_warmup:
+            timings.append(dt/ops_per_call)
+    timings = np.array(timings)
+    stats = {"n":int(n_repeat*ops_per_call),
+             "mean":float(np.mean(timings)),
+             "std":float(np.std(timings)),
+             "min":float(np.min(timings)),
+             "max":float(np.max(timings))}
+    for (p, value) in zip(PERCENTILES, np.percentile(timings, PERCENTILES)):
+        stats["p{}".format(p)] = float(value)
+    return stats
+
+def load_matches(path_to_db, n_matches, seed=0):
+    """
+    Loads a fixed (seeded) sample of n_matches matches from the database so that runs are comparable.
+    """
+    conn = sqlite3.connect(path_to_db)
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM game ORDER BY id")
+    game_ids = [r[0] for r in cur.fetchall()]
+    conn.close()
+    game_ids = random.Random(seed).sample(game_ids, min(n_matches, len(game_ids)))
+    return dbo.get_matches_by_id(game_ids, path_to_db)
+
+def bench_draftstate(matches, n_repeat):
+    submissions = [list(mp.build_action_queue(match)) for match in matches]
+    template = DraftState(DraftState.BLUE_TEAM)
+
+    def replay(state, queue):
+        for (team, cid, pos) in queue:
+            if team != state.team and pos != -1:
+                pos = 0
+            state.update(cid, pos)
+
+    def fresh_draft():
+        state = template.copy()
+        state.reset()
+        return (state, random.choice(submissions))
+
+    def partial_draft():
+        (state, queue) = fresh_draft()
+        replay(state, queue[:random.randint(0, len(queue))])
+        return (state,)
+
+    results = {}
+    results["draftstate.update"] = time_function(replay, setup=fresh_draft, n_repeat=n_repeat, ops_per_call=20)
+    results["draftstate.evaluate"] = time_function(lambda state: state.evaluate(), setup=partial_draft, n_repeat=n_repeat)
+    results["draftstate.get_valid_actions"] = time_function(lambda state: state.get_valid_actions(), setup=partial_draft, n_repeat=n_repeat)
+    results["draftstate.format_state"] = time_function(lambda state: state.format_state(), setup=partial_draft, n_repeat=n_repeat)
+    return results
+
+def bench_process_match(matches, n_repeat):
+    def random_match():
+        return (random.choice(matches),)
+
+    results = {}
+    for augment_data in [False, True]:
+        suffix = "augmented" if augment_data else "plain"
+        results["process_match.{}".format(suffix)] = time_function(
+            lambda match: [mp.process_match(match, team, augment_data) for team in [DraftState.BLUE_TEAM, DraftState.RED_TEAM]],
+            setup=random_match, n_warmup=2, n_repeat=n_repeat)
+        results["process_match_dual.{}".format(suffix)] = time_function(
+            lambda match: mp.process_match_dual(match, augment_data), setup=random_match, n_warmup=2, n_repeat=n_repeat)
+    return results
+
+def bench_experience_buffer(matches, n_repeat, buffer_size=4096, batch_size=32):
+    experiences = []
+    for match in matches:
+        match_experiences = mp.process_match_dual(match, augment_data=False)
+        for team in [DraftState.BLUE_TEAM, DraftState.RED_TEAM]:
+            experiences.extend([pack_experience(exp) for exp in match_experiences[team] if exp[1][0] is not None])
+
+    replay = er.ExperienceBuffer(buffer_size)
+    while replay.get_buffer_size() < buffer_size:
+        replay.store(experiences)
+
+    results = {}
+    results["experience_buffer.store"] = time_function(lambda: replay.store(experiences), n_repeat=n_repeat, ops_per_call=len(experiences))
+    results["experience_buffer.sample_{}".format(batch_size)] = time_function(lambda: replay.sample(batch_size), n_repeat=n_repeat)
+    return results
+
+def bench_get_match_data(path_to_db, n_repeat):
+    conn = sqlite3.connect(path_to_db)
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM game ORDER BY id")
+    game_ids = [r[0] for r in cur.fetchall()]
+    results = {"get_match_data":time_function(lambda game_id: dbo.get_match_data(cur, game_id), setup=lambda: (random.choice(game_ids),), n_repeat=n_repeat)}
+    conn.close()
+    return results
+
+def bench_inference(matches, n_repeat, model_path=None, batch_sizes=(1,4,16,64,256,1024)):
+    """
+    Times QNetInferenceModel.predict at each batch size. If no model_path is given an untrained DDQN with the default
+    layer sizes is saved to tmp/benchmarks and loaded instead, which is sufficient to measure inference time.
+    """
+    import tensorflow as tf
+    from models import qNetwork
+    from models.inference_model import QNetInferenceModel
+
+    template = DraftState(DraftState.BLUE_TEAM)
+    if model_path is None:
+        model_path = "tmp/benchmarks/ddqn_benchmark"
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        tf.reset_default_graph()
+        ddqn = qNetwork.Qnetwork("ddqn", model_path, template.format_state().shape, template.num_actions, filter_sizes=(1024,1024))
+        ddqn.sess.run(ddqn.online_ops["init"])
+        ddqn.save(path="{}.ckpt".format(model_path))
+        del ddqn
+    tf.reset_default_graph()
+    model = QNetInferenceModel(name="infer", path=model_path)
+
+    states = []
+    for match in matches:
+        match_experiences = mp.process_match_dual(match, augment_data=False)
+        for team in [DraftState.BLUE_TEAM, DraftState.RED_TEAM]:
+            states.extend([exp[0] for exp in match_experiences[team]])
+
+    results = {}
+    for batch_size in batch_sizes:
+        batch = [states[k % len(states)] for k in range(batch_size)]
+        results["inference.predict_{}".format(batch_size)] = time_function(lambda: model.predict(batch), n_warmup=5, n_repeat=max(10, n_repeat//10))
+    return results
+
+def run(path_to_db="../data/competitiveMatchData.db", n_matches=100, n_repeat=200, include_inference=True, model_path=None, seed=0):
+    """
+    Runs the benchmark suite against the match database.
+    Args:
+        path_to_db (str): path to match database
+        n_matches (int): number of matches to sample from the database for the draft and match processing benchmarks
+        n_repeat (int): number of timed calls per benchmark
+        include_inference (bool): if True QNetInferenceModel.predict is benchmarked (requires tensorflow)
+        model_path (str, optional): path to saved DDQN model to benchmark inference with
+        seed (int): seed used to sample matches and inputs
+    Returns:
+        report (dict): dictionary with keys "meta" (description of the run) and "results" (mapping benchmark name to timing stats)
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    matches = load_matches(path_to_db, n_matches, seed)
+    results = {}
+    results.update(bench_draftstate(matches, n_repeat))
+    results.update(bench_process_match(matches, n_repeat))
+    results.update(bench_experience_buffer(matches, n_repeat))
+    results.update(bench_get_match_data(path_to_db, n_repeat))
+    if include_inference:
+        results.update(bench_inference(matches, n_repeat, model_path))
+
+    meta = {"time":time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python":platform.python_version(),
+            "numpy":np.__version__,
+            "machine":platform.machine(),
+            "n_matches":len(matches),
+            "n_repeat":n_repeat,
+            "seed":seed}
+    return {"meta":meta, "results":results}
+
+def compare(results, baseline, tolerance=0.1, stat="p50"):
+    """
+    Compares benchmark results against a baseline report.
+    Args:
+        results (dict): "results" dictionary returned by run()
+        baseline (dict): "results" dictionary of a previous run
+        tolerance (float): relative slowdown beyond which a benchmark is flagged as a regression
+        stat (str): timing statistic to compare
+    Returns:
+        comparison (dict): dictionary mapping each benchmark present in both runs to a dictionary with keys "baseline", "current",
+            "ratio" (current/baseline) and "regression" (True if ratio > 1+tolerance)
+    """
+    comparison = {}
+    for name in sorted(results.keys()):
+        if name not in baseline:
+            continue
+        old = baseline[name][stat]
+        new = results[name][stat]
+        ratio = new/old if old > 0 else float("inf")
+        comparison[name] = {"baseline":old, "current":new, "ratio":ratio, "regression":ratio > 1.+tolerance}
+    return comparison
+
+def save_report(report, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as outfile:
+        json.dump(report, outfile, indent=2, sort_keys=True)
+
+def load_report(path):
+    with open(path, 'r') as infile:
+        return json.load(infile)
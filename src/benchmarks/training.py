@@ -0,0 +1,101 @@
+import os
+import time
+import random
+import resource
+import numpy as np
+
+from profiler import StepProfiler
+from run_training import DEFAULT_CONFIG, build_trainer
+from benchmarks.benchmarks import load_matches
+
+PRESETS = {
+    # CPU-only preset using a small network which finishes in a few minutes
+    "small":{"filter_sizes":(128,128), "batch_size":16, "buffer_size":2048, "n_train":40, "n_val":5, "max_steps":2500},
+    # Matches the network and training parameters used by main.py
+    "full":{"filter_sizes":(1024,1024), "batch_size":16, "buffer_size":4096, "n_train":173, "n_val":20, "max_steps":10000},
+}
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the current process in MB.
+    """
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.
+
+def benchmark_config(trainer_type, preset, out_dir, seed=None):
+    """
+    Builds the training config (see run_training.DEFAULT_CONFIG) for a benchmark run using the parameters in preset.
+    Args:
+        trainer_type (str): either "ddqn" or "softmax"
+        preset (dict): preset parameters (see PRESETS)
+        out_dir (str): directory the model is saved in at the end of training
+        seed (int, optional): seed for the network's graph
+    Returns:
+        config (dict): training config
+    """
+    return dict(DEFAULT_CONFIG, model=trainer_type, name="{}_benchmark".format(trainer_type), run_dir=out_dir, n_epoch=1000,
+                n_train=preset["n_train"], n_val=preset["n_val"], batch_size=preset["batch_size"],
+                buffer_size=preset["buffer_size"], filter_sizes=list(preset["filter_sizes"]), seed=seed)
+
+def run_training_benchmark(trainer_type, preset_name="small", path_to_db="../data/competitiveMatchData.db", out_dir="tmp/benchmarks", seed=0, session_config=None):
+    """
+    Trains a network for a fixed number of steps on a fixed (seeded) subset of matches and reports training throughput.
+    Args:
+        trainer_type (str): either "ddqn" or "softmax"
+        preset_name (str): name of preset in PRESETS
+        path_to_db (str): path to match database
+        out_dir (str): directory that the model and phase profiles are written to
+        seed (int): seed used to select matches and seed Python/NumPy random number generators
+        session_config (dict, optional): keyword arguments to models.base_model.make_session_config
+    Returns:
+        report (dict): dictionary with keys:
+            "trainer", "preset": trainer type and preset parameters used
+            "elapsed": total wall time spent training (excluding trainer construction)
+            "setup_time": wall time spent building the network and trainer
+            "steps", "gradient_steps": number of training steps and minibatch updates taken
+            "experiences_per_sec": number of experiences consumed by minibatch updates per second
+            "gradient_steps_per_sec": minibatch updates per second
+            "peak_rss_mb": peak resident memory of the process
+            "phases": total time spent in each profiled phase over all epochs
+    """
+    preset = PRESETS[preset_name]
+    random.seed(seed)
+    np.random.seed(seed)
+    matches = load_matches(path_to_db, preset["n_train"]+preset["n_val"], seed)
+    training_matches = matches[:preset["n_train"]]
+    validation_matches = matches[preset["n_train"]:]
+
+    profiler = StepProfiler(out_dir=os.path.join(out_dir, "profile_{}_{}".format(trainer_type, preset_name)))
+    t0 = time.perf_counter()
+    config = benchmark_config(trainer_type, preset, out_dir, seed)
+    trainer = build_trainer(config, training_matches, validation_matches, session_config=session_config, profiler=profiler,
+                            max_steps=preset["max_steps"])
+    if trainer_type == "ddqn":
+        # Only train on the fixed match subset
+        trainer.N_TEMP_TRAIN_MATCHES = 0
+    setup_time = time.perf_counter()-t0
+
+    t0 = time.perf_counter()
+    trainer.train()
+    elapsed = time.perf_counter()-t0
+
+    phases = {}
+    for epoch_report in profiler.history:
+        for name, stats in epoch_report["phases"].items():
+            if name not in phases:
+                phases[name] = {"count":0, "total":0.}
+            phases[name]["count"] += stats["count"]
+            phases[name]["total"] += stats["total"]
+    gradient_steps = phases["update"]["count"] if "update" in phases else 0
+    return {"trainer":trainer_type,
+            "preset":dict(preset, name=preset_name),
+            "seed":seed,
+            "session_config":session_config,
+            "elapsed":elapsed,
+            "setup_time":setup_time,
+            "steps":trainer.step_count,
+            "gradient_steps":gradient_steps,
+            "experiences_per_sec":gradient_steps*preset["batch_size"]/elapsed,
+            "gradient_steps_per_sec":gradient_steps/elapsed,
+            "peak_rss_mb":peak_rss_mb(),
+            "phases":phases}
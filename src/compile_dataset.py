@@ -0,0 +1,39 @@
+import luigi
+import json
+
+import data.database_ops as dbo
+from features.compiled_dataset import compile_dataset
+
+class CompileDataset(luigi.Task):
+    """
+    Processes every match in one side of a training/validation split into experiences and writes them to a compiled dataset
+    which trainers can open without touching the match database.
+    """
+    path_to_db = luigi.Parameter(default="../data/competitiveMatchData.db")
+    split_path = luigi.Parameter(default="../data/test_train_split.txt")
+    split = luigi.Parameter(default="training")
+    out_dir = luigi.Parameter(default="../data")
+
+    def output(self):
+        return luigi.LocalTarget("{}/{}_experiences.bin".format(self.out_dir, self.split))
+
+    def run(self):
+        with open(self.split_path, 'r') as infile:
+            data = json.load(infile)
+        match_ids = data["{}_ids".format(self.split)]
+        matches = dbo.get_matches_by_id(match_ids, self.path_to_db)
+        print("Compiling {} {} matches to {}..".format(len(matches), self.split, self.output().path))
+        header = compile_dataset(matches, self.output().path)
+        print("Wrote {} experiences ({} null actions skipped).".format(header["num_experiences"], header["null_actions"]))
+
+class CompileSplit(luigi.WrapperTask):
+    path_to_db = luigi.Parameter(default="../data/competitiveMatchData.db")
+    split_path = luigi.Parameter(default="../data/test_train_split.txt")
+    out_dir = luigi.Parameter(default="../data")
+
+    def requires(self):
+        for split in ["training", "validation"]:
+            yield CompileDataset(path_to_db=self.path_to_db, split_path=self.split_path, split=split, out_dir=self.out_dir)
+
+if __name__ == "__main__":
+    luigi.run(['CompileSplit', "--local-scheduler"])
@@ -0,0 +1,226 @@
+import sqlite3
+import pickle
+
+from .database_ops import get_match_data
+
+BLUE_SIDE = 0
+RED_SIDE = 1
+SIDES = (BLUE_SIDE, RED_SIDE)
+# Role used for bans (matching DraftState's ban position)
+BAN = -1
+POSITIONS = (1, 2, 3, 4, 5)
+
+def popcount(bitmap):
+    """
+    Returns the number of set bits in bitmap.
+    """
+    return bin(bitmap).count("1")
+
+class ChampionIndex(object):
+    """
+    ChampionIndex is an inverted index mapping each (champion, role, side) submission to the bitmap of games it appears in.
+    Games are numbered densely in the order they are added to the index and each bitmap is a Python integer with bit k set
+    if the kth game contains the submission, so composition queries reduce to bitwise intersections and counts to popcounts.
+
+    Roles are either a position (1-5) for picks or BAN for bans. Sides are 0 (blue) and 1 (red). A query term is a tuple
+    (champion_id, role, side) where role may also be "pick" (any position) or "any" (picked or banned) and side may be None
+    (either side), ie "games where blue banned 22 and mid (position 2) was played by 7 on either side":
+
+        index = ChampionIndex.from_db(path_to_db)
+        games = index.select([(22, BAN, BLUE_SIDE), (7, 2, None)])
+        index.ids(games), index.aggregate(games)
+
+    The index is updated incrementally with add_match() or update(), so it can be kept in sync with the database as new
+    games are ingested.
+    """
+    def __init__(self):
+        self.game_ids = []
+        self._bit_of_id = {}
+        self.bitmaps = {}
+        self.all_games = 0
+        self.wins = {BLUE_SIDE:0, RED_SIDE:0}
+
+    def __len__(self):
+        return len(self.game_ids)
+
+    def __contains__(self, game_id):
+        return game_id in self._bit_of_id
+
+    @classmethod
+    def from_db(cls, path_to_db):
+        """
+        Builds an index over every game in the database at path_to_db.
+        """
+        index = cls()
+        conn = sqlite3.connect(path_to_db)
+        index.update(conn.cursor())
+        conn.close()
+        return index
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as infile:
+            return pickle.load(infile)
+
+    def save(self, path):
+        with open(path, 'wb') as outfile:
+            pickle.dump(self, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _add(self, game_id, winner, submissions):
+        if game_id in self._bit_of_id:
+            return False
+        self._bit_of_id[game_id] = len(self.game_ids)
+        bit = 1 << len(self.game_ids)
+        self.game_ids.append(game_id)
+        self.all_games |= bit
+        if winner in self.wins:
+            self.wins[winner] |= bit
+        for key in submissions:
+            self.bitmaps[key] = self.bitmaps.get(key, 0) | bit
+        return True
+
+    def add_match(self, match):
+        """
+        Adds a game to the index. Games which are already indexed are ignored.
+        Args:
+            match (dict): match data as returned by data.database_ops.get_match_data()
+        Returns:
+            added (bool): True if the game was added to the index
+        """
+        submissions = []
+        for side, side_name in zip(SIDES, ["blue", "red"]):
+            submissions.extend((cid, BAN, side) for (cid, _) in match[side_name]["bans"] if cid is not None)
+            submissions.extend((cid, pos, side) for (cid, pos, _) in match[side_name]["picks"] if cid is not None)
+        return self._add(match["id"], match["winner"], submissions)
+
+    def update(self, cursor):
+        """
+        Adds every game in the connected database which is not yet indexed. Games are read with a few bulk queries so this
+        is also used to build the index from scratch.
+        Args:
+            cursor (sqlite cursor): cursor used to execute commands
+        Returns:
+            n_added (int): number of games added to the index
+        """
+        cursor.execute("SELECT id, winning_team FROM game ORDER BY id")
+        games = [(game_id, winner) for (game_id, winner) in cursor.fetchall() if game_id not in self._bit_of_id]
+        if not games:
+            return 0
+        min_id = games[0][0]
+        submissions = {game_id:[] for (game_id, _) in games}
+        cursor.execute("SELECT game_id, champion_id, side_id FROM ban WHERE game_id >= ? AND champion_id IS NOT NULL", (min_id,))
+        for (game_id, cid, side) in cursor.fetchall():
+            if game_id in submissions:
+                submissions[game_id].append((cid, BAN, side))
+        cursor.execute("SELECT game_id, champion_id, position_id, side_id FROM pick WHERE game_id >= ? AND champion_id IS NOT NULL", (min_id,))
+        for (game_id, cid, pos, side) in cursor.fetchall():
+            if game_id in submissions:
+                submissions[game_id].append((cid, pos, side))
+        for (game_id, winner) in games:
+            self._add(game_id, winner, submissions[game_id])
+        return len(games)
+
+    def add_games(self, cursor, game_ids):
+        """
+        Adds the games with the given ids from the connected database to the index.
+        """
+        return sum(self.add_match(get_match_data(cursor, game_id)) for game_id in game_ids)
+
+    def bitmap(self, champion_id, role="pick", side=None):
+        """
+        Returns the bitmap of games containing the submission (champion_id, role, side) (see class docstring for the
+        meaning of role and side).
+        """
+        if role == "pick":
+            roles = POSITIONS
+        elif role == "any":
+            roles = POSITIONS+(BAN,)
+        else:
+            roles = (role,)
+        sides = SIDES if side is None else (side,)
+        bitmap = 0
+        for r in roles:
+            for s in sides:
+                bitmap |= self.bitmaps.get((champion_id, r, s), 0)
+        return bitmap
+
+    def select(self, terms):
+        """
+        Returns the bitmap of games which contain every submission in terms.
+        Args:
+            terms (list(tuple)): list of (champion_id, role, side) query terms
+        Returns:
+            bitmap (int): bitmap of matching games
+        """
+        bitmap = self.all_games
+        for term in terms:
+            bitmap &= self.bitmap(*term)
+            if not bitmap:
+                break
+        return bitmap
+
+    def ids(self, bitmap):
+        """
+        Returns the database ids of the games in bitmap.
+        """
+        ids = []
+        k = 0
+        while bitmap:
+            word = bitmap & 0xFFFFFFFFFFFFFFFF
+            while word:
+                low = word & -word
+                ids.append(self.game_ids[k+low.bit_length()-1])
+                word ^= low
+            bitmap >>= 64
+            k += 64
+        return ids
+
+    def bitmap_of(self, game_ids):
+        """
+        Returns the bitmap holding the given (indexed) games.
+        """
+        bitmap = 0
+        for game_id in game_ids:
+            bitmap |= 1 << self._bit_of_id[game_id]
+        return bitmap
+
+    def count(self, bitmap):
+        return popcount(bitmap)
+
+    def aggregate(self, bitmap, side=None):
+        """
+        Summarizes the outcomes of the games in bitmap.
+        Args:
+            bitmap (int): bitmap of games
+            side (int, optional): if given the win rate is computed for this side, otherwise for blue side
+        Returns:
+            summary (dict): dictionary with keys "count", "blue_wins", "red_wins", "wins" and "win_rate"
+        """
+        count = popcount(bitmap)
+        blue_wins = popcount(bitmap & self.wins[BLUE_SIDE])
+        red_wins = popcount(bitmap & self.wins[RED_SIDE])
+        wins = red_wins if side == RED_SIDE else blue_wins
+        return {"count":count, "blue_wins":blue_wins, "red_wins":red_wins, "wins":wins,
+                "win_rate":wins/count if count else None}
+
+    def champion_summary(self, champion_id, role="pick", within=None):
+        """
+        Summarizes the games where champion_id was submitted with the given role by either side. Wins are counted for the
+        team that made the submission.
+        Args:
+            champion_id (int): champion id
+            role (int or str): position, BAN, "pick" or "any"
+            within (int, optional): bitmap of games to restrict the summary to (ie the result of select())
+        Returns:
+            summary (dict): dictionary with keys "count", "wins" and "win_rate"
+        """
+        if within is None:
+            within = self.all_games
+        games = 0
+        wins = 0
+        for side in SIDES:
+            side_games = self.bitmap(champion_id, role, side) & within
+            games |= side_games
+            wins += popcount(side_games & self.wins[side])
+        count = popcount(games)
+        return {"count":count, "wins":wins, "win_rate":wins/count if count else None}
@@ -271,7 +271,7 @@ def insert_team(cursor, gameData):
     status = 1
     return status
 
-def insert_ban(cursor, gameData):
+def insert_ban(cursor, gameData, stats=None):
     """
     insert_ban attempts to format collected gameData from query_wiki() and insert into the
     ban table in the competitiveGameData.db.
@@ -279,6 +279,7 @@ def insert_ban(cursor, gameData):
     Args:
         cursor (sqlite cursor): cursor used to execute commmands
         gameData (list(dict)): dictionary output from query_wiki()
+        stats (DraftStatistics, optional): statistics updated with the bans of each inserted game
     Returns:
         status (int): status = 1 if insert was successful, otherwise status = 0
     """
@@ -295,6 +296,7 @@ def insert_ban(cursor, gameData):
         if result is not None:
             print("Bans for game {} already exists in table.. skipping".format(result[0]))
         else:
+            inserted = []
             for k in range(len(teams)):
                 bans = game["bans"][teams[k]]
                 selectionOrder = 0
@@ -312,10 +314,13 @@ def insert_ban(cursor, gameData):
                     selectionOrder += 1
                     vals = (gameId,banId,selectionOrder,side)
                     cursor.execute("INSERT INTO ban(game_id, champion_id, selection_order, side_id) VALUES(?,?,?,?)", vals)
+                    inserted.append((banId,side))
+            if stats is not None:
+                stats.record_bans(gameId, game["patch"], regionsDict[game["region"]], game["winning_team"], inserted)
     status = 1
     return status
 
-def insert_pick(cursor, gameData):
+def insert_pick(cursor, gameData, stats=None):
     """
     insert_pick formats collected gameData from query_wiki() and inserts it into the pick table of the
     competitiveGameData.db.
@@ -323,6 +328,7 @@ def insert_pick(cursor, gameData):
     Args:
         cursor (sqlite cursor): cursor used to execute commmands
         gameData (list(dict)): list of formatted game data from query_wiki()
+        stats (DraftStatistics, optional): statistics updated with the picks of each inserted game
     Returns:
         status (int): status = 1 if insert was successful, otherwise status = 0
     """
@@ -339,6 +345,7 @@ def insert_pick(cursor, gameData):
         if result is not None:
             print("Picks for game {} already exists in table.. skipping".format(result[0]))
         else:
+            inserted = []
             for k in range(len(teams)):
                 picks = game["picks"][teams[k]]
                 selectionOrder = 0
@@ -356,5 +363,8 @@ def insert_pick(cursor, gameData):
                     selectionOrder += 1
                     vals = (gameId,pickId,position,selectionOrder,side)
                     cursor.execute("INSERT INTO pick(game_id, champion_id, position_id, selection_order, side_id) VALUES(?,?,?,?,?)", vals)
+                    inserted.append((pickId,position,side))
+            if stats is not None:
+                stats.record_picks(gameId, game["patch"], regionsDict[game["region"]], game["winning_team"], inserted)
     status = 1
     return status
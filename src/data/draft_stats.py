@@ -0,0 +1,197 @@
+import sqlite3
+import pickle
+from collections import deque
+
+import pandas as pd
+
+PICKS = "picks"
+BANS = "bans"
+
+class _Aggregates(object):
+    """
+    Pick and ban counts at the finest granularity tracked (patch, region, champion, position/side). Coarser statistics are
+    rolled up from these when a table is requested.
+    """
+    def __init__(self):
+        # (patch, region) -> number of games recorded
+        self.games = {PICKS:{}, BANS:{}}
+        # (patch, region, champion_id, position, side) -> [picks, wins]
+        self.picks = {}
+        # (patch, region, champion_id, side) -> bans
+        self.bans = {}
+
+    def add(self, kind, record, sign=1):
+        (patch, region, winner, submissions) = record
+        key = (patch, region)
+        self.games[kind][key] = self.games[kind].get(key, 0)+sign
+        if kind == PICKS:
+            for (cid, pos, side) in submissions:
+                counts = self.picks.setdefault((patch, region, cid, pos, side), [0, 0])
+                counts[0] += sign
+                counts[1] += sign*(side == winner)
+        else:
+            for (cid, side) in submissions:
+                key = (patch, region, cid, side)
+                self.bans[key] = self.bans.get(key, 0)+sign
+
+class DraftStatistics(object):
+    """
+    DraftStatistics maintains pick/ban aggregates for every game ingested into the database and, optionally, over rolling
+    windows of the most recently ingested games. Aggregates are updated as games are recorded (see the stats argument of
+    data.database_ops.insert_pick() and insert_ban()) so statistics never require a scan over the matches.
+
+    Statistics are reported by table(), which rolls the aggregates up to the requested grouping and computes
+        pick_rate = picks/games, ban_rate = bans/games, presence = pick_rate+ban_rate, win_rate = wins/picks
+    Args:
+        windows (tuple(int)): sizes of rolling windows (in games) to maintain in addition to the all-time aggregates
+    """
+    def __init__(self, windows=()):
+        self.totals = _Aggregates()
+        self.windows = {size:_Aggregates() for size in windows}
+        self._recent = {size:{PICKS:deque(), BANS:deque()} for size in windows}
+        self._recorded = {PICKS:set(), BANS:set()}
+
+    @classmethod
+    def from_db(cls, path_to_db, windows=()):
+        """
+        Builds statistics for every game in the database, recording games in id order.
+        """
+        stats = cls(windows)
+        conn = sqlite3.connect(path_to_db)
+        stats.update(conn.cursor())
+        conn.close()
+        return stats
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as infile:
+            return pickle.load(infile)
+
+    def save(self, path):
+        with open(path, 'wb') as outfile:
+            pickle.dump(self, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def recorded_ids(self):
+        """
+        Returns the set of game ids whose picks or bans have been recorded.
+        """
+        return self._recorded[PICKS] | self._recorded[BANS]
+
+    def _record(self, kind, game_id, patch, region, winner, submissions):
+        if game_id in self._recorded[kind]:
+            return False
+        self._recorded[kind].add(game_id)
+        record = (patch, region, winner, submissions)
+        self.totals.add(kind, record)
+        for size, aggregates in self.windows.items():
+            recent = self._recent[size][kind]
+            recent.append(record)
+            aggregates.add(kind, record)
+            if len(recent) > size:
+                aggregates.add(kind, recent.popleft(), sign=-1)
+        return True
+
+    def record_picks(self, game_id, patch, region, winner, picks):
+        """
+        Records the picks submitted in a game. Games which have already been recorded are ignored.
+        Args:
+            game_id (int): id of game in game table
+            patch (str): patch the game was played on
+            region (str): region abbreviation of the game's tournament (ie "NA")
+            winner (int): winning side (0 = blue, 1 = red)
+            picks (list(tuple)): list of (champion_id, position_id, side_id) picks. Null picks (champion_id = None) are skipped.
+        Returns:
+            recorded (bool): True if the game was recorded
+        """
+        picks = [(cid, pos, side) for (cid, pos, side) in picks if cid is not None]
+        return self._record(PICKS, game_id, patch, region, winner, picks)
+
+    def record_bans(self, game_id, patch, region, winner, bans):
+        """
+        Records the bans submitted in a game (see record_picks()).
+        Args:
+            bans (list(tuple)): list of (champion_id, side_id) bans. Null bans (champion_id = None) are skipped.
+        """
+        bans = [(cid, side) for (cid, side) in bans if cid is not None]
+        return self._record(BANS, game_id, patch, region, winner, bans)
+
+    def update(self, cursor):
+        """
+        Records the picks and bans of every game in the connected database which has not yet been recorded.
+        Args:
+            cursor (sqlite cursor): cursor used to execute commands
+        Returns:
+            None
+        """
+        cursor.execute("SELECT id, tournament, patch, winning_team FROM game ORDER BY id")
+        games = cursor.fetchall()
+        for (kind, query) in [(BANS, "SELECT game_id, champion_id, side_id FROM ban"),
+                              (PICKS, "SELECT game_id, champion_id, position_id, side_id FROM pick")]:
+            cursor.execute(query)
+            submissions = {}
+            for row in cursor.fetchall():
+                submissions.setdefault(row[0], []).append(row[1:])
+            for (game_id, tournament, patch, winner) in games:
+                if game_id in self._recorded[kind] or game_id not in submissions:
+                    continue
+                region = tournament.split("/")[1]
+                if kind == PICKS:
+                    self.record_picks(game_id, patch, region, winner, submissions[game_id])
+                else:
+                    self.record_bans(game_id, patch, region, winner, submissions[game_id])
+
+    def table(self, by=("champion_id",), patches=None, regions=None, window=None):
+        """
+        Returns pick/ban statistics grouped by the given columns.
+        Args:
+            by (tuple(str)): columns to group by, any of "patch", "region", "champion_id", "position", "side". Rates are
+                relative to the number of games in each (patch, region) group included in the table, so grouping by
+                position or side gives rates per game of picks in that position or by that side.
+            patches (list(str), optional): only include games played on these patches
+            regions (list(str), optional): only include games played in these regions
+            window (int, optional): size of the rolling window to report. Defaults to all recorded games.
+        Returns:
+            table (pandas DataFrame): one row per group with columns picks, wins, bans, games, pick_rate, ban_rate,
+                presence and win_rate, sorted by presence
+        """
+        aggregates = self.totals if window is None else self.windows[window]
+        picks = pd.DataFrame([key+tuple(counts) for key, counts in aggregates.picks.items()],
+                             columns=["patch", "region", "champion_id", "position", "side", "picks", "wins"])
+        bans = pd.DataFrame([key+(count,) for key, count in aggregates.bans.items()],
+                            columns=["patch", "region", "champion_id", "side", "bans"])
+        bans["position"] = -1
+        games = {kind:pd.DataFrame([key+(count,) for key, count in aggregates.games[kind].items()],
+                                   columns=["patch", "region", "games"]) for kind in [PICKS, BANS]}
+
+        def keep(df):
+            if patches is not None:
+                df = df[df["patch"].isin(patches)]
+            if regions is not None:
+                df = df[df["region"].isin(regions)]
+            return df
+        picks, bans = keep(picks), keep(bans)
+        # Bans have no position so when grouping by position they are reported in their own group (position = -1)
+        by = list(by)
+        table = pd.concat([picks.groupby(by)[["picks", "wins"]].sum(), bans.groupby(by)[["bans"]].sum()], axis=1).fillna(0)
+        for column in ["picks", "wins", "bans"]:
+            table[column] = table[column].astype(int)
+        # Entries which have dropped out of a rolling window are left at zero
+        table = table[(table["picks"] > 0) | (table["bans"] > 0)].copy()
+        table["games"] = keep(games[PICKS])["games"].sum()
+        table["ban_games"] = keep(games[BANS])["games"].sum()
+        # Games are only counted within the patches/regions present in each group
+        if "patch" in by or "region" in by:
+            game_by = [col for col in ["patch", "region"] if col in by]
+            group_games = pd.concat([keep(games[PICKS]).groupby(game_by)[["games"]].sum(),
+                                     keep(games[BANS]).groupby(game_by)[["games"]].sum().rename(columns={"games":"ban_games"})],
+                                    axis=1).reset_index()
+            table = table.drop(["games", "ban_games"], axis=1).reset_index()
+            table = table.merge(group_games, how="left", on=game_by).set_index(by)
+            table["games"] = table["games"].fillna(0)
+            table["ban_games"] = table["ban_games"].fillna(0)
+        ban_games = table.pop("ban_games")
+        table["pick_rate"] = table["picks"]/table["games"]
+        table["ban_rate"] = table["bans"]/ban_games
+        table["presence"] = table["pick_rate"]+table["ban_rate"].fillna(0)
+        table["win_rate"] = table["wins"]/table["picks"]
+        return table.sort_values("presence", ascending=False)
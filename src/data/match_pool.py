@@ -1,6 +1,7 @@
 import random
 import json
 import sqlite3
+import hashlib
 from .database_ops import get_matches_by_id, get_game_ids, get_match_data, get_game_ids_by_tournament, get_tournament_data
 
 def test_train_split(n_training, n_validation, path_to_db, list_path=None, save_path=None, match_sources=None, prune_patches=None):
@@ -29,8 +30,8 @@ def test_train_split(n_training, n_validation, path_to_db, list_path=None, save_
         training_ids = data["training_ids"]
         if prune_patches:
             pre_prune_id_count = len(validation_ids)+len(training_ids)
-            validation_ids = prune_match_list(validation_ids, path=path_to_db, patches=prune_patches)
-            training_ids = prune_match_list(training_ids, path=path_to_db, patches=prune_patches)
+            validation_ids = prune_match_list(validation_ids, path_to_db, patches=prune_patches)
+            training_ids = prune_match_list(training_ids, path_to_db, patches=prune_patches)
             post_prune_id_count = len(validation_ids)+len(training_ids)
             save_match_pool = True
             print("Pruned {} matches from the match list".format(pre_prune_id_count-post_prune_id_count))
@@ -61,9 +62,93 @@ def test_train_split(n_training, n_validation, path_to_db, list_path=None, save_
 
     return {"training_ids":training_ids,"validation_ids":validation_ids}
 
+DEFAULT_SPLIT_RATIOS = (("training", 0.9), ("validation", 0.1))
+
+def split_hash(tournament, tourn_game_id, salt=""):
+    """
+    Maps a game to a stable pseudo-random value in [0,1) using a hash of its (tournament, tourn_game_id) identifier. Unlike
+    the database id, this identifier is the same in every copy of the database, so independent jobs hash games identically.
+    Args:
+        tournament (str): tournament string of game (ie "2018/NA/Summer_Season")
+        tourn_game_id (int): id of game within the tournament
+        salt (str): salt mixed into the hash. Changing it produces an independent split.
+    Returns:
+        value (float): hash value in [0,1)
+    """
+    key = "{}|{}|{}".format(salt, tournament, tourn_game_id).encode("utf-8")
+    digest = hashlib.sha1(key).digest()
+    return int.from_bytes(digest[:8], "big")/2.**64
+
+def assign_split(tournament, tourn_game_id, ratios=DEFAULT_SPLIT_RATIOS, salt=""):
+    """
+    Assigns a game to a split in O(1) using its stable hash.
+    Args:
+        tournament (str): tournament string of game
+        tourn_game_id (int): id of game within the tournament
+        ratios (tuple(tuple)): ordered (split_name, ratio) pairs. Ratios are normalized to sum to 1.
+        salt (str): salt mixed into the hash
+    Returns:
+        split_name (str): name of split the game belongs to
+    """
+    return _bucket(split_hash(tournament, tourn_game_id, salt), ratios)
+
+def _bucket(value, ratios):
+    total = float(sum(ratio for (_, ratio) in ratios))
+    cumulative = 0.
+    for (name, ratio) in ratios:
+        cumulative += ratio/total
+        if value < cumulative:
+            return name
+    return ratios[-1][0]
+
+def hash_split(path_to_db, ratios=DEFAULT_SPLIT_RATIOS, match_sources=None, stratify_by=None, salt=""):
+    """
+    hash_split deterministically splits every match eligible for a pool (see match_ids()) without any stored id lists or random state.
+    Args:
+        path_to_db (str): path to database containing match data
+        ratios (tuple(tuple)): ordered (split_name, ratio) pairs, ie (("training", 0.9), ("validation", 0.1))
+        match_sources (dict, optional): dictionary containing "patches" and "tournaments" keys used to select eligible matches
+        stratify_by (str, optional): game table column to stratify by (ie "patch" or "tournament")
+        salt (str): salt mixed into the hash
+    Returns:
+        split (dict): dictionary mapping "<split_name>_ids" to the list of match ids in each split
+
+    Without stratification each game is assigned independently by assign_split(), so each split receives its ratio of every patch and
+    tournament in expectation and a newly added game never changes the assignment of any other. With stratify_by set the games
+    of each stratum are ordered by hash value and cut at the ratios, so every stratum is split exactly in proportion. Assignments remain
+    deterministic, but adding a game to a stratum can move the games of that stratum which lie on a split boundary.
+    """
+    pool = match_ids(path_to_db, match_sources)
+    columns = ("tournament", "tourn_game_id") if stratify_by is None else ("tournament", "tourn_game_id", stratify_by)
+    metadata = get_match_metadata(pool, path_to_db, columns=columns)
+    split = {"{}_ids".format(name):[] for (name, _) in ratios}
+    if stratify_by is None:
+        for match_id in pool:
+            name = assign_split(metadata[match_id]["tournament"], metadata[match_id]["tourn_game_id"], ratios, salt)
+            split["{}_ids".format(name)].append(match_id)
+        return split
+
+    strata = {}
+    for match_id in pool:
+        strata.setdefault(metadata[match_id][stratify_by], []).append(match_id)
+    for stratum in strata.values():
+        stratum.sort(key=lambda match_id: split_hash(metadata[match_id]["tournament"], metadata[match_id]["tourn_game_id"], salt))
+        for rank, match_id in enumerate(stratum):
+            # Use the midpoint of each game's rank so that games are distributed exactly in proportion to the ratios
+            name = _bucket((rank+0.5)/len(stratum), ratios)
+            split["{}_ids".format(name)].append(match_id)
+    position = {match_id:k for k, match_id in enumerate(pool)}
+    for name in split:
+        split[name].sort(key=lambda match_id: position[match_id])
+    return split
+
 def grow_pool(count, current_pool, path_to_db, match_sources=None):
-    total = match_pool(0, path_to_db, randomize=False, match_sources=match_sources)["match_ids"]
-    new = list(set(total)-set(current_pool))
+    """
+    Selects count random match ids matching match_sources which are not already in current_pool. Only the game table is queried.
+    """
+    total = match_ids(path_to_db, match_sources)
+    current_pool = set(current_pool)
+    new = [match_id for match_id in total if match_id not in current_pool]
     assert(len(new) >= count), "Not enough new matches to match required count! avail: {} needed: {}".format(len(new), count)
     random.shuffle(new)
 
@@ -71,69 +156,114 @@ def grow_pool(count, current_pool, path_to_db, match_sources=None):
 
 def prune_match_list(match_ids, path_to_db, patches=None):
     """
-    Prunes match list by removing matches played on specified patches.
+    Prunes match list by removing matches played on specified patches. Only the patch of each match is read from the database.
     """
-    matches = get_matches_by_id(match_ids, path_to_db)
-    pruned_match_list = []
-    for match in matches:
-        patch = match["patch"]
-        if patch not in patches:
-            pruned_match_list.append(match["id"])
-    return pruned_match_list
+    if not patches:
+        return list(match_ids)
+    match_patches = get_match_metadata(match_ids, path_to_db, columns=["patch"])
+    return [match_id for match_id in match_ids if match_patches[match_id]["patch"] not in patches]
 
-def match_pool(num_matches, path_to_db, randomize=True, match_sources=None):
+def get_match_metadata(match_ids, path_to_db, columns=("tournament", "tourn_game_id", "week", "patch")):
     """
+    Reads columns from the game table for each match in match_ids without loading any pick/ban data.
     Args:
-        num_matches (int): Number of matches to include in the queue (0 indicates to use the maximum number of matches available)
-        path_do_db (str): Path to match database to query against
-        randomize (bool): Flag for randomizing order of output matches.
-        match_sources (dict(string)): Dict containing "tournaments" and "patches" keys to use when building pool, if None, defaults to using patches/tournaments in data/match_sources.json
+        match_ids (list(int)): list of game ids
+        path_to_db (str): path to match database
+        columns (tuple(str)): game table columns to read
     Returns:
-        match_data (dictionary): dictionary containing two keys:
-            "match_ids": list of match_ids for pooled matches
-            "matches": list of pooled match data to process
+        metadata (dict): dictionary mapping each game id to a dictionary of its column values
+    """
+    # sqlite limits the number of parameters in a single statement
+    chunk_size = 500
+    metadata = {}
+    conn = sqlite3.connect(path_to_db)
+    cur = conn.cursor()
+    match_ids = list(match_ids)
+    for k in range(0, len(match_ids), chunk_size):
+        chunk = match_ids[k:k+chunk_size]
+        query = "SELECT id, {columns} FROM game WHERE id IN ({params})".format(columns=", ".join(columns), params=", ".join("?"*len(chunk)))
+        cur.execute(query, chunk)
+        for row in cur.fetchall():
+            metadata[row[0]] = dict(zip(columns, row[1:]))
+    conn.close()
+    return metadata
 
-    Builds a set of matchids and match data used during learning phase. If randomize flag is set
-    to false this returns the first num_matches in order according to match_sources.
+def load_match_sources(match_sources=None):
+    """
+    Returns the (patches, tournaments) lists to build pools from. If match_sources is None these are read from data/match_sources.json.
     """
     if(match_sources is None):
         with open("../data/match_sources.json") as infile:
             data = json.load(infile)
-            patches = data["match_sources"]["patches"]
-            tournaments = data["match_sources"]["tournaments"]
-    else:
-        patches = match_sources["patches"]
-        tournaments = match_sources["tournaments"]
+            return (data["match_sources"]["patches"], data["match_sources"]["tournaments"])
+    return (match_sources["patches"], match_sources["tournaments"])
 
+def match_ids(path_to_db, match_sources=None):
+    """
+    Enumerates the ids of every match eligible for a pool using a single query over the game table.
+    Args:
+        path_to_db (str): Path to match database to query against
+        match_sources (dict(string)): Dict containing "tournaments" and "patches" keys, if None, defaults to using patches/tournaments in data/match_sources.json
+    Returns:
+        match_ids (list(int)): eligible match ids. Ids are ordered by the position of their patch in the list of patches, then by the
+            position of their tournament in the list of tournaments and finally by id.
+    """
+    (patches, tournaments) = load_match_sources(match_sources)
     # If patches or tournaments is empty, grab matches from all patches from specified tournaments or all tournaments from specified matches
-    if not patches:
-        patches = [None]
-    if not tournaments:
-        tournaments = [None]
+    where_clause = []
+    params = []
+    if patches:
+        where_clause.append("patch IN ({})".format(", ".join("?"*len(patches))))
+        params.extend(patches)
+    if tournaments:
+        where_clause.append("tournament IN ({})".format(", ".join("?"*len(tournaments))))
+        params.extend(tournaments)
+    if not where_clause:
+        return []
 
-    match_pool = []
+    query = "SELECT id, patch, tournament FROM game WHERE {where_clause}".format(where_clause=" AND ".join(where_clause))
     conn = sqlite3.connect(path_to_db)
     cur = conn.cursor()
-    # Build list of eligible match ids
-    for patch in patches:
-        for tournament in tournaments:
-            game_ids = get_game_ids(cur, tournament, patch)
-            match_pool.extend(game_ids)
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    conn.close()
+
+    patch_order = {patch:k for k, patch in enumerate(patches)}
+    tournament_order = {tournament:k for k, tournament in enumerate(tournaments)}
+    rows.sort(key=lambda row: (patch_order.get(row[1], 0), tournament_order.get(row[2], 0), row[0]))
+    return [row[0] for row in rows]
 
-    print("Number of available matches for training={}".format(len(match_pool)))
+def match_pool(num_matches, path_to_db, randomize=True, match_sources=None, load_matches=True):
+    """
+    Args:
+        num_matches (int): Number of matches to include in the queue (0 indicates to use the maximum number of matches available)
+        path_do_db (str): Path to match database to query against
+        randomize (bool): Flag for randomizing order of output matches.
+        match_sources (dict(string)): Dict containing "tournaments" and "patches" keys to use when building pool, if None, defaults to using patches/tournaments in data/match_sources.json
+        load_matches (bool): Flag for loading the match data of the selected matches. If False, only the game table is queried.
+    Returns:
+        match_data (dictionary): dictionary containing two keys:
+            "match_ids": list of match_ids for pooled matches
+            "matches": list of pooled match data to process (None if load_matches is False)
+
+    Builds a set of matchids and match data used during learning phase. If randomize flag is set
+    to false this returns the first num_matches in order according to match_sources.
+    """
+    pool = match_ids(path_to_db, match_sources)
+
+    print("Number of available matches for training={}".format(len(pool)))
     if(num_matches == 0):
-        num_matches = len(match_pool)
-    assert num_matches <= len(match_pool), "Not enough matches found to sample!"
+        num_matches = len(pool)
+    assert num_matches <= len(pool), "Not enough matches found to sample!"
     if(randomize):
-        selected_match_ids = random.sample(match_pool, num_matches)
+        selected_match_ids = random.sample(pool, num_matches)
     else:
-        selected_match_ids = match_pool[:num_matches]
+        selected_match_ids = pool[:num_matches]
 
-    selected_matches = []
-    for match_id in selected_match_ids:
-        match = get_match_data(cur, match_id)
-        selected_matches.append(match)
-    conn.close()
+    selected_matches = None
+    if(load_matches):
+        # Full match data is only loaded for the selected matches
+        selected_matches = get_matches_by_id(selected_match_ids, path_to_db)
     return {"match_ids":selected_match_ids, "matches":selected_matches}
 
 if __name__ == "__main__":
@@ -0,0 +1,318 @@
+import sqlite3
+import numpy as np
+
+# Fill values used in the pick/ban arrays
+EMPTY = -1 # no submission was recorded for this selection slot
+NULL_CHAMPION = 0 # a submission was recorded but no champion was submitted (ie a skipped ban)
+
+BLUE_SIDE = 0
+RED_SIDE = 1
+
+class MatchSelection(object):
+    """
+    MatchSelection is the result of a MatchStore query. It holds a boolean mask over the rows of the store and can be
+    combined with other selections from the same store using & (and), | (or), ^ (xor) and ~ (not).
+    Args:
+        store (MatchStore): store the selection was made from
+        mask (numpy array(bool)): mask over the rows of store
+    """
+    def __init__(self, store, mask):
+        self.store = store
+        self.mask = mask
+
+    def _combine(self, other, op):
+        if other.store is not self.store:
+            raise ValueError("Cannot combine selections from different stores")
+        return MatchSelection(self.store, op(self.mask, other.mask))
+
+    def __and__(self, other):
+        return self._combine(other, np.logical_and)
+
+    def __or__(self, other):
+        return self._combine(other, np.logical_or)
+
+    def __xor__(self, other):
+        return self._combine(other, np.logical_xor)
+
+    def __invert__(self):
+        return MatchSelection(self.store, ~self.mask)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.mask))
+
+    def rows(self):
+        """
+        Returns the (sorted) store row indices in the selection.
+        """
+        return np.flatnonzero(self.mask)
+
+    def ids(self):
+        """
+        Returns the game ids in the selection as a list of ints.
+        """
+        return self.store.game_ids[self.mask].tolist()
+
+    def view(self):
+        """
+        Returns a dictionary holding the columns of the store restricted to the selection (see MatchStore.view()).
+        """
+        return self.store.view(self.rows())
+
+    def matches(self):
+        """
+        Returns the selected games as match dictionaries (see MatchStore.get_match()).
+        """
+        return [self.store.get_match_by_row(row) for row in self.rows()]
+
+class MatchStore(object):
+    """
+    MatchStore loads every game in the database once and holds the draft data in compact columnar NumPy arrays, along with
+    inverted indexes mapping each patch, tournament, team and champion to the rows it appears in. Queries return
+    MatchSelections which can be combined with boolean operators, ie
+
+        store = MatchStore(path_to_db)
+        sel = (store.patch("8.13") | store.patch("8.14")) & store.champion(22, kind="pick") & ~store.team("tsm")
+        sel.ids()
+
+    Columns (n = number of games, s = maximum number of picks/bans per side):
+        game_ids (n,): database id of each game
+        tourn_game_ids (n,), weeks (n,): tournament game id and week/header id of each game
+        picks (n,2,s): champion id picked by each side (0 = blue, 1 = red) indexed by selection order, NULL_CHAMPION for
+            missing picks, or EMPTY
+        positions (n,2,s): position of each pick, or EMPTY
+        bans (n,2,s): champion id banned by each side indexed by selection order, NULL_CHAMPION for skipped bans, or EMPTY
+        winner (n,): winning side of each game (0 = blue, 1 = red)
+        patch_codes (n,), tournament_codes (n,), team_codes (n,2): indices into patches, tournaments and teams
+    Args:
+        path_to_db (str): path to match database
+    """
+    def __init__(self, path_to_db):
+        conn = sqlite3.connect(path_to_db)
+        cur = conn.cursor()
+        self._load(cur)
+        conn.close()
+        self._build_indexes()
+
+    def _load(self, cur):
+        cur.execute("SELECT id, display_name FROM team ORDER BY id")
+        team_names = dict(cur.fetchall())
+
+        cur.execute("SELECT id, tournament, tourn_game_id, week, patch, blue_teamid, red_teamid, winning_team FROM game ORDER BY id")
+        games = cur.fetchall()
+        n = len(games)
+        self.game_ids = np.array([game[0] for game in games], dtype=np.int64)
+        self.tourn_game_ids = np.array([game[2] for game in games], dtype=np.int64)
+        self.weeks = [game[3] for game in games]
+        self.winner = np.array([game[7] for game in games], dtype=np.int8)
+        self.patches, self.patch_codes = self._encode([game[4] for game in games])
+        self.tournaments, self.tournament_codes = self._encode([game[1] for game in games])
+        self.teams, team_codes = self._encode([team_names[game[5]] for game in games]+[team_names[game[6]] for game in games])
+        self.team_codes = np.stack([team_codes[:n], team_codes[n:]], axis=1)
+        self._team_code = {team:code for code, team in enumerate(self.teams)}
+        self._row_of_id = {game_id:row for row, game_id in enumerate(self.game_ids.tolist())}
+
+        cur.execute("SELECT MAX(selection_order) FROM pick")
+        max_picks = cur.fetchone()[0] or 0
+        cur.execute("SELECT MAX(selection_order) FROM ban")
+        max_bans = cur.fetchone()[0] or 0
+        self.picks = np.full((n, 2, max_picks), EMPTY, dtype=np.int16)
+        self.positions = np.full((n, 2, max_picks), EMPTY, dtype=np.int8)
+        self.bans = np.full((n, 2, max_bans), EMPTY, dtype=np.int16)
+
+        cur.execute("SELECT game_id, side_id, selection_order, IFNULL(champion_id, ?), IFNULL(position_id, ?) FROM pick", (NULL_CHAMPION, EMPTY))
+        rows = np.array(cur.fetchall(), dtype=np.int64).reshape(-1, 5)
+        game_rows = self.rows_of(rows[:,0])
+        self.picks[game_rows, rows[:,1], rows[:,2]-1] = rows[:,3]
+        self.positions[game_rows, rows[:,1], rows[:,2]-1] = rows[:,4]
+
+        cur.execute("SELECT game_id, side_id, selection_order, IFNULL(champion_id, ?) FROM ban", (NULL_CHAMPION,))
+        rows = np.array(cur.fetchall(), dtype=np.int64).reshape(-1, 4)
+        game_rows = self.rows_of(rows[:,0])
+        self.bans[game_rows, rows[:,1], rows[:,2]-1] = rows[:,3]
+
+    @staticmethod
+    def _encode(values):
+        """
+        Dictionary encodes values, returning the sorted list of distinct values and the code of each value.
+        """
+        labels = sorted(set(values))
+        code_of = {label:code for code, label in enumerate(labels)}
+        return labels, np.array([code_of[value] for value in values], dtype=np.int32)
+
+    @staticmethod
+    def _invert(keys, rows):
+        """
+        Builds an inverted index mapping each key to the sorted, distinct rows it appears in.
+        """
+        keys = np.asarray(keys).ravel()
+        rows = np.asarray(rows).ravel()
+        order = np.lexsort((rows, keys))
+        keys, rows = keys[order], rows[order]
+        bounds = np.flatnonzero(np.diff(keys))+1
+        index = {}
+        for key, key_rows in zip(keys[np.r_[0, bounds]] if len(keys) else [], np.split(rows, bounds)):
+            index[int(key)] = np.unique(key_rows).astype(np.int32)
+        return index
+
+    def _build_indexes(self):
+        n = len(self.game_ids)
+        all_rows = np.arange(n)
+        slot_rows = np.broadcast_to(all_rows[:,None,None], self.picks.shape)
+        self.patch_index = {self.patches[code]:rows for code, rows in self._invert(self.patch_codes, all_rows).items()}
+        self.tournament_index = {self.tournaments[code]:rows for code, rows in self._invert(self.tournament_codes, all_rows).items()}
+        team_rows = np.broadcast_to(all_rows[:,None], self.team_codes.shape)
+        self.team_index = {self.teams[code]:rows for code, rows in self._invert(self.team_codes, team_rows).items()}
+
+        picked = (self.picks != EMPTY) & (self.picks != NULL_CHAMPION)
+        self.pick_index = self._invert(self.picks[picked], slot_rows[picked])
+        slot_rows = np.broadcast_to(all_rows[:,None,None], self.bans.shape)
+        banned = (self.bans != EMPTY) & (self.bans != NULL_CHAMPION)
+        self.ban_index = self._invert(self.bans[banned], slot_rows[banned])
+
+    def __len__(self):
+        return len(self.game_ids)
+
+    def rows_of(self, game_ids):
+        """
+        Returns the store rows holding each of the games in game_ids.
+        """
+        return np.array([self._row_of_id[int(game_id)] for game_id in game_ids], dtype=np.int64)
+
+    def _select(self, index, keys):
+        if isinstance(keys, (str, int, np.integer)):
+            keys = [keys]
+        mask = np.zeros(len(self), dtype=bool)
+        for key in keys:
+            if key in index:
+                mask[index[key]] = True
+        return MatchSelection(self, mask)
+
+    def all(self):
+        """
+        Returns a selection of every game in the store.
+        """
+        return MatchSelection(self, np.ones(len(self), dtype=bool))
+
+    def ids(self, game_ids):
+        """
+        Returns a selection of the games with the given database ids.
+        """
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.rows_of(game_ids)] = True
+        return MatchSelection(self, mask)
+
+    def patch(self, patches):
+        """
+        Returns a selection of the games played on any of the given patch(es).
+        """
+        return self._select(self.patch_index, patches)
+
+    def tournament(self, tournaments):
+        """
+        Returns a selection of the games played in any of the given tournament(s).
+        """
+        return self._select(self.tournament_index, tournaments)
+
+    def team(self, teams, side=None):
+        """
+        Returns a selection of the games played by any of the given team(s).
+        Args:
+            teams (str or list(str)): team display name(s)
+            side (int, optional): if given, only games where the team played on this side (0 = blue, 1 = red) are selected
+        Returns:
+            selection (MatchSelection)
+        """
+        selection = self._select(self.team_index, teams)
+        if side is not None:
+            if isinstance(teams, str):
+                teams = [teams]
+            codes = [self._team_code[team] for team in teams if team in self._team_code]
+            selection.mask &= np.isin(self.team_codes[:,side], codes)
+        return selection
+
+    def champion(self, champion_ids, kind="any", side=None):
+        """
+        Returns a selection of the games in which any of the given champion(s) were submitted.
+        Args:
+            champion_ids (int or list(int)): champion id(s)
+            kind (str): one of "pick", "ban" or "any"
+            side (int, optional): if given, only submissions made by this side (0 = blue, 1 = red) are considered
+        Returns:
+            selection (MatchSelection)
+        """
+        if kind not in ("pick", "ban", "any"):
+            raise ValueError("Unknown submission kind {}".format(kind))
+        if side is not None:
+            champion_ids = np.atleast_1d(champion_ids)
+            mask = np.zeros(len(self), dtype=bool)
+            if kind in ("pick", "any"):
+                mask |= np.isin(self.picks[:,side,:], champion_ids).any(axis=1)
+            if kind in ("ban", "any"):
+                mask |= np.isin(self.bans[:,side,:], champion_ids).any(axis=1)
+            return MatchSelection(self, mask)
+        selection = MatchSelection(self, np.zeros(len(self), dtype=bool))
+        if kind in ("pick", "any"):
+            selection |= self._select(self.pick_index, champion_ids)
+        if kind in ("ban", "any"):
+            selection |= self._select(self.ban_index, champion_ids)
+        return selection
+
+    def position(self, champion_id, position, side=None):
+        """
+        Returns a selection of the games in which champion_id was picked to play the given position.
+        """
+        played = (self.picks == champion_id) & (self.positions == position)
+        if side is not None:
+            return MatchSelection(self, played[:,side,:].any(axis=1))
+        return MatchSelection(self, played.any(axis=(1,2)))
+
+    def won_by(self, side):
+        """
+        Returns a selection of the games won by the given side (0 = blue, 1 = red).
+        """
+        return MatchSelection(self, self.winner == side)
+
+    def view(self, rows):
+        """
+        Returns a dictionary holding the store columns restricted to rows. Columns are NumPy arrays (copies when rows is an
+        index array, views when it is a slice) and the patch/tournament/team columns are left dictionary encoded.
+        """
+        return {"game_ids":self.game_ids[rows],
+                "tourn_game_ids":self.tourn_game_ids[rows],
+                "picks":self.picks[rows],
+                "positions":self.positions[rows],
+                "bans":self.bans[rows],
+                "winner":self.winner[rows],
+                "patch_codes":self.patch_codes[rows],
+                "tournament_codes":self.tournament_codes[rows],
+                "team_codes":self.team_codes[rows]}
+
+    def get_match_by_row(self, row):
+        match = {"id":int(self.game_ids[row]), "winner":int(self.winner[row]), "blue":{}, "red":{},
+                 "blue_team":self.teams[self.team_codes[row,BLUE_SIDE]], "red_team":self.teams[self.team_codes[row,RED_SIDE]],
+                 "header_id":self.weeks[row], "patch":self.patches[self.patch_codes[row]],
+                 "tournament":self.tournaments[self.tournament_codes[row]], "tourn_game_id":int(self.tourn_game_ids[row])}
+        for side, side_name in [(BLUE_SIDE, "blue"), (RED_SIDE, "red")]:
+            bans = []
+            for slot, cid in enumerate(self.bans[row,side].tolist()):
+                if cid != EMPTY:
+                    bans.append((None if cid == NULL_CHAMPION else cid, slot+1))
+            picks = []
+            for slot, (cid, pos) in enumerate(zip(self.picks[row,side].tolist(), self.positions[row,side].tolist())):
+                if cid != EMPTY:
+                    picks.append((None if cid == NULL_CHAMPION else cid, None if pos == EMPTY else pos, slot+1))
+            match[side_name]["bans"] = bans
+            match[side_name]["picks"] = picks
+        return match
+
+    def get_match(self, game_id):
+        """
+        Returns the game with database id game_id in the same format as data.database_ops.get_match_data().
+        """
+        return self.get_match_by_row(self._row_of_id[game_id])
+
+    def get_matches(self, game_ids):
+        """
+        Returns match data for each id in game_ids (see data.database_ops.get_matches_by_id()) without querying the database.
+        """
+        return [self.get_match(game_id) for game_id in game_ids]
@@ -0,0 +1,213 @@
+import os
+import json
+import struct
+import random
+import numpy as np
+
+from .draftstate import DraftState
+from .match_processing import process_match_dual, augmentation_orderings, build_action_queue, MissingSubmissions, DEFAULT_DRAFT
+from .state_encoding import pack_experience, unpack_bits
+
+MAGIC = b"SWAINDS1"
+ALIGNMENT = 64
+
+def compile_dataset(matches, out_path, augment_data=False, orderings=None):
+    """
+    compile_dataset processes each match into experiences for both teams and writes them to a single binary file which
+    can be opened (without copying) by CompiledDataset.
+
+    The file consists of a short header followed by one array per field. The header is the 8 byte magic string, the length
+    of the JSON header as a little-endian uint64 and the JSON header itself, which records the dtype, shape and byte offset of each
+    field along with the draft dimensions and the list of patches. The data segment starts at the first 64 byte boundary after the
+    header and each array within it is aligned to a 64 byte boundary (offsets are relative to the start of the data segment). The fields are:
+        "state", "next_state": s and s' with their bits packed along the last axis (see state_encoding.pack_state)
+        "valid_actions", "next_valid_actions": packed masks of valid actions from s and s'
+        "action": index of the submitted action into the actionable state vector
+        "reward": reward obtained for the experience
+        "next_status": code returned by s'.evaluate()
+        "match_id", "team", "patch": match id, team perspective and index into the header's patch list of each experience
+        "exp_index": position of the experience within the match's list of experiences for that team
+        "ordering": index of the submission ordering the experience was produced from (see Draft.augment_permutations())
+
+    Matches missing picks or bans (see match_processing.MissingSubmissions) are skipped and counted in the header.
+    Experiences with null submissions (usually missing bans) are not written since the learner can't submit them. Experiences
+    which are repeated within a match (ie the submissions common to several orderings) are only written for the first ordering
+    producing them, with duplicates identified by the Zobrist hashes of their states (see DraftState.zobrist_hash).
+    Args:
+        matches (list(dict)): list of matches to compile
+        out_path (str): path of output file. The file is written to a temporary file first and then moved into place.
+        augment_data (bool): flag controlling the randomized ordering of submissions that do not affect the draft as a whole
+        orderings (str or list(int), optional): submission orderings each match is compiled under. If "all", every distinct
+            ordering of each match is compiled (see match_processing.augmentation_orderings()), expanding the data
+            deterministically. Defaults to a single ordering per match, chosen at random if augment_data is set.
+    Returns:
+        header (dict): header written to the file
+    """
+    teams = [DraftState.BLUE_TEAM, DraftState.RED_TEAM]
+    patches = []
+    fields = {name:[] for name in ["state", "next_state", "valid_actions", "next_valid_actions", "action", "reward",
+                                   "next_status", "match_id", "team", "patch", "exp_index", "ordering"]}
+    null_actions = 0
+    duplicate_experiences = 0
+    skipped_matches = 0
+    state_size = None
+    num_actions = None
+    for match in matches:
+        try:
+            build_action_queue(match)
+        except MissingSubmissions as e:
+            print("Skipping match: {}".format(e))
+            skipped_matches += 1
+            continue
+        if match["patch"] not in patches:
+            patches.append(match["patch"])
+        patch_code = patches.index(match["patch"])
+        if orderings == "all":
+            match_orderings = augmentation_orderings(match)
+        elif orderings is not None:
+            match_orderings = orderings
+        else:
+            match_orderings = [random.randrange(len(DEFAULT_DRAFT.augment_permutations())) if augment_data else 0]
+        seen = set()
+        for ordering in match_orderings:
+            match_experiences = process_match_dual(match, ordering=ordering)
+            for team in teams:
+                for exp_index, experience in enumerate(match_experiences[team]):
+                    (start, (cid, pos), _, _) = experience
+                    if cid is None:
+                        null_actions += 1
+                        continue
+                    key = (team, start.zobrist_hash, cid, pos, experience[3].zobrist_hash)
+                    if key in seen:
+                        duplicate_experiences += 1
+                        continue
+                    seen.add(key)
+                    state_size = start.state.size
+                    num_actions = start.num_actions
+                    (state, valid, action, reward, next_state, next_valid, _) = pack_experience(experience)
+                    fields["state"].append(state)
+                    fields["next_state"].append(next_state)
+                    fields["valid_actions"].append(valid)
+                    fields["next_valid_actions"].append(next_valid)
+                    fields["action"].append(action)
+                    fields["reward"].append(reward)
+                    fields["next_status"].append(experience[3].evaluate())
+                    fields["match_id"].append(match["id"])
+                    fields["team"].append(team)
+                    fields["patch"].append(patch_code)
+                    fields["exp_index"].append(exp_index)
+                    fields["ordering"].append(ordering)
+
+    dtypes = {"state":np.uint8, "next_state":np.uint8, "valid_actions":np.uint8, "next_valid_actions":np.uint8,
+              "action":np.int32, "reward":np.float32, "next_status":np.int16, "match_id":np.int32, "team":np.int8,
+              "patch":np.int16, "exp_index":np.int8, "ordering":np.int16}
+    arrays = {}
+    for name, values in fields.items():
+        if values:
+            arrays[name] = np.asarray(values, dtype=dtypes[name])
+        else:
+            arrays[name] = np.zeros((0,), dtype=dtypes[name])
+
+    header = {"num_experiences":len(fields["action"]),
+              "state_size":state_size,
+              "num_actions":num_actions,
+              "null_actions":null_actions,
+              "duplicate_experiences":duplicate_experiences,
+              "skipped_matches":skipped_matches,
+              "num_matches":len(matches),
+              "patches":patches,
+              "fields":{}}
+
+    # Field offsets are relative to the start of the data segment, which begins at the first aligned byte after the header
+    offset = 0
+    for name in sorted(arrays.keys()):
+        array = arrays[name]
+        header["fields"][name] = {"dtype":array.dtype.str, "shape":list(array.shape), "offset":offset}
+        offset += _aligned(array.nbytes)
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _aligned(len(MAGIC)+8+len(header_bytes))
+
+    tmp_path = "{}.tmp".format(out_path)
+    with open(tmp_path, 'wb') as outfile:
+        outfile.write(MAGIC)
+        outfile.write(struct.pack("<Q", len(header_bytes)))
+        outfile.write(header_bytes)
+        for name in sorted(arrays.keys()):
+            outfile.seek(data_start+header["fields"][name]["offset"])
+            outfile.write(arrays[name].tobytes())
+        outfile.truncate(data_start+offset)
+    os.replace(tmp_path, out_path)
+    return header
+
+def _aligned(nbytes):
+    return ((nbytes+ALIGNMENT-1)//ALIGNMENT)*ALIGNMENT
+
+class CompiledDataset():
+    """
+    Args:
+        path (str): path to a dataset written by compile_dataset()
+
+    CompiledDataset opens a compiled experience file using read-only memory maps. No data is read until it is accessed, so
+    opening a dataset is effectively instantaneous and multiple processes reading the same file share a single copy of it
+    in the page cache. The raw (packed) arrays can be accessed by field name, ie. dataset["reward"], and get_batch() returns
+    the unpacked arrays ready to be fed to a network.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as infile:
+            magic = infile.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError("{} is not a compiled dataset".format(path))
+            (header_length,) = struct.unpack("<Q", infile.read(8))
+            self.header = json.loads(infile.read(header_length).decode("utf-8"))
+        data_start = _aligned(len(MAGIC)+8+header_length)
+
+        self.num_experiences = self.header["num_experiences"]
+        self.state_size = self.header["state_size"]
+        self.num_actions = self.header["num_actions"]
+        self.patches = self.header["patches"]
+        self._arrays = {}
+        for name, info in self.header["fields"].items():
+            shape = tuple(info["shape"])
+            if np.prod(shape) == 0:
+                self._arrays[name] = np.zeros(shape, dtype=np.dtype(info["dtype"]))
+            else:
+                self._arrays[name] = np.memmap(path, dtype=np.dtype(info["dtype"]), mode='r', offset=data_start+info["offset"], shape=shape)
+
+    def __len__(self):
+        return self.num_experiences
+
+    def __getitem__(self, name):
+        return self._arrays[name]
+
+    def get_batch(self, indices):
+        """
+        Returns the experiences at the given indices with states and action masks unpacked.
+        Args:
+            indices (array of ints): indices of experiences to gather
+        Returns:
+            batch (dict): dictionary with the following keys:
+                "states", "next_states": (n, state_size) float32 arrays of network inputs for s and s'
+                "valid_actions", "next_valid_actions": (n, num_actions) bool arrays of valid actions from s and s'
+                "actions": (n,) int array of submitted actions
+                "rewards": (n,) float array of rewards
+                "is_terminal": (n,) bool array which is True if s' is either complete or invalid
+        """
+        indices = np.asarray(indices)
+        next_status = self._arrays["next_status"][indices]
+        return {"states":self._unpack("state", indices, self.state_size).astype(np.float32),
+                "next_states":self._unpack("next_state", indices, self.state_size).astype(np.float32),
+                "valid_actions":self._unpack("valid_actions", indices, self.num_actions).astype(bool),
+                "next_valid_actions":self._unpack("next_valid_actions", indices, self.num_actions).astype(bool),
+                "actions":np.array(self._arrays["action"][indices]),
+                "rewards":np.array(self._arrays["reward"][indices]),
+                "is_terminal":np.logical_or(next_status == DraftState.DRAFT_COMPLETE, np.isin(next_status, DraftState.invalid_states))}
+
+    def sample(self, sample_size):
+        """
+        Returns a batch of sample_size experiences drawn uniformly without replacement.
+        """
+        return self.get_batch(np.sort(np.random.choice(self.num_experiences, sample_size, replace=False)))
+
+    def _unpack(self, name, indices, size):
+        return unpack_bits(self._arrays[name][indices], size)
@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+
+from .draftstate import DraftState
+
+# Pair kinds tracked. "synergy" pairs are champions picked by the same team and "counter" pairs are champions picked by
+# opposing teams, with the row champion's team credited for wins. The "_role" variants index champions by (position, champion).
+KINDS = ["synergy", "counter", "synergy_role", "counter_role"]
+NUM_POSITIONS = 5
+
+class SparsePairCounts(object):
+    """
+    Sparse accumulator of pair counts and wins held as sorted linear indices (row*dim+col) with their totals. Added pairs
+    are buffered and only merged into the sorted totals when the counts are next read, so each addition costs time
+    proportional to the pairs added rather than to the pairs accumulated so far.
+    """
+    def __init__(self, dim):
+        self.dim = dim
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.wins = np.zeros(0, dtype=np.int64)
+        self._pending = []
+
+    def __len__(self):
+        self._merge()
+        return len(self.keys)
+
+    def add(self, rows, cols, wins):
+        """
+        Accumulates one observation of each (rows[k], cols[k]) pair, won if wins[k] is True.
+        """
+        self._pending.append((rows.astype(np.int64)*self.dim+cols, wins.astype(np.int64)))
+
+    def _merge(self):
+        """
+        Merges the buffered pairs into the sorted totals.
+        """
+        if not self._pending:
+            return
+        keys = np.concatenate([keys for (keys, _) in self._pending])
+        won = np.concatenate([won for (_, won) in self._pending])
+        self._pending = []
+        new_keys, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        new_counts = np.bincount(inverse, minlength=len(new_keys)).astype(np.int64)
+        new_wins = np.bincount(inverse, weights=won, minlength=len(new_keys)).astype(np.int64)
+
+        # Pairs already present are added in place and the rest are inserted at their sorted positions
+        at = np.searchsorted(self.keys, new_keys)
+        found = at < len(self.keys)
+        found[found] = self.keys[at[found]] == new_keys[found]
+        self.counts[at[found]] += new_counts[found]
+        self.wins[at[found]] += new_wins[found]
+        missing = ~found
+        self.keys = np.insert(self.keys, at[missing], new_keys[missing])
+        self.counts = np.insert(self.counts, at[missing], new_counts[missing])
+        self.wins = np.insert(self.wins, at[missing], new_wins[missing])
+
+    def dense(self, out=None):
+        """
+        Returns (counts, wins) as dense (dim, dim) arrays, adding into out if given.
+        """
+        self._merge()
+        if out is None:
+            out = (np.zeros((self.dim, self.dim), dtype=np.int64), np.zeros((self.dim, self.dim), dtype=np.int64))
+        out[0].reshape(-1)[self.keys] += self.counts
+        out[1].reshape(-1)[self.keys] += self.wins
+        return out
+
+    def row(self, row):
+        """
+        Returns the (cols, counts, wins) of the non-zero entries in a row.
+        """
+        self._merge()
+        (start, end) = np.searchsorted(self.keys, [row*self.dim, (row+1)*self.dim])
+        return (self.keys[start:end]-row*self.dim, self.counts[start:end], self.wins[start:end])
+
+class CooccurrenceMatrices(object):
+    """
+    CooccurrenceMatrices accumulates champion x champion pick co-occurrence counts (and the number of those games won) for
+    the pair kinds in KINDS, sliced by patch. Pairs for a batch of games are generated with array broadcasting and
+    accumulated into sparse per-patch counts, so the matrices can be updated incrementally as games are ingested.
+
+    Champions are indexed as in DraftState (see DraftState.champ_id_to_state_index) and role-conditioned matrices index
+    (position, champion) as (position-1)*num_champions+champion_index.
+    """
+    def __init__(self):
+        template = DraftState(DraftState.BLUE_TEAM)
+        self.num_champions = template.num_champions
+        self.champ_id_to_index = template.champ_id_to_state_index
+        self.index_to_champ_id = template.state_index_to_champ_id
+        self._lookup = np.full(max(self.champ_id_to_index)+1, -1, dtype=np.int64)
+        for cid, index in self.champ_id_to_index.items():
+            self._lookup[cid] = index
+        self.slices = {}
+        self.game_ids = set()
+
+    def _dim(self, kind):
+        return self.num_champions*(NUM_POSITIONS if kind.endswith("_role") else 1)
+
+    def add_matches(self, matches):
+        """
+        Adds the picks of each match not yet added.
+        Args:
+            matches (list(dict)): matches to add (see data.database_ops.get_match_data())
+        Returns:
+            n_added (int): number of games added
+        """
+        matches = [match for match in matches if match["id"] not in self.game_ids]
+        picks = np.full((len(matches), 2, NUM_POSITIONS), -1, dtype=np.int64)
+        positions = np.full((len(matches), 2, NUM_POSITIONS), -1, dtype=np.int64)
+        for k, match in enumerate(matches):
+            for side, side_name in enumerate(["blue", "red"]):
+                for slot, (cid, pos, _) in enumerate(match[side_name]["picks"][:NUM_POSITIONS]):
+                    picks[k, side, slot] = -1 if cid is None else cid
+                    positions[k, side, slot] = pos
+        winner = np.array([match["winner"] for match in matches], dtype=np.int64)
+        patches = [match["patch"] for match in matches]
+        self.add_arrays([match["id"] for match in matches], picks, positions, winner, patches)
+        return len(matches)
+
+    def add_store(self, store, selection=None):
+        """
+        Adds the games held in a data.match_store.MatchStore (or a selection of them) without building match dicts.
+        """
+        rows = store.all().rows() if selection is None else selection.rows()
+        rows = np.array([row for row in rows if int(store.game_ids[row]) not in self.game_ids], dtype=np.int64)
+        patches = [store.patches[code] for code in store.patch_codes[rows]]
+        self.add_arrays(store.game_ids[rows].tolist(), store.picks[rows].astype(np.int64), store.positions[rows].astype(np.int64),
+                        store.winner[rows].astype(np.int64), patches)
+        return len(rows)
+
+    def add_arrays(self, game_ids, picks, positions, winner, patches):
+        """
+        Adds games given as arrays.
+        Args:
+            game_ids (list(int)): id of each game
+            picks (numpy array): (n, 2, 5) champion id picked by each side, or a negative value for no pick
+            positions (numpy array): (n, 2, 5) position of each pick
+            winner (numpy array): (n,) winning side of each game
+            patches (list(str)): patch of each game
+        Returns:
+            None
+        """
+        if len(game_ids) == 0:
+            return
+        self.game_ids.update(game_ids)
+        valid = (picks >= 0) & (picks < len(self._lookup))
+        champs = np.where(valid, self._lookup[np.where(valid, picks, 0)], -1)
+        valid &= champs >= 0
+        roles = np.where(valid, (positions-1)*self.num_champions+champs, -1)
+        won = (np.arange(2)[None,:] == winner[:,None]) # (n, 2): did each side win
+
+        n = len(game_ids)
+        slots = np.arange(NUM_POSITIONS)
+        game = np.broadcast_to(np.arange(n)[:,None,None,None], (n, 2, NUM_POSITIONS, NUM_POSITIONS))
+        side = np.broadcast_to(np.arange(2)[None,:,None,None], game.shape)
+        a = np.broadcast_to(slots[None,None,:,None], game.shape)
+        b = np.broadcast_to(slots[None,None,None,:], game.shape)
+        # Same team pairs (k != j) and opposing pairs (side's kth pick vs the other side's jth pick)
+        same = (a != b) & valid[game, side, a] & valid[game, side, b]
+        opposing = valid[game, side, a] & valid[game, 1-side, b]
+        pairs = {"synergy":(same, champs, side), "counter":(opposing, champs, 1-side),
+                 "synergy_role":(same, roles, side), "counter_role":(opposing, roles, 1-side)}
+
+        patch_labels, patch_codes = np.unique(np.array(patches), return_inverse=True)
+        patch_codes = patch_codes.reshape(-1)
+        for kind, (mask, index, col_side) in pairs.items():
+            g, s, cs, i, j = game[mask], side[mask], col_side[mask], a[mask], b[mask]
+            rows, cols, wins = index[g, s, i], index[g, cs, j], won[g, s]
+            codes = patch_codes[g]
+            for code, patch in enumerate(patch_labels):
+                in_patch = codes == code
+                if not in_patch.any():
+                    continue
+                counts = self.slices.setdefault(str(patch), {}).setdefault(kind, SparsePairCounts(self._dim(kind)))
+                counts.add(rows[in_patch], cols[in_patch], wins[in_patch])
+
+    def patches(self):
+        return sorted(self.slices.keys())
+
+    def matrix(self, kind, patches=None):
+        """
+        Returns dense (counts, wins) matrices for kind summed over patches.
+        Args:
+            kind (str): one of KINDS
+            patches (list(str), optional): patches to include. Defaults to all patches.
+        Returns:
+            counts, wins (numpy arrays): counts[i,j] is the number of games in which the pair (i,j) occurred and wins[i,j] the
+                number of those won by the team of champion i
+        """
+        dim = self._dim(kind)
+        out = (np.zeros((dim, dim), dtype=np.int64), np.zeros((dim, dim), dtype=np.int64))
+        for patch in (self.patches() if patches is None else patches):
+            if kind in self.slices.get(patch, {}):
+                self.slices[patch][kind].dense(out)
+        return out
+
+    def lookup(self, kind, champion_id, position=None, patches=None, min_games=1):
+        """
+        Returns the champions paired with champion_id in kind, ie its most common teammates (synergy) or opponents (counter).
+        Args:
+            kind (str): one of KINDS
+            champion_id (int): champion to look up
+            position (int, optional): position of champion_id. Required for the role-conditioned kinds.
+            patches (list(str), optional): patches to include. Defaults to all patches.
+            min_games (int): pairs seen in fewer games are dropped
+        Returns:
+            table (pandas DataFrame): one row per paired champion (and position for role-conditioned kinds) with columns
+                games, wins and win_rate (for the team of champion_id), sorted by games
+        """
+        row = self.champ_id_to_index[champion_id]
+        if kind.endswith("_role"):
+            if position is None:
+                raise ValueError("A position is required for role-conditioned lookups")
+            row += (position-1)*self.num_champions
+        totals = {}
+        for patch in (self.patches() if patches is None else patches):
+            if kind not in self.slices.get(patch, {}):
+                continue
+            for (col, count, wins) in zip(*self.slices[patch][kind].row(row)):
+                (games, won) = totals.get(col, (0, 0))
+                totals[col] = (games+count, won+wins)
+        records = []
+        for col, (games, wins) in totals.items():
+            if games < min_games:
+                continue
+            record = {"champion_id":self.index_to_champ_id[col % self.num_champions], "games":int(games), "wins":int(wins),
+                      "win_rate":wins/games}
+            if kind.endswith("_role"):
+                record["position"] = col//self.num_champions+1
+            records.append(record)
+        columns = ["champion_id"]+(["position"] if kind.endswith("_role") else [])+["games", "wins", "win_rate"]
+        return pd.DataFrame(records, columns=columns).sort_values("games", ascending=False).reset_index(drop=True)
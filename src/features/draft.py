@@ -1,94 +1,177 @@
+import itertools
+import numpy as np
+
+class InvalidDraftFormat(Exception):
+    pass
+
+class InvalidSubmissionCount(Exception):
+    pass
+
 class Draft(object):
+    """
+    Args:
+        draft_type (str): name of a registered draft format (see Draft.register())
+
+    Draft describes the order in which teams make submissions during a draft. When a format is first used it is compiled into
+    dense tables indexed by submission count k (the number of submissions made so far, 0 <= k <= NUM_SUBMISSIONS):
+        active_team[k]: team making the (k+1)th submission, or TERMINAL once the draft is complete
+        active_phase[k]: phase (BAN or PICK) of the (k+1)th submission, or TERMINAL once the draft is complete
+        expected_counts[k]: (bans, blue picks, red picks) expected just before the (k+1)th submission is made
+    and tables indexed by submission k (0 <= k < NUM_SUBMISSIONS):
+        submission_slot[k]: index of the kth submission among its team's bans or picks
+        augment_group[k]: id of the group of submissions the kth submission is interchangeable with, or TERMINAL if it
+            is not interchangeable with any other submission (see augment_groups)
+    The tables are shared by every Draft using the same format and may be indexed directly by vectorized code. The scalar
+    lookups (get_active_team(), get_active_phase(), submission_dist) index list copies of the same tables.
+    """
     BLUE_TEAM = 0
     RED_TEAM = 1
     BAN = 201
     PICK = 202
     PHASES = [BAN, PICK]
+    TERMINAL = -1
 
-    # Draft specifcations
-    # Default specification for drafting structure
-    default_draft = [
-        (BLUE_TEAM, BAN),
-        (RED_TEAM, BAN),
-        (BLUE_TEAM, BAN),
-        (RED_TEAM, BAN),
-        (BLUE_TEAM, BAN),
-        (RED_TEAM, BAN),
-
-        (BLUE_TEAM, PICK),
-        (RED_TEAM, PICK),
-        (RED_TEAM, PICK),
-        (BLUE_TEAM, PICK),
-        (BLUE_TEAM, PICK),
-        (RED_TEAM, PICK),
-
-        (RED_TEAM, BAN),
-        (BLUE_TEAM, BAN),
-        (RED_TEAM, BAN),
-        (BLUE_TEAM, BAN),
-
-        (RED_TEAM, PICK),
-        (BLUE_TEAM, PICK),
-        (BLUE_TEAM, PICK),
-        (RED_TEAM, PICK),
-    ]
-
-    no_bans = [
-        (BLUE_TEAM, PICK),
-        (RED_TEAM, PICK),
-        (RED_TEAM, PICK),
-        (BLUE_TEAM, PICK),
-        (BLUE_TEAM, PICK),
-        (RED_TEAM, PICK),
-
-        (RED_TEAM, PICK),
-        (BLUE_TEAM, PICK),
-        (BLUE_TEAM, PICK),
-        (RED_TEAM, PICK),
-    ]
-    # Dictionary mapping draft labels to draft structures
-    draft_structures = {'default': default_draft,
-                        'no_bans': no_bans,
-    }
+    # Draft specifications. Each format is a list of (phase, submission order) segments where the submission order lists
+    # the team making each submission in the segment ("B" for blue, "R" for red).
+    formats = {}
+    draft_structures = {}
+    _compiled = {}
 
-    def __init__(self, draft_type = 'default'):
-        self._draft_structure = None
-        try:
-            self._draft_structure = Draft.draft_structures[draft_type]
-        except KeyError:
-            print("In draft.py: Draft structure not defined")
-            raise
-
-        self.PHASE_LENGTHS = {}
-        for phase in Draft.PHASES:
-            self.PHASE_LENGTHS[phase] = []
-
-        phase_length = 0
-        current_phase = None
-        for (team, phase) in self._draft_structure:
-            if not current_phase:
-                current_phase = phase
-            if phase == current_phase:
-                phase_length += 1
+    @classmethod
+    def register(cls, name, segments):
+        """
+        Registers a draft format.
+        Args:
+            name (str): label used to refer to the format
+            segments (list(tuple)): list of (phase, order) segments, ie [(Draft.BAN, "BRBRBR"), (Draft.PICK, "BRRBBR")]
+        Returns:
+            None
+        """
+        teams = {"B":cls.BLUE_TEAM, "R":cls.RED_TEAM}
+        structure = []
+        for (phase, order) in segments:
+            if phase not in cls.PHASES:
+                raise InvalidDraftFormat("Unknown phase {} in draft format {}".format(phase, name))
+            if not order or any(team not in teams for team in order):
+                raise InvalidDraftFormat("Invalid submission order '{}' in draft format {}".format(order, name))
+            structure.extend((teams[team], phase) for team in order)
+        cls.formats[name] = list(segments)
+        cls.draft_structures[name] = structure
+        cls._compiled.pop(name, None)
+
+    @classmethod
+    def _compile(cls, name):
+        structure = cls.draft_structures[name]
+        segments = cls.formats[name]
+        n = len(structure)
+        active_team = np.full(n+1, cls.TERMINAL, dtype=np.int16)
+        active_phase = np.full(n+1, cls.TERMINAL, dtype=np.int16)
+        expected_counts = np.zeros((n+1, 3), dtype=np.int16)
+        submission_slot = np.zeros(n, dtype=np.int16)
+        augment_group = np.full(n, cls.TERMINAL, dtype=np.int16)
+
+        counts = {(team, phase):0 for team in [cls.BLUE_TEAM, cls.RED_TEAM] for phase in cls.PHASES}
+        for k, (team, phase) in enumerate(structure):
+            active_team[k] = team
+            active_phase[k] = phase
+            submission_slot[k] = counts[(team, phase)]
+            counts[(team, phase)] += 1
+            (bans, blue, red) = expected_counts[k]
+            if phase == cls.BAN:
+                expected_counts[k+1] = (bans+1, blue, red)
+            elif team == cls.BLUE_TEAM:
+                expected_counts[k+1] = (bans, blue+1, red)
+            else:
+                expected_counts[k+1] = (bans, blue, red+1)
+
+        # Submissions which can be reordered without changing the draft: all bans made by a team within a single ban
+        # segment (in practice bans made in the same phase are interchangeable) and runs of consecutive picks by a team.
+        groups = []
+        start = 0
+        for (phase, order) in segments:
+            members = range(start, start+len(order))
+            if phase == cls.BAN:
+                for team in [cls.BLUE_TEAM, cls.RED_TEAM]:
+                    groups.append([k for k in members if structure[k][0] == team])
+            else:
+                run = []
+                for k in members:
+                    if run and structure[k][0] != structure[run[-1]][0]:
+                        groups.append(run)
+                        run = []
+                    run.append(k)
+                groups.append(run)
+            start += len(order)
+        groups = [np.array(group, dtype=np.int16) for group in groups if len(group) > 1]
+        for group_id, group in enumerate(groups):
+            augment_group[group] = group_id
+
+        # Lengths of each run of consecutive submissions in the same phase
+        phase_lengths = {phase:[] for phase in cls.PHASES}
+        for k, (team, phase) in enumerate(structure):
+            if k > 0 and structure[k-1][1] == phase:
+                phase_lengths[phase][-1] += 1
             else:
-                self.PHASE_LENGTHS[current_phase].append(phase_length)
-                current_phase = phase
-                phase_length = 1
-        self.PHASE_LENGTHS[current_phase].append(phase_length) # don't forget last phase
+                phase_lengths[phase].append(1)
+
+        tables = {"active_team":active_team, "active_phase":active_phase, "expected_counts":expected_counts,
+                  "submission_slot":submission_slot, "augment_group":augment_group, "augment_groups":groups,
+                  "phase_lengths":phase_lengths}
+        for table in tables.values():
+            if isinstance(table, np.ndarray):
+                table.setflags(write=False)
+        cls._compiled[name] = tables
+        return tables
+
+    def __init__(self, draft_type = 'default'):
+        if draft_type not in Draft.draft_structures:
+            raise InvalidDraftFormat("Draft structure {} not defined".format(draft_type))
+        self.draft_type = draft_type
+        self._draft_structure = Draft.draft_structures[draft_type]
+        tables = Draft._compiled.get(draft_type) or Draft._compile(draft_type)
+
+        self.active_team = tables["active_team"]
+        self.active_phase = tables["active_phase"]
+        self.expected_counts = tables["expected_counts"]
+        self.submission_slot = tables["submission_slot"]
+        self.augment_group = tables["augment_group"]
+        self.augment_groups = tables["augment_groups"]
+
+        self.PHASE_LENGTHS = tables["phase_lengths"]
+        self.NUM_SUBMISSIONS = len(self._draft_structure)
         self.NUM_BANS = sum(self.PHASE_LENGTHS[Draft.BAN]) # Total number of bans in draft
         self.NUM_PICKS = sum(self.PHASE_LENGTHS[Draft.PICK]) # Total number of picks in draft
 
         # submission_dist[k] gives tuple of counts for pick types just before kth submission is made (last element will hold final submission distribution for draft)
-        self.submission_dist = [(0,0,0)]
-        for (team, phase) in self._draft_structure:
-            (cur_ban, cur_blue, cur_red) = self.submission_dist[-1]
-            if phase == Draft.BAN:
-                next_dist = (cur_ban+1, cur_blue, cur_red)
-            elif team == Draft.BLUE_TEAM:
-                next_dist = (cur_ban, cur_blue+1, cur_red)
-            else:
-                next_dist = (cur_ban, cur_blue, cur_red+1)
-            self.submission_dist += [next_dist]
+        self.submission_dist = [tuple(counts) for counts in self.expected_counts.tolist()]
+        self._active_teams = [None if team == Draft.TERMINAL else team for team in self.active_team.tolist()]
+        self._active_phases = [None if phase == Draft.TERMINAL else phase for phase in self.active_phase.tolist()]
+
+    def __len__(self):
+        return self.NUM_SUBMISSIONS
+
+    def augment_permutations(self):
+        """
+        Returns every reordering of the draft's submissions which only exchanges submissions within the same augment group.
+        The permutations are built once per format and shared.
+        Returns:
+            permutations (numpy array): (num_orderings, NUM_SUBMISSIONS) array where permutations[p,k] is the index (in draft
+                order) of the submission made kth under ordering p. permutations[0] is the identity ordering.
+        """
+        tables = Draft._compiled[self.draft_type]
+        if "augment_permutations" not in tables:
+            identity = list(range(self.NUM_SUBMISSIONS))
+            orderings = []
+            for group_orders in itertools.product(*[itertools.permutations(group.tolist()) for group in self.augment_groups]):
+                ordering = identity[:]
+                for group, order in zip(self.augment_groups, group_orders):
+                    for k, submission in zip(group.tolist(), order):
+                        ordering[k] = submission
+                orderings.append(ordering)
+            permutations = np.array(orderings, dtype=np.int16).reshape(-1, self.NUM_SUBMISSIONS)
+            permutations.setflags(write=False)
+            tables["augment_permutations"] = permutations
+        return tables["augment_permutations"]
 
     def get_active_team(self, submission_count):
         """
@@ -96,29 +179,31 @@ class Draft(object):
         Args:
             submission_count (int): number of submissions currently submitted to draft
         Returns:
-            Draft.BLUE_TEAM if blue is active, else Draft.RED_TEAM
+            Draft.BLUE_TEAM if blue is active, Draft.RED_TEAM if red is active or None if the draft is complete
         """
-        if submission_count > len(self._draft_structure):
-            raise
-        elif submission_count == len(self._draft_structure):
-            return None
-        (team, sub_type) = self._draft_structure[submission_count]
-        return team
+        if 0 <= submission_count <= self.NUM_SUBMISSIONS:
+            return self._active_teams[submission_count]
+        raise InvalidSubmissionCount("Submission count {} out of range for {} draft with {} submissions".format(
+            submission_count, self.draft_type, self.NUM_SUBMISSIONS))
 
     def get_active_phase(self, submission_count):
         """
         Returns phase identifier for current phase of the draft based on the number of submissions made.
         Args:
-            None
+            submission_count (int): number of submissions currently submitted to draft
         Returns:
-            Draft.BAN if state is in banning phase, otherwise Draft.PICK
+            Draft.BAN if state is in banning phase, Draft.PICK if it is in a picking phase or None if the draft is complete
         """
-        if submission_count > len(self._draft_structure):
-            raise
-        elif submission_count == len(self._draft_structure):
-            return None
-        (team, sub_type) = self._draft_structure[submission_count]
-        return sub_type
+        if 0 <= submission_count <= self.NUM_SUBMISSIONS:
+            return self._active_phases[submission_count]
+        raise InvalidSubmissionCount("Submission count {} out of range for {} draft with {} submissions".format(
+            submission_count, self.draft_type, self.NUM_SUBMISSIONS))
+
+Draft.register('default', [(Draft.BAN, "BRBRBR"), (Draft.PICK, "BRRBBR"), (Draft.BAN, "RBRB"), (Draft.PICK, "RBBR")])
+Draft.register('no_bans', [(Draft.PICK, "BRRBBR"), (Draft.PICK, "RBBR")])
+# Expanded (team, phase) submission lists of the built-in formats
+Draft.default_draft = Draft.draft_structures['default']
+Draft.no_bans = Draft.draft_structures['no_bans']
 
 if __name__ == "__main__":
     draft = Draft("default")
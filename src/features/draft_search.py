@@ -0,0 +1,317 @@
+import time
+import math
+import numpy as np
+
+from .draftstate import DraftState
+
+class SearchNode():
+    """
+    Args:
+        parent (SearchNode): node this node was reached from. None for the root of the search tree.
+        submission (tuple): (team, champion_id, position) submission which leads from parent to this node. Position is
+            given from the perspective of the submitting team (position = -1 for bans).
+        prior (float): prior probability assigned to submission by the network
+        edge_value (float): Q-value estimated for submission from the submitting team's perspective
+
+    SearchNode holds the visit statistics for a single draft state visited during a tree search. Each node keeps one DraftState per
+    team perspective so that the network can be queried from the point of view of whichever team is submitting. Nodes are created
+    without states when their parent is expanded and their states are only materialized the first time the node is selected.
+    """
+    def __init__(self, parent=None, submission=None, prior=1., edge_value=0.):
+        self.parent = parent
+        self.submission = submission
+        self.prior = prior
+        self.edge_value = edge_value
+
+        self.states = None
+        self.active_team = None
+        self.children = []
+        self.is_expanded = False
+        self.value = None
+        self.visit_count = 0
+        self.value_sum = 0.
+        self.virtual_loss = 0
+
+    def materialize(self, states=None):
+        """
+        Builds the DraftStates for this node by applying its submission to (copies of) its parent's states.
+        Args:
+            states (dict, optional): DraftStates keyed by team to use directly (used for the root node)
+        Returns:
+            None
+        """
+        if states is None:
+            (team, champion_id, position) = self.submission
+            states = {}
+            for perspective, parent_state in self.parent.states.items():
+                state = parent_state.copy()
+                # Picks made by the opposing team are masked to position 0 for each perspective
+                state.update(champion_id, position if (perspective == team or position == -1) else 0)
+                states[perspective] = state
+        self.states = states
+
+        state = self.states[DraftState.BLUE_TEAM]
+        if state.evaluate() == 0:
+            self.active_team = state.draft_structure.get_active_team(len(state.bans)+len(state.picks))
+        else:
+            # Draft is either complete or invalid
+            self.active_team = None
+
+    def mean_value(self):
+        if self.visit_count == 0:
+            return None
+        return self.value_sum/self.visit_count
+
+class DraftPlanner():
+    """
+    Args:
+        model (QNetInferenceModel): model used to estimate Q-values for draft states. model.predict(states) must return
+            Q-values for each state with invalid actions set to -inf.
+        time_budget (float): wall-clock time (in seconds) allowed for each search
+        max_simulations (int, optional): maximum number of simulations to run per search. If None, the search runs until
+            time_budget is exhausted.
+        batch_size (int): number of leaves selected (and evaluated with a single call to the model) per search iteration
+        max_children (int): number of highest valued submissions considered when expanding a node
+        c_puct (float): exploration constant weighting network priors against observed values
+        temperature (float): temperature of the softmax used to convert Q-values into prior probabilities
+
+    DraftPlanner runs a bounded-time Monte Carlo tree search over future submissions of the draft. The search is carried out from
+    the perspective of the team which owns the root state (the "planning team"). The Q-network is used in two ways:
+        1) As a prior: when a node is expanded, the Q-values of the submitting team are passed through a softmax to give the
+           prior probability of each of its max_children best submissions.
+        2) As a value estimate: the value of a leaf is the largest Q-value amongst the planning team's valid actions at that leaf.
+    Nodes where the planning team submits select children maximizing the value while nodes where the opposing team submits
+    select children minimizing it. Leaves are selected in batches using virtual loss so that all of the states in a batch
+    are sent through the network together.
+    """
+    def __init__(self, model, time_budget=1., max_simulations=None, batch_size=32, max_children=12, c_puct=1.5, temperature=1.):
+        self.model = model
+        self.time_budget = time_budget
+        self.max_simulations = max_simulations
+        self.batch_size = batch_size
+        self.max_children = max_children
+        self.c_puct = c_puct
+        self.temperature = temperature
+
+        self._team = None
+        self._min_value = None
+        self._max_value = None
+
+    def search(self, state, opponent_state=None):
+        """
+        Searches the draft tree starting from the input state until the time budget (or simulation limit) is exhausted.
+        Args:
+            state (DraftState): current state of the draft from the planning team's perspective
+            opponent_state (DraftState, optional): current state of the draft from the opposing team's perspective. If not
+                provided it is reconstructed using mirror_state().
+        Returns:
+            result (dict): dictionary with the following keys:
+                "line": list of (team, champion_id, position) submissions following the most visited path through the tree
+                "candidates": list of (champion_id, position, visits, value, prior) tuples for each submission considered
+                    from the root, ordered by visit count
+                "simulations": number of simulations completed
+                "elapsed": wall-clock time used by the search
+        """
+        t0 = time.perf_counter()
+        self._team = state.team
+        self._min_value = None
+        self._max_value = None
+        if opponent_state is None:
+            opponent_state = mirror_state(state)
+
+        root = SearchNode()
+        root.materialize({state.team:state.copy(), opponent_state.team:opponent_state.copy()})
+        if root.active_team is None:
+            return {"line":[], "candidates":[], "simulations":0, "elapsed":time.perf_counter()-t0}
+        self.evaluate([root])
+
+        simulations = 0
+        while(time.perf_counter()-t0 < self.time_budget):
+            if self.max_simulations is not None and simulations >= self.max_simulations:
+                break
+            n_leaves = self.batch_size
+            if self.max_simulations is not None:
+                n_leaves = min(n_leaves, self.max_simulations-simulations)
+
+            # Select a batch of leaves. Virtual loss is applied along each selected path so that
+            # subsequent selections within the batch are steered towards different leaves.
+            leaves = []
+            for _ in range(n_leaves):
+                leaf = self.select(root)
+                node = leaf
+                while node is not None:
+                    node.virtual_loss += 1
+                    node = node.parent
+                leaves.append(leaf)
+
+            # Several selections may reach the same leaf, which only needs to be evaluated once
+            unexpanded = []
+            seen = set()
+            for leaf in leaves:
+                if not leaf.is_expanded and leaf not in seen:
+                    seen.add(leaf)
+                    unexpanded.append(leaf)
+            self.evaluate(unexpanded)
+
+            for leaf in leaves:
+                node = leaf
+                while node is not None:
+                    node.virtual_loss -= 1
+                    node = node.parent
+                self.backup(leaf, leaf.value)
+            simulations += len(leaves)
+
+        return self.summarize(root, simulations, time.perf_counter()-t0)
+
+    def select(self, root):
+        """
+        Descends the tree from root choosing the child with the best upper confidence score at each node until a leaf
+        (a node which has not been expanded or a terminal node) is reached.
+        """
+        node = root
+        while node.is_expanded and node.children:
+            parent_visits = node.visit_count + node.virtual_loss
+            parent_value = self._normalize(node.mean_value(), node.active_team)
+            exploration = self.c_puct*math.sqrt(parent_visits+1)
+
+            best_score = -np.inf
+            best_child = None
+            for child in node.children:
+                n = child.visit_count + child.virtual_loss
+                if child.visit_count > 0:
+                    # Pending virtual losses count as worst-case outcomes for the submitting team
+                    q = self._normalize(child.mean_value(), node.active_team)*child.visit_count/n
+                else:
+                    q = parent_value
+                score = q + exploration*child.prior/(1+n)
+                if score > best_score:
+                    best_score = score
+                    best_child = child
+            node = best_child
+            if node.states is None:
+                node.materialize()
+        return node
+
+    def evaluate(self, nodes):
+        """
+        Expands each of the input nodes using a single batched call to the model. For each node the states from the
+        perspective of the submitting team (used for priors) and the planning team (used for values) are evaluated.
+        """
+        queries = []
+        for node in nodes:
+            if node.active_team is None:
+                continue
+            queries.append((node, node.active_team))
+            if node.active_team != self._team:
+                queries.append((node, self._team))
+
+        q_vals = {}
+        if queries:
+            predicted_Q = self.model.predict([node.states[team] for (node, team) in queries])
+            for k, query in enumerate(queries):
+                q_vals[query] = predicted_Q[k,:]
+
+        for node in nodes:
+            node.is_expanded = True
+            value = None
+            if node.active_team is not None:
+                team_q = q_vals[(node, self._team)]
+                valid = np.isfinite(team_q)
+                if np.any(valid):
+                    value = float(np.max(team_q[valid]))
+            if value is None:
+                # The planning team has no submissions left to make from this node, so its value is inherited
+                # from the submission that led here.
+                parent = node.parent
+                if parent is None:
+                    value = 0.
+                elif parent.active_team == self._team:
+                    value = node.edge_value
+                else:
+                    value = parent.value
+            node.value = value
+            self._update_bounds(value)
+
+            if node.active_team is None:
+                continue
+            acting_state = node.states[node.active_team]
+            acting_q = q_vals[(node, node.active_team)]
+            valid_actions = np.flatnonzero(np.isfinite(acting_q))
+            if not valid_actions.size:
+                continue
+            if valid_actions.size > self.max_children:
+                top = np.argpartition(acting_q[valid_actions], -self.max_children)[-self.max_children:]
+                valid_actions = valid_actions[top]
+            logits = acting_q[valid_actions]/self.temperature
+            priors = np.exp(logits-np.max(logits))
+            priors /= np.sum(priors)
+            for action, prior in zip(valid_actions, priors):
+                (champion_id, position) = acting_state.format_action(action)
+                child = SearchNode(parent=node, submission=(node.active_team, champion_id, position),
+                                   prior=float(prior), edge_value=float(acting_q[action]))
+                node.children.append(child)
+
+    def backup(self, leaf, value):
+        node = leaf
+        while node is not None:
+            node.visit_count += 1
+            node.value_sum += value
+            node = node.parent
+
+    def summarize(self, root, simulations, elapsed):
+        candidates = []
+        for child in sorted(root.children, key=lambda c: c.visit_count, reverse=True):
+            (_, champion_id, position) = child.submission
+            candidates.append((champion_id, position, child.visit_count, child.mean_value(), child.prior))
+
+        line = []
+        node = root
+        while node.children:
+            node = max(node.children, key=lambda c: c.visit_count)
+            if node.visit_count == 0:
+                break
+            line.append(node.submission)
+
+        return {"line":line, "candidates":candidates, "simulations":simulations, "elapsed":elapsed}
+
+    def _update_bounds(self, value):
+        if self._min_value is None or value < self._min_value:
+            self._min_value = value
+        if self._max_value is None or value > self._max_value:
+            self._max_value = value
+
+    def _normalize(self, value, team):
+        """
+        Rescales value into [0,1] using the range of values seen so far in the search. Values are given from
+        the planning team's perspective, so they are reversed for the opposing team.
+        """
+        if value is None or self._max_value is None or self._max_value <= self._min_value:
+            return 0.5
+        norm = (value-self._min_value)/(self._max_value-self._min_value)
+        if team != self._team:
+            norm = 1.-norm
+        return norm
+
+def mirror_state(state):
+    """
+    Builds the state of the draft as seen by the team opposing state.team. Picks made by state.team are masked to position 0.
+    Since the positions of the opposing team's picks are masked in state, these are assigned to the opposing team's open
+    positions in the order they were submitted.
+    Args:
+        state (DraftState): state of the draft
+    Returns:
+        mirror (DraftState): state of the draft from the opposing perspective
+    """
+    team = DraftState.RED_TEAM if state.team == DraftState.BLUE_TEAM else DraftState.BLUE_TEAM
+    champ_ids = [state.get_champ_id(i) for i in range(state.num_champions)]
+    mirror = DraftState(team, champ_ids, state.num_positions, state.draft_structure)
+    for champion_id in state.bans:
+        mirror.update(champion_id, -1)
+
+    open_positions = [pos for pos in range(1, state.num_positions+1)]
+    for (champion_id, position) in zip(state.picks, state.selected_pos):
+        if position == 0:
+            mirror.update(champion_id, open_positions.pop(0))
+        else:
+            mirror.update(champion_id, 0)
+    return mirror
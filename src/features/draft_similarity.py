@@ -0,0 +1,203 @@
+import numpy as np
+
+from .draftstate import DraftState
+from .match_processing import build_action_queue, MissingSubmissions
+
+# Number of set bits in each byte value
+POPCOUNT8 = np.array([bin(k).count("1") for k in range(256)], dtype=np.uint8)
+
+# Channels compared between drafts. Each is a set of champions taken from a team's perspective, with "ally" holding every
+# champion picked by the team (regardless of position) so that the same champion drafted into a different role still counts.
+CHANNELS = ["ban", "enemy", "ally", "pos_1", "pos_2", "pos_3", "pos_4", "pos_5"]
+DEFAULT_WEIGHTS = {"ban":0.5, "enemy":1.0, "ally":0.5, "pos_1":1.0, "pos_2":1.0, "pos_3":1.0, "pos_4":1.0, "pos_5":1.0}
+
+def popcount(packed, axis=-1):
+    """
+    Returns the number of set bits in packed (uint8) arrays summed along axis.
+    """
+    return POPCOUNT8[packed].sum(axis=axis, dtype=np.int32)
+
+class DraftSimilarityIndex(object):
+    """
+    DraftSimilarityIndex finds the historical drafts which most resemble a (possibly incomplete) DraftState.
+
+    Each indexed game is stored once from each team's perspective as the sequence of state bits set by its submissions
+    (in draft order). A draft is compared with a historical draft by splitting both into the champion sets in CHANNELS and
+    computing the weighted Jaccard similarity
+        sum_c w_c*|A_c & B_c| / sum_c w_c*|A_c | B_c|
+    over the channels. Channel sets are held as packed bitsets so a search is a single vectorized AND and popcount scan
+    over all indexed drafts. Partially completed queries are compared against the historical drafts as they stood after
+    the same number of submissions, the bitsets for which are built once per draft stage and cached.
+    Args:
+        matches (list(dict), optional): matches to index (see data.database_ops.get_match_data())
+        weights (dict, optional): weight of each channel in CHANNELS
+    """
+    def __init__(self, matches=None, weights=None):
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights:
+            self.weights.update(weights)
+        self._template = DraftState(DraftState.BLUE_TEAM)
+        self.num_champions = self._template.num_champions
+        self.num_submissions = self._template.draft_structure.NUM_SUBMISSIONS
+        self.game_ids = np.zeros(0, dtype=np.int64)
+        self.teams = np.zeros(0, dtype=np.int8)
+        self.won = np.zeros(0, dtype=bool)
+        self.metadata = []
+        # (channel, champion index) of each submission in draft order, or -1 for null submissions
+        self.channels = np.zeros((0, self.num_submissions), dtype=np.int8)
+        self.champions = np.zeros((0, self.num_submissions), dtype=np.int16)
+        self._stages = {}
+        if matches:
+            self.add_matches(matches)
+
+    def __len__(self):
+        return len(self.game_ids)
+
+    def _encode_submission(self, team, side, champion_id, position):
+        if champion_id is None or champion_id not in self._template.champ_id_to_state_index:
+            return (-1, -1)
+        if position == -1:
+            channel = CHANNELS.index("ban")
+        elif side != team:
+            channel = CHANNELS.index("enemy")
+        else:
+            channel = CHANNELS.index("pos_{}".format(position))
+        return (channel, self._template.champ_id_to_state_index[champion_id])
+
+    def add_matches(self, matches):
+        """
+        Adds matches to the index from both teams' perspectives. Matches missing picks or bans are skipped.
+        Args:
+            matches (list(dict)): matches to index (see data.database_ops.get_match_data())
+        Returns:
+            n_skipped (int): number of matches skipped
+        """
+        game_ids, teams, won, channels, champions = [], [], [], [], []
+        n_skipped = 0
+        for match in matches:
+            try:
+                queue = list(build_action_queue(match))
+            except MissingSubmissions as e:
+                print("Skipping match: {}".format(e))
+                n_skipped += 1
+                continue
+            for team in [DraftState.BLUE_TEAM, DraftState.RED_TEAM]:
+                encoded = [self._encode_submission(team, side, cid, pos) for (side, cid, pos) in queue]
+                game_ids.append(match["id"])
+                teams.append(team)
+                won.append(match["winner"] == team)
+                channels.append([channel for (channel, _) in encoded])
+                champions.append([index for (_, index) in encoded])
+                self.metadata.append({key:match.get(key) for key in ["blue_team", "red_team", "patch", "tournament"]})
+        self.game_ids = np.concatenate([self.game_ids, np.array(game_ids, dtype=np.int64)])
+        self.teams = np.concatenate([self.teams, np.array(teams, dtype=np.int8)])
+        self.won = np.concatenate([self.won, np.array(won, dtype=bool)])
+        self.channels = np.concatenate([self.channels, np.array(channels, dtype=np.int8).reshape(-1, self.num_submissions)])
+        self.champions = np.concatenate([self.champions, np.array(champions, dtype=np.int16).reshape(-1, self.num_submissions)])
+        self._stages = {}
+        return n_skipped
+
+    def _pack(self, channels, champions):
+        """
+        Builds the packed channel bitsets of drafts given the (channel, champion index) of each of their submissions.
+        Args:
+            channels (numpy array): (n_drafts, n_submissions) channel of each submission, or -1 for none
+            champions (numpy array): (n_drafts, n_submissions) champion index of each submission
+        Returns:
+            packed (numpy array of uint8): (n_drafts, len(CHANNELS), ceil(num_champions/8)) packed bitsets
+        """
+        n = channels.shape[0]
+        bits = np.zeros((n, len(CHANNELS), self.num_champions), dtype=bool)
+        rows, cols = np.nonzero(channels >= 0)
+        bits[rows, channels[rows, cols], champions[rows, cols]] = True
+        ally = CHANNELS.index("ally")
+        bits[:,ally,:] = bits[:,ally+1:,:].any(axis=1)
+        return np.packbits(bits, axis=2)
+
+    def stage(self, n_submissions):
+        """
+        Returns the packed channel bitsets of every indexed draft as it stood after n_submissions submissions along with
+        the size of each channel set.
+        """
+        n_submissions = min(n_submissions, self.num_submissions)
+        if n_submissions not in self._stages:
+            channels = self.channels.copy()
+            channels[:,n_submissions:] = -1
+            packed = self._pack(channels, self.champions)
+            self._stages[n_submissions] = (packed, popcount(packed))
+        return self._stages[n_submissions]
+
+    def encode_state(self, state):
+        """
+        Returns the packed channel bitsets of a DraftState.
+        """
+        channels, champions = [], []
+        for pos_index in range(state.state.shape[1]):
+            position = state.get_position(pos_index)
+            if position == -1:
+                channel = CHANNELS.index("ban")
+            elif position == 0:
+                channel = CHANNELS.index("enemy")
+            else:
+                channel = CHANNELS.index("pos_{}".format(position))
+            for index in np.flatnonzero(state.state[:,pos_index]):
+                channels.append(channel)
+                champions.append(index)
+        return self._pack(np.array([channels], dtype=np.int8).reshape(1, -1), np.array([champions], dtype=np.int16).reshape(1, -1))[0]
+
+    def similarity(self, state, same_stage=True, team=None):
+        """
+        Computes the weighted Jaccard similarity between state and every indexed draft.
+        Args:
+            state (DraftState): query draft
+            same_stage (bool): if True historical drafts are compared as they stood after as many submissions as state
+                has, otherwise their completed drafts are used
+            team (int, optional): only drafts from this team's perspective are scored (others are given similarity -1).
+                Defaults to state.team since the side a team drafts from determines its draft order.
+        Returns:
+            similarity (numpy array): (len(self),) similarity of each indexed draft
+        """
+        if team is None:
+            team = state.team
+        n_submissions = len(state.bans)+len(state.picks) if same_stage else self.num_submissions
+        (drafts, sizes) = self.stage(n_submissions)
+        query = self.encode_state(state)
+        weights = np.array([self.weights[channel] for channel in CHANNELS], dtype=np.float32)
+        # |A | B| = |A| + |B| - |A & B| so only the intersection needs to be counted per query
+        overlap = popcount(drafts & query)
+        intersection = overlap.dot(weights)
+        union = (sizes+popcount(query)-overlap).dot(weights)
+        similarity = np.where(union > 0, intersection/np.maximum(union, 1.e-6), 1.)
+        if team is not None:
+            similarity[self.teams != team] = -1.
+        return similarity
+
+    def search(self, state, k=10, same_stage=True, team=None, exclude_ids=None):
+        """
+        Returns the k indexed drafts most similar to state along with their outcomes.
+        Args:
+            state (DraftState): query draft
+            k (int): number of drafts to return
+            same_stage (bool): see similarity()
+            team (int, optional): see similarity()
+            exclude_ids (list(int), optional): game ids which should not be returned (ie the game the query was taken from)
+        Returns:
+            results (list(dict)): results in decreasing order of similarity. Each is a dictionary with keys
+                "id", "team", "similarity", "won" and the "blue_team", "red_team", "patch" and "tournament" of the game
+        """
+        similarity = self.similarity(state, same_stage, team)
+        if exclude_ids:
+            similarity[np.isin(self.game_ids, exclude_ids)] = -1.
+        candidates = np.flatnonzero(similarity >= 0)
+        k = min(k, len(candidates))
+        if k == 0:
+            return []
+        top = candidates[np.argpartition(-similarity[candidates], k-1)[:k]]
+        top = top[np.argsort(-similarity[top], kind="stable")]
+        results = []
+        for row in top:
+            result = {"id":int(self.game_ids[row]), "team":int(self.teams[row]), "similarity":float(similarity[row]),
+                      "won":bool(self.won[row])}
+            result.update(self.metadata[row])
+            results.append(result)
+        return results
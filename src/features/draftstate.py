@@ -5,6 +5,40 @@ from .draft import Draft
 class InvalidDraftState(Exception):
     pass
 
+# Seed of the random keys used to hash states. Hashes are only comparable between states hashed with the same keys.
+ZOBRIST_SEED = 1752
+_zobrist_tables = {}
+
+def zobrist_keys(num_champions, num_positions):
+    """
+    Returns the random 64-bit keys used to hash DraftStates of the given dimensions. The hash of a state is the XOR of
+        - bits[c,k] for every set state bit state[c,k]
+        - team[t] for the team perspective t of the state
+        - counts[n % len(counts)] for the number of submissions n made so far (including null bans)
+    so it can be maintained incrementally as submissions are made. Keys are generated once per set of dimensions and
+    shared by every state.
+    Args:
+        num_champions (int): number of champions in the state
+        num_positions (int): number of positions in the state
+    Returns:
+        keys (dict): dictionary with keys "bits" ((num_champions, num_positions+2) uint64 array), "team" and "counts"
+            (uint64 arrays) along with "bit_list", "team_list" and "count_list" holding the same keys as (nested) lists
+            of Python ints for scalar updates
+    """
+    shape = (num_champions, num_positions+2)
+    if shape not in _zobrist_tables:
+        num_bits = shape[0]*shape[1]
+        num_counts = num_bits+1
+        rng = np.random.RandomState(ZOBRIST_SEED)
+        keys = np.frombuffer(rng.bytes(8*(num_bits+2+num_counts)), dtype="<u8").astype(np.uint64)
+        keys.setflags(write=False)
+        bits = keys[:num_bits].reshape(shape)
+        team = keys[num_bits:num_bits+2]
+        counts = keys[num_bits+2:]
+        _zobrist_tables[shape] = {"bits":bits, "team":team, "counts":counts,
+                                  "bit_list":bits.tolist(), "team_list":team.tolist(), "count_list":counts.tolist()}
+    return _zobrist_tables[shape]
+
 class DraftState:
     """
     Args:
@@ -72,6 +106,28 @@ class DraftState:
         self.pos_to_pos_index = dict(zip(self.positions,self.pos_indices))
         self.pos_index_to_pos = dict(zip(self.pos_indices,self.positions))
 
+        # 64-bit Zobrist hash of the state (see zobrist_keys()), maintained incrementally as submissions are made so that
+        # states can be compared and used as dictionary keys without inspecting the state array.
+        self.zobrist_hash = self._initial_hash()
+
+    def copy(self):
+        """
+        Returns a copy of this draft state which is safe to update independently of the original. This is considerably
+        cheaper than deepcopy() since the champion/position mappings and draft structure are never modified after
+        construction and can be shared between copies.
+        Args:
+            None
+        Returns:
+            state (DraftState): independent copy of this state
+        """
+        new_state = object.__new__(DraftState)
+        new_state.__dict__.update(self.__dict__)
+        new_state.state = self.state.copy()
+        new_state.picks = self.picks[:]
+        new_state.bans = self.bans[:]
+        new_state.selected_pos = self.selected_pos[:]
+        return new_state
+
     def reset(self):
         """
         Resets draft state back to default values.
@@ -84,6 +140,35 @@ class DraftState:
         self.picks = []
         self.bans = []
         self.selected_pos = []
+        self.zobrist_hash = self._initial_hash()
+
+    def _initial_hash(self):
+        keys = zobrist_keys(self.num_champions, self.num_positions)
+        return keys["team_list"][self.team] ^ keys["count_list"][0]
+
+    def _hash_submission(self, index=None, pos_index=None):
+        """
+        Updates zobrist_hash for a submission which has just been added to the pick or ban list. Must be called before
+        the submission's state bit state[index,pos_index] is set (index = None for null submissions).
+        """
+        keys = zobrist_keys(self.num_champions, self.num_positions)
+        counts = keys["count_list"]
+        n = len(self.picks)+len(self.bans)
+        self.zobrist_hash ^= counts[(n-1) % len(counts)] ^ counts[n % len(counts)]
+        if index is not None and not self.state[index,pos_index]:
+            self.zobrist_hash ^= keys["bit_list"][index][pos_index]
+
+    def compute_hash(self):
+        """
+        Computes the Zobrist hash of the state from scratch. The result always equals zobrist_hash, which is maintained
+        incrementally and should be preferred.
+        Returns:
+            hash (int): 64-bit hash of the state
+        """
+        keys = zobrist_keys(self.num_champions, self.num_positions)
+        n = len(self.picks)+len(self.bans)
+        bits = int(np.bitwise_xor.reduce(keys["bits"][self.state])) if self.state.any() else 0
+        return bits ^ keys["team_list"][self.team] ^ keys["count_list"][n % len(keys["count_list"])]
 
     def get_valid_actions(self, form="mask"):
         """
@@ -304,6 +389,7 @@ class DraftState:
         if (champion_id is None and position == -1):
             # Only append NULL bans to ban list (nothing done to state matrix)
             self.bans.append(champion_id)
+            self._hash_submission()
             return True
 
         # Submitted picks of the form (champ_id, pos) correspond with the selection champion = champion_id in position = pos.
@@ -320,6 +406,7 @@ class DraftState:
             self.picks.append(champion_id)
             self.selected_pos.append(position)
 
+        self._hash_submission(index, pos_index)
         self.state[index,pos_index] = True
         return True
 
@@ -376,6 +463,7 @@ class DraftState:
         self.selected_pos.append(position)
         index = self.get_state_index(champion_id)
         pos_index = self.get_position_index(position)
+        self._hash_submission(index, pos_index)
         self.state[index,pos_index] = True
         return True
 
@@ -390,7 +478,9 @@ class DraftState:
             return False
         self.bans.append(champion_id)
         index = self.get_state_index(champion_id)
-        self.state[index,self.get_position_index(-1)] = True
+        pos_index = self.get_position_index(-1)
+        self._hash_submission(index, pos_index)
+        self.state[index,pos_index] = True
         return True
 
     def evaluate(self):
@@ -457,6 +547,132 @@ class DraftState:
         # Draft is valid, but not complete
         return 0
 
+class DualDraftState:
+    """
+    Args:
+        champ_ids (list(int)) : list of valid championids which are available for drafting.
+        num_positions (int) : number of available positions to draft for. Default is 5 for a standard 5x5 draft.
+        draft (Draft) : structure of the draft being followed
+
+    DualDraftState records the draft for both teams at once so that each submission only needs to be ingested a single time.
+    The joint state is stored as a (numChampions) x (2*numPositions+1) numPy array. If joint_state(c,k) = 1 then:
+        - k = 0 -> champion c is banned from selection.
+        - 1 <= k <= num_positions -> champion c is selected by blue as position k.
+        - num_positions < k <= 2*num_positions -> champion c is selected by red as position k-num_positions.
+
+    The DraftState seen by either team (with the positions of the opposing team's picks masked) is produced on demand using view().
+    The Zobrist hash of each team's view is maintained as submissions are made so views never need to be rehashed.
+    """
+    def __init__(self, champ_ids = get_champion_ids(), num_positions = 5, draft = Draft('default')):
+        self.num_champions = len(champ_ids)
+        self.num_positions = num_positions
+        self.draft_structure = draft
+        self.joint_state = np.zeros((self.num_champions, 2*self.num_positions+1), dtype=bool)
+        self.picks = []
+        self.pick_teams = []
+        self.pick_positions = []
+        self.bans = []
+        self._templates = {team:DraftState(team, champ_ids, num_positions, draft) for team in [DraftState.BLUE_TEAM, DraftState.RED_TEAM]}
+        self.champ_id_to_state_index = self._templates[DraftState.BLUE_TEAM].champ_id_to_state_index
+        self.hashes = {team:template.zobrist_hash for team, template in self._templates.items()}
+
+    def reset(self):
+        """
+        Resets draft state back to default values.
+        """
+        self.joint_state[:] = False
+        self.picks = []
+        self.pick_teams = []
+        self.pick_positions = []
+        self.bans = []
+        self.hashes = {team:template.zobrist_hash for team, template in self._templates.items()}
+
+    def get_active_team(self):
+        """
+        Returns the team making the next submission, or None if the draft has been completed.
+        """
+        return self.draft_structure.get_active_team(len(self.bans)+len(self.picks))
+
+    def update(self, team, champion_id, position):
+        """
+        Attempt to update the joint state of the draft with a submission made by team.
+        Returns: True is selection was successful, False otherwise
+        Args:
+            team (int): team making the submission (BLUE_TEAM or RED_TEAM)
+            champion_id (int): Id of champion submitted.
+            position (int): Position of champion to be selected. position = -1 -> champion ban submitted, otherwise
+                0 < position <= num_positions is the position the champion is selected for by team.
+        """
+        # Special case for NULL ban submitted.
+        if (champion_id is None and position == -1):
+            self.bans.append(champion_id)
+            self._hash_submission(team)
+            return True
+
+        if((position < -1) or (position == 0) or (position > self.num_positions) or (not valid_champion_id(champion_id))):
+            return False
+
+        index = self.champ_id_to_state_index[champion_id]
+        if(position == -1):
+            self.bans.append(champion_id)
+        else:
+            self.picks.append(champion_id)
+            self.pick_teams.append(team)
+            self.pick_positions.append(position)
+        self._hash_submission(team, index, position)
+        if(position == -1):
+            self.joint_state[index,0] = True
+        else:
+            self.joint_state[index,self._team_offset(team)+position] = True
+        return True
+
+    def _hash_submission(self, team, index=None, position=None):
+        """
+        Updates the hash of each team's view for a submission by team which has just been added to the pick or ban list.
+        Must be called before the submission is recorded in joint_state (index = None for null submissions).
+        """
+        keys = zobrist_keys(self.num_champions, self.num_positions)
+        counts = keys["count_list"]
+        n = len(self.picks)+len(self.bans)
+        count_key = counts[(n-1) % len(counts)] ^ counts[n % len(counts)]
+        for perspective in self.hashes:
+            self.hashes[perspective] ^= count_key
+            if index is None:
+                continue
+            if position == -1:
+                (pos_index, is_set) = (1, self.joint_state[index,0])
+            elif perspective == team:
+                (pos_index, is_set) = (position+1, self.joint_state[index,self._team_offset(team)+position])
+            else:
+                offset = self._team_offset(team)
+                (pos_index, is_set) = (0, self.joint_state[index,offset+1:offset+self.num_positions+1].any())
+            if not is_set:
+                self.hashes[perspective] ^= keys["bit_list"][index][pos_index]
+
+    def view(self, team):
+        """
+        Produces the DraftState of the current draft as seen by team. Picks submitted by the opposing team are masked to
+        position 0. The returned state is independent of the joint state and may be updated freely.
+        Args:
+            team (int): team perspective to produce (BLUE_TEAM or RED_TEAM)
+        Returns:
+            state (DraftState): state of the draft from team's perspective
+        """
+        state = self._templates[team].copy()
+        own = self._team_offset(team)
+        opp = self._team_offset(DraftState.RED_TEAM if team == DraftState.BLUE_TEAM else DraftState.BLUE_TEAM)
+        state.state[:,state.get_position_index(-1)] = self.joint_state[:,0]
+        state.state[:,state.get_position_index(0)] = np.amax(self.joint_state[:,opp+1:opp+self.num_positions+1], axis=1)
+        state.state[:,2:] = self.joint_state[:,own+1:own+self.num_positions+1]
+        state.picks = self.picks[:]
+        state.bans = self.bans[:]
+        state.selected_pos = [pos if pick_team == team else 0 for (pick_team, pos) in zip(self.pick_teams, self.pick_positions)]
+        state.zobrist_hash = self.hashes[team]
+        return state
+
+    def _team_offset(self, team):
+        return 0 if team == DraftState.BLUE_TEAM else self.num_positions
+
 if __name__=="__main__":
     state = DraftState(DraftState.BLUE_TEAM)
     print(state.evaluate())
@@ -1,12 +1,18 @@
 from collections import deque
-from .draftstate import DraftState
-from .rewards import get_reward
+from .draft import Draft
+from .draftstate import DraftState, DualDraftState
+from .rewards import get_reward, get_rewards, get_winning_team, REWARD_TABLE
 from copy import deepcopy
 
+import numpy as np
 import random
-import json
 
-def process_match(match, team, augment_data=True):
+DEFAULT_DRAFT = Draft('default')
+
+class MissingSubmissions(Exception):
+    pass
+
+def process_match(match, team, augment_data=True, ordering=None):
     """
     process_match takes an input match and breaks each incremental pick and ban down the draft into experiences (aka "memories").
 
@@ -16,6 +22,7 @@ def process_match(match, team, augment_data=True):
             The selected team has the positions for each pick explicitly included with the experience while the
             "opposing" team has the assigned positions for its champion picks masked.
         augment_data (optional) (bool): flag controlling the randomized ordering of submissions that do not affect the draft as a whole
+        ordering (optional) (int): index of a specific submission ordering to use (see build_augmented_action_queue())
     Returns:
         experiences ( list(tuple) ): list of experience tuples. Each experience is of the form (s, a, r, s') where:
             - s and s' are DraftState states before and after a single action
@@ -28,38 +35,7 @@ def process_match(match, team, augment_data=True):
     """
     experiences = []
 
-    # This section controls data agumentation of the match. Certain submissions in the draft are
-    # submitted consecutively by the same team during the same phase (ie team1 pick0 -> team1 pick1).
-    # Although these submissions were produced in a particular order, from a draft perspective
-    # there is no difference between submissions of the form
-    # team1 pick0 -> team1 pick1 vs team1 pick1 -> team0 pickA
-    # provided that the two picks are from the same phase (both bans or both picks).
-    # Therefore it is possible to augment the order in which these submissions are processed.
-
-    # Note that we can also augment the banning phase if desired. Although these submissions technically
-    # fall outside of the conditions listed above, in practice bans made in the same phase are
-    # interchangable in order.
-
-    # Build queue of actions from match reference (augmenting if desired)
-    augments_list = [
-        ("blue","bans",slice(0,3)), # Blue bans 0,1,2 are augmentable
-        ("blue","bans",slice(3,5)), # Blue bans 3,4 are augmentable
-        ("red","bans",slice(0,3)),
-        ("red","bans",slice(3,5)),
-        ("blue","picks",slice(1,3)), # Blue picks 1,2 are augmentable
-        ("blue","picks",slice(3,5)), # Blue picks 3,4 are augmentable
-        ("red","picks",slice(0,2)) # Red picks 0,1 are augmentable
-    ]
-    if(augment_data):
-        augmented_match = deepcopy(match) # Deepcopy match to avoid side effects
-        for aug in augments_list:
-            (k1,k2,aug_range) = aug
-            count = len(augmented_match[k1][k2][aug_range])
-            augmented_match[k1][k2][aug_range] = random.sample(augmented_match[k1][k2][aug_range],count)
-
-        action_queue = build_action_queue(augmented_match)
-    else:
-        action_queue = build_action_queue(match)
+    action_queue = build_augmented_action_queue(match, augment_data, ordering)
 
     # Set up draft state
     draft = DraftState(team)
@@ -116,51 +92,151 @@ def process_match(match, team, augment_data=True):
 
     return experiences
 
-def build_action_queue(match):
+def process_match_dual(match, augment_data=True, reward_table=REWARD_TABLE, ordering=None):
+    """
+    process_match_dual produces the experiences for both teams in a match while only replaying the draft a single time. The
+    submissions are ingested into a DualDraftState and each team's (masked) view of the draft is taken from it when a memory is
+    started or finished. Each team's experiences are identical in form to those returned by process_match(match, team). When
+    augment_data is set, both teams share the same randomized submission ordering.
+
+    Args:
+        match (dict): match dictionary with pick and ban data for a single game.
+        augment_data (optional) (bool): flag controlling the randomized ordering of submissions that do not affect the draft as a whole
+        reward_table (optional) (dict): reward schedule used to compute rewards (see rewards.REWARD_TABLE)
+        ordering (optional) (int): index of a specific submission ordering to use (see build_augmented_action_queue())
+    Returns:
+        experiences (dict): dictionary mapping DraftState.BLUE_TEAM and DraftState.RED_TEAM to the list of experience tuples for that team.
+    """
+    teams = [DraftState.BLUE_TEAM, DraftState.RED_TEAM]
+    # Transitions are collected as (team, s, a, s') and their rewards computed together once the draft is complete
+    transitions = []
+    open_memories = {team:None for team in teams}
+
+    action_queue = build_augmented_action_queue(match, augment_data, ordering)
+    draft = DualDraftState()
+    while action_queue:
+        (submitting_team, pick, position) = action_queue.popleft()
+        if open_memories[submitting_team] is not None:
+            (s, a) = open_memories[submitting_team]
+            transitions.append((submitting_team, s, a, draft.view(submitting_team)))
+        open_memories[submitting_team] = (draft.view(submitting_team), (pick, position))
+        draft.update(submitting_team, pick, position)
+
+    # Store the outstanding memory for each team once the draft is complete
+    for team in teams:
+        s_next = draft.view(team)
+        if(s_next.evaluate() != DraftState.DRAFT_COMPLETE):
+            # Drafts that end in an invalid state have no terminal experience
+            continue
+        (s, a) = open_memories[team]
+        transitions.append((team, s, a, s_next))
+
+    winner = get_winning_team(match)
+    status = [s_next.evaluate() for (_, _, _, s_next) in transitions]
+    transition_teams = [team for (team, _, _, _) in transitions]
+    # Every memory records the observed submission, so submitted and actual actions always match
+    matched = np.zeros(len(transitions), dtype=np.int32)
+    rewards = get_rewards(status, transition_teams, [-1 if winner is None else winner]*len(transitions), matched, matched, reward_table).tolist()
+
+    experiences = {team:[] for team in teams}
+    for (team, s, a, s_next), r in zip(transitions, rewards):
+        experiences[team].append((s, a, r, s_next))
+    return experiences
+
+def build_augmented_action_queue(match, augment_data=True, ordering=None, draft=DEFAULT_DRAFT):
+    """
+    Builds queue of submissions for match in selection order, randomly reordering interchangeable submissions if desired.
+    Args:
+        match (dict): dictonary structure of match data to be parsed
+        augment_data (bool): flag controlling the randomized ordering of submissions that do not affect the draft as a whole
+        ordering (int, optional): index into draft.augment_permutations() of the ordering to use. Overrides augment_data so
+            that a match can be expanded deterministically into each of its orderings (see augmentation_orderings()).
+        draft (Draft): structure of the draft being followed
+    Returns:
+        action_queue (deque(tuple)): deque of pick tuples of the form (side_id, champion_id, position_id).
+    """
+    # This section controls data agumentation of the match. Certain submissions in the draft are
+    # submitted consecutively by the same team during the same phase (ie team1 pick0 -> team1 pick1).
+    # Although these submissions were produced in a particular order, from a draft perspective
+    # there is no difference between submissions of the form
+    # team1 pick0 -> team1 pick1 vs team1 pick1 -> team0 pickA
+    # provided that the two picks are from the same phase (both bans or both picks).
+    # Therefore it is possible to augment the order in which these submissions are processed.
+
+    # Note that we can also augment the banning phase if desired. Although these submissions technically
+    # fall outside of the conditions listed above, in practice bans made in the same phase are
+    # interchangable in order.
+
+    # The interchangeable submissions are given by the draft's augment groups, and every ordering of them is precomputed
+    # as a permutation of the unaugmented queue (see Draft.augment_permutations()).
+    action_queue = build_action_queue(match, draft)
+    permutations = draft.augment_permutations()
+    if ordering is None and augment_data:
+        ordering = random.randrange(len(permutations))
+    if ordering:
+        actions = list(action_queue)
+        action_queue = deque([actions[k] for k in permutations[ordering].tolist()])
+    return action_queue
+
+def augmentation_orderings(match, draft=DEFAULT_DRAFT):
+    """
+    Returns the orderings of match which produce distinct submission queues. Orderings which only exchange identical
+    submissions (ie two missing bans) are dropped.
+    Args:
+        match (dict): dictonary structure of match data to be parsed
+        draft (Draft): structure of the draft being followed
+    Returns:
+        orderings (list(int)): indices into draft.augment_permutations(), starting with the unaugmented ordering 0
+    """
+    actions = list(build_action_queue(match, draft))
+    if len(actions) != len(draft):
+        return [0]
+    seen = set()
+    orderings = []
+    for ordering, permutation in enumerate(draft.augment_permutations().tolist()):
+        queue = tuple(actions[k] for k in permutation)
+        if queue not in seen:
+            seen.add(queue)
+            orderings.append(ordering)
+    return orderings
+
+def augmentable_submissions(team, draft=DEFAULT_DRAFT):
+    """
+    Returns the indices (within team's own submissions) of each submission that is interchangeable with the team's next
+    submission, ie. whose experience could equally have been recorded as the following one.
+    Args:
+        team (int): team perspective (DraftState.BLUE_TEAM or DraftState.RED_TEAM)
+        draft (Draft): structure of the draft being followed
+    Returns:
+        indices (list(int)): indices into the team's list of experiences
+    """
+    submissions = [k for k in range(len(draft)) if draft.active_team[k] == team]
+    groups = draft.augment_group.tolist()
+    return [j for j in range(len(submissions)-1)
+            if groups[submissions[j]] != Draft.TERMINAL and groups[submissions[j]] == groups[submissions[j+1]]]
+
+def build_action_queue(match, draft=DEFAULT_DRAFT):
     """
-    Builds queue of champion picks or bans (depending on mode) in selection order. If mode = 'ban' this produces a queue of tuples
+    Builds queue of champion picks or bans (depending on mode) in selection order. If mode = 'ban' this produces a queue of tuples.
+    Raises MissingSubmissions if the match has fewer picks or bans than the draft requires (null submissions, ie missing bans,
+    are recorded in the match with champion_id = None).
     Args:
         match (dict): dictonary structure of match data to be parsed
+        draft (Draft): structure of the draft being followed
     Returns:
         action_queue (deque(tuple)): deque of pick tuples of the form (side_id, champion_id, position_id).
             action_queue is produced in selection order.
     """
-    winner = match["winner"]
+    sides = {DraftState.BLUE_TEAM:"blue", DraftState.RED_TEAM:"red"}
     action_queue = deque()
-    phases = {0:{"phase_type":"bans", "pick_order":["blue", "red", "blue", "red", "blue", "red"]}, # phase 1 bans
-              1:{"phase_type":"picks", "pick_order":["blue", "red", "red", "blue", "blue", "red"]}, # phase 1 picks
-              2:{"phase_type":"bans", "pick_order":["red", "blue", "red", "blue"]}, # phase 2 bans
-              3:{"phase_type":"picks","pick_order":["red", "blue", "blue", "red"]}} # phase 2 picks
-    ban_index = 0
-    pick_index = 0
-    completed_actions = 0
-    for phase in range(4):
-        phase_type = phases[phase]["phase_type"]
-        pick_order = phases[phase]["pick_order"]
-
-        num_actions = len(pick_order)
-        for pick_num in range(num_actions):
-            side = pick_order[pick_num]
-            if side == "blue":
-                side_id = DraftState.BLUE_TEAM
-            else:
-                side_id = DraftState.RED_TEAM
-            if phase_type == "bans":
-                position_id = -1
-                index = ban_index
-                ban_index += pick_num%2 # Order matters here. index needs to be updated *after* use
-            else:
-                position_id = match[side][phase_type][pick_index][1]
-                index = pick_index
-                pick_index += pick_num%2 # Order matters here. index needs to be updated *after* use
-            action = (side_id, match[side][phase_type][index][0], position_id)
-            action_queue.append(action)
-            completed_actions += 1
-
-    if(completed_actions != 20):
-        print("Found a match with missing actions!")
-        print("num_actions = {}".format(num_actions))
-        print(json.dumps(match, indent=2, sort_keys=True))
+    for (side_id, phase), slot in zip(draft._draft_structure, draft.submission_slot.tolist()):
+        submissions = match[sides[side_id]]["bans" if phase == Draft.BAN else "picks"]
+        if slot >= len(submissions):
+            raise MissingSubmissions("Match {} has {} {} {} but the draft requires at least {}".format(
+                match.get("id"), len(submissions), sides[side_id], "bans" if phase == Draft.BAN else "picks", slot+1))
+        submission = submissions[slot]
+        position_id = -1 if phase == Draft.BAN else submission[1]
+        action_queue.append((side_id, submission[0], position_id))
     return action_queue
 
 if __name__ == "__main__":
@@ -1,41 +1,78 @@
 import numpy as np
 from .draftstate import DraftState as ds
 
-def get_reward(state, match, submitted_action, actual_action):
+# Default reward schedule. Rewards for a transition are the sum of the entry for the status of the resulting state and the
+# entry for whether the submitted action matches the observed one (invalid states only receive the "invalid" reward).
+REWARD_TABLE = {
+    "invalid":-10., # resulting state is invalid
+    "complete_winner":5., # resulting state is complete and was reached by the winning team
+    "complete_loser":2.5, # resulting state is complete and was reached by the losing team
+    "incomplete":0., # resulting state is valid, but incomplete (or the winner is unknown)
+    "match":0.5, # submitted action matches the observed action
+    "mismatch":-0.5, # submitted action differs from the observed action
+}
+
+def get_reward(state, match, submitted_action, actual_action, reward_table=REWARD_TABLE):
     """
     Args:
         state (DraftState): Present state of the draft to be checked for reward
         match (dict): record of match which identifies winning team
         submitted_action (tuple(int)): id of action submitted by model
         actual_action (tuple(int)): id of action submitted in observation
+        reward_table (dict): reward schedule to use (see REWARD_TABLE)
     Returns:
-        reward (int): Integer value representing the reward earned for the draft state.
+        reward (float): value representing the reward earned for the draft state.
 
     get_reward takes a draft state and returns the immediate reward for reaching that state. The reward is determined by a simple reward table
         1) state is invalid -> reward = -10
         2) state is complete, valid, and the selection was submitted by the winning team -> reward = +5
         3) state is complete, valid but the submission was made by the losing team -> reward = +2.5
         3) state is valid, but incomplete  -> reward = 0
+    plus +0.5 if the submitted action matches the observed action and -0.5 otherwise.
     """
     status = state.evaluate()
     if(status in ds.invalid_states):
-        return -10.
+        return reward_table["invalid"]
 
-    reward = 0.
+    reward = reward_table["incomplete"]
     winner = get_winning_team(match)
     if(status == ds.DRAFT_COMPLETE and winner is not None):
         if(state.team == winner):
-            reward += 5.
+            reward = reward_table["complete_winner"]
         else:
-            reward += 2.5
+            reward = reward_table["complete_loser"]
 
     if(submitted_action == actual_action):
-        reward += 0.5
+        reward += reward_table["match"]
     else:
-        reward += -0.5
+        reward += reward_table["mismatch"]
 
     return reward
 
+def get_rewards(status, teams, winners, submitted_actions, actual_actions, reward_table=REWARD_TABLE):
+    """
+    Batch version of get_reward() operating on arrays describing each transition rather than DraftStates and matches.
+    Args:
+        status (array of ints): status code (ie DraftState.evaluate()) of the state reached by each transition
+        teams (array of ints): team perspective of each transition
+        winners (array of ints): winning team of the match each transition is from, or -1 if the winner is unknown
+        submitted_actions (array of ints): index of action submitted for each transition
+        actual_actions (array of ints): index of action observed for each transition
+        reward_table (dict): reward schedule to use (see REWARD_TABLE)
+    Returns:
+        rewards (numpy array): float32 array of rewards for each transition
+    """
+    status = np.asarray(status)
+    teams = np.asarray(teams)
+    winners = np.asarray(winners)
+    complete = np.logical_and(status == ds.DRAFT_COMPLETE, winners >= 0)
+    rewards = np.full(status.shape, reward_table["incomplete"], dtype=np.float32)
+    rewards[np.logical_and(complete, teams == winners)] = reward_table["complete_winner"]
+    rewards[np.logical_and(complete, teams != winners)] = reward_table["complete_loser"]
+    rewards += np.where(np.asarray(submitted_actions) == np.asarray(actual_actions), reward_table["match"], reward_table["mismatch"])
+    rewards[np.isin(status, ds.invalid_states)] = reward_table["invalid"]
+    return rewards
+
 def get_winning_team(match):
     """
     Args:
@@ -0,0 +1,144 @@
+import time
+import numpy as np
+
+from data.champion_info import get_champion_ids
+from .draftstate import DraftState
+from .draft import Draft
+from .rewards import get_rewards
+from .state_encoding import pack_experience
+
+class SelfPlaySimulator():
+    """
+    Args:
+        model (QNetInferenceModel): model used to submit actions for both teams. model.predict(states) must return
+            Q-values for each state with invalid actions set to -inf.
+        replay (ExperienceBuffer, optional): buffer that experiences generated during self-play are stored into, packed in the
+            same form as the trainers' replay buffers (see state_encoding.pack_experience()). If None, experiences are not recorded.
+        epsilon (float): probability that a submission is drawn uniformly from the valid actions rather than being the
+            model's top prediction
+        champ_ids (list(int)): list of valid champion ids which are available for drafting
+        num_positions (int): number of positions each team drafts for
+        draft (Draft): structure of the drafts to be simulated
+        seed (int, optional): seed for the random number generator used for exploration
+
+    SelfPlaySimulator rolls out complete drafts with the model submitting for both teams. All of the drafts in a run are advanced
+    in lockstep following the order given by the draft structure, so at each submission the model is queried exactly once with the
+    states of every draft from the perspective of the team which is submitting.
+
+    Experiences are produced for both teams in the same form as process_match(): a memory (s, a, r, s') for a team starts just
+    before that team submits and ends just before its next submission (or when the draft completes). Since self-play drafts have no
+    winner, rewards are computed against a winner-less match.
+    """
+    def __init__(self, model, replay=None, epsilon=0., champ_ids=get_champion_ids(), num_positions=5, draft=Draft('default'), seed=None):
+        self.model = model
+        self.replay = replay
+        self.epsilon = epsilon
+        self.draft = draft
+        self.teams = [DraftState.BLUE_TEAM, DraftState.RED_TEAM]
+        self._templates = {team:DraftState(team, champ_ids, num_positions, draft) for team in self.teams}
+        self._rng = np.random.RandomState(seed)
+
+    def run(self, n_drafts, return_states=False):
+        """
+        Simulates n_drafts complete drafts.
+        Args:
+            n_drafts (int): number of drafts to simulate in lockstep
+            return_states (bool): if True the completed drafts are returned along with the statistics
+        Returns:
+            stats (dict): dictionary of throughput statistics for the run with keys:
+                "drafts": number of drafts simulated
+                "submissions": number of submissions made across all drafts
+                "experiences": number of experiences generated
+                "elapsed": total wall-clock time of the run
+                "predict_time": wall-clock time spent in model.predict()
+                "submissions_per_sec": submission throughput over the run
+                "completed": number of drafts which ended in a complete (valid) state
+                "invalid": number of drafts which ended in an invalid state
+            If return_states is set the key "final_states" also holds the completed drafts as a list of {team:DraftState} dicts.
+        """
+        t0 = time.perf_counter()
+        states = [{team:self._templates[team].copy() for team in self.teams} for _ in range(n_drafts)]
+        open_memories = [{team:None for team in self.teams} for _ in range(n_drafts)]
+
+        n_experiences = 0
+        predict_time = 0.
+        n_submissions = len(self.draft.submission_dist)-1
+        for submission_count in range(n_submissions):
+            team = self.draft.get_active_team(submission_count)
+            acting_states = [draft_states[team] for draft_states in states]
+
+            t_predict = time.perf_counter()
+            q_vals = self.model.predict(acting_states)
+            predict_time += time.perf_counter()-t_predict
+
+            # Choose actions for every draft at once. Exploratory actions are drawn uniformly from the valid actions by
+            # taking the argmax of random scores restricted to the valid mask.
+            valid = np.isfinite(q_vals)
+            actions = np.argmax(q_vals, axis=1)
+            if self.epsilon > 0.:
+                explore = self._rng.random_sample(n_drafts) < self.epsilon
+                if np.any(explore):
+                    scores = np.where(valid[explore], self._rng.random_sample(valid[explore].shape), -1.)
+                    actions[explore] = np.argmax(scores, axis=1)
+
+            finished = []
+            for k in range(n_drafts):
+                draft_states = states[k]
+                state = draft_states[team]
+                if open_memories[k][team] is not None:
+                    finished.append((open_memories[k][team], state))
+                (champion_id, position) = state.format_action(actions[k])
+                open_memories[k][team] = (state.copy(), (champion_id, position))
+
+                for perspective in self.teams:
+                    # Picks made by the opposing team are masked to position 0
+                    pos = position if (perspective == team or position == -1) else 0
+                    draft_states[perspective].update(champion_id, pos)
+
+            experiences = self._finish_memories(finished)
+            n_experiences += len(experiences)
+            if self.replay is not None:
+                self.replay.store([pack_experience(experience) for experience in experiences])
+
+        # Close out the memories left open when each draft completed
+        finished = []
+        for k in range(n_drafts):
+            for team in self.teams:
+                if open_memories[k][team] is not None:
+                    finished.append((open_memories[k][team], states[k][team]))
+        experiences = self._finish_memories(finished)
+        n_experiences += len(experiences)
+        if self.replay is not None:
+            self.replay.store([pack_experience(experience) for experience in experiences])
+
+        status = [draft_states[DraftState.BLUE_TEAM].evaluate() for draft_states in states]
+        elapsed = time.perf_counter()-t0
+        stats = {"drafts":n_drafts,
+                 "submissions":n_drafts*n_submissions,
+                 "experiences":n_experiences,
+                 "elapsed":elapsed,
+                 "predict_time":predict_time,
+                 "submissions_per_sec":n_drafts*n_submissions/elapsed,
+                 "completed":sum(code == DraftState.DRAFT_COMPLETE for code in status),
+                 "invalid":sum(code in DraftState.invalid_states for code in status)}
+        if return_states:
+            stats["final_states"] = states
+        return stats
+
+    def _finish_memories(self, finished):
+        """
+        Closes out a batch of open memories, computing their rewards together.
+        Args:
+            finished (list(tuple)): list of (memory, state) pairs where memory = (s, a) and state is the state reached
+        Returns:
+            experiences (list(tuple)): list of (s, a, r, s') experiences
+        """
+        if not finished:
+            return []
+        next_states = [state.copy() for (_, state) in finished]
+        # Self-play drafts have no winner and the submitted action is always the one observed
+        rewards = get_rewards([s_next.evaluate() for s_next in next_states],
+                              [s.team for ((s, _), _) in finished],
+                              np.full(len(finished), -1),
+                              np.zeros(len(finished)), np.zeros(len(finished)))
+        return [(s, a, float(r), s_next) for (((s, a), _), r, s_next) in zip(finished, rewards, next_states)]
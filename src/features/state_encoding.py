@@ -0,0 +1,183 @@
+import numpy as np
+
+from .draftstate import DraftState, zobrist_keys
+
+def pack_bits(vectors):
+    """
+    Packs boolean vectors into uint8 arrays holding 8 elements per byte (using np.packbits, most significant bit first).
+    Args:
+        vectors (array-like of bool): single vector or 2D array of vectors to pack along the last axis
+    Returns:
+        packed (numpy array of uint8): packed vector(s) with ceil(n/8) bytes per vector
+    """
+    vectors = np.asarray(vectors, dtype=bool)
+    return np.packbits(vectors, axis=vectors.ndim-1)
+
+def unpack_bits(packed, size, dtype=bool):
+    """
+    Expands packed vectors produced by pack_bits back into dense vectors.
+    Args:
+        packed (array-like of uint8): single packed vector or 2D array of packed vectors
+        size (int): length of the original (unpacked) vectors
+        dtype (numpy dtype): dtype of returned array
+    Returns:
+        vectors (numpy array): dense vector(s) of length size
+    """
+    packed = np.asarray(packed, dtype=np.uint8)
+    axis = packed.ndim-1
+    return np.unpackbits(packed, axis=axis)[...,:size].astype(dtype)
+
+def pack_state(state):
+    """
+    Returns the network input for a DraftState with its bits packed. Only ~20 of the (num_champions x num_positions+2) state
+    bits are ever set, so the packed form is used to store states and transport them to the network.
+    Args:
+        state (DraftState): state to pack
+    Returns:
+        packed (numpy array of uint8): packed state vector
+    """
+    return np.packbits(state.state.reshape(-1))
+
+def pack_states(states):
+    """
+    Packs a batch of DraftStates (see pack_state()).
+    Args:
+        states (list(DraftState)): states to pack
+    Returns:
+        packed (numpy array of uint8): (n, packed_size) array of packed states
+    """
+    return np.packbits(np.stack([state.state.reshape(-1) for state in states], axis=0), axis=1)
+
+def pack_experience(experience):
+    """
+    Converts an experience tuple (s, a, r, s') of DraftStates into a compact form holding only what is needed to
+    train on it.
+    Args:
+        experience (tuple): experience of the form (s, a, r, s') as produced by process_match()
+    Returns:
+        packed_experience (tuple): tuple of the form (s_bits, valid_bits, action, r, s'_bits, next_valid_bits, is_terminal) where
+            - s_bits and s'_bits are the packed states s and s'
+            - valid_bits and next_valid_bits are the packed masks of valid actions from s and s'
+            - action is the index of a into the actionable state vector of s
+            - is_terminal is True if s' is either a complete or an invalid state
+    """
+    (start, (champion_id, position), reward, end) = experience
+    status = end.evaluate()
+    is_terminal = (status == DraftState.DRAFT_COMPLETE or status in DraftState.invalid_states)
+    return (pack_state(start),
+            np.packbits(start.get_valid_actions()),
+            start.get_action(champion_id, position),
+            reward,
+            pack_state(end),
+            np.packbits(end.get_valid_actions()),
+            is_terminal)
+
+def stack_packed_experiences(experiences, state_size, num_actions):
+    """
+    Stacks a list of packed experiences into arrays suitable for feeding a network. States are left packed while
+    the valid action masks are expanded to dense boolean arrays.
+    Args:
+        experiences (list(tuple)): list of experiences produced by pack_experience()
+        state_size (int): length of unpacked state vectors
+        num_actions (int): length of unpacked valid action masks
+    Returns:
+        batch (dict): dictionary with keys "states", "valid_actions", "actions", "rewards", "next_states",
+            "next_valid_actions" and "is_terminal"
+    """
+    (states, valid, actions, rewards, next_states, next_valid, is_terminal) = zip(*experiences)
+    return {"states":np.stack(states, axis=0),
+            "valid_actions":unpack_bits(np.stack(valid, axis=0), num_actions),
+            "actions":np.array(actions),
+            "rewards":np.array(rewards, dtype=np.float32),
+            "next_states":np.stack(next_states, axis=0),
+            "next_valid_actions":unpack_bits(np.stack(next_valid, axis=0), num_actions),
+            "is_terminal":np.array(is_terminal, dtype=bool)}
+
+def active_indices(states):
+    """
+    Encodes a batch of DraftStates as the list of their set state bits. This is the input expected by networks
+    built with sparse_inputs (fed through "active_inputs" and "n_inputs").
+    Args:
+        states (list(DraftState)): states to encode
+    Returns:
+        (active_inputs, n_inputs) (tuple): active_inputs is an (n_active, 2) int64 array of (state number, input index) pairs for
+            every set bit in the flattened states and n_inputs is the number of states encoded
+    """
+    if not states:
+        return (np.zeros((0,2), dtype=np.int64), 0)
+    rows = []
+    cols = []
+    for k, state in enumerate(states):
+        indices = np.flatnonzero(state.state)
+        rows.append(np.full(indices.shape, k, dtype=np.int64))
+        cols.append(indices)
+    active_inputs = np.stack([np.concatenate(rows), np.concatenate(cols)], axis=1).astype(np.int64)
+    return (active_inputs, len(states))
+
+def state_hashes(states):
+    """
+    Returns the Zobrist hashes of a batch of DraftStates (see DraftState.zobrist_hash).
+    Args:
+        states (list(DraftState)): states to hash
+    Returns:
+        hashes (numpy array of uint64): hash of each state
+    """
+    return np.array([state.zobrist_hash for state in states], dtype=np.uint64)
+
+def hash_packed_states(packed_states, teams, submission_counts=None, num_champions=None, num_positions=5):
+    """
+    Computes the Zobrist hashes of a batch of packed states (see pack_state()). Hashes match DraftState.zobrist_hash for the
+    states the packed states were produced from.
+    Args:
+        packed_states (numpy array of uint8): (n, packed_size) packed states
+        teams (array-like of int): team perspective of each state
+        submission_counts (array-like of int, optional): number of submissions made in each state. Defaults to the number
+            of set state bits, which is only correct for states without null bans.
+        num_champions (int, optional): number of champions in the states. Defaults to the number of champions in a DraftState.
+        num_positions (int): number of positions in the states
+    Returns:
+        hashes (numpy array of uint64): hash of each state
+    """
+    if num_champions is None:
+        num_champions = DraftState(DraftState.BLUE_TEAM).num_champions
+    keys = zobrist_keys(num_champions, num_positions)
+    bits = unpack_bits(packed_states, keys["bits"].size).reshape(-1, keys["bits"].size)
+    if submission_counts is None:
+        submission_counts = bits.sum(axis=1)
+    hashes = np.bitwise_xor.reduce(np.where(bits, keys["bits"].reshape(1, -1), np.uint64(0)), axis=1)
+    counts = np.asarray(submission_counts, dtype=np.int64) % len(keys["counts"])
+    return hashes ^ keys["team"][np.asarray(teams, dtype=np.int64)] ^ keys["counts"][counts]
+
+def packed_experiences_to_arrays(experiences):
+    """
+    Converts a list of packed experiences into a dictionary of stacked arrays, which is the form they are saved to disk in.
+    Args:
+        experiences (list(tuple)): list of experiences produced by pack_experience()
+    Returns:
+        arrays (dict): dictionary with keys "states", "valid_actions", "actions", "rewards", "next_states", "next_valid_actions"
+            and "is_terminal" holding the stacked (still packed) fields of each experience
+    """
+    if not experiences:
+        return {}
+    (states, valid, actions, rewards, next_states, next_valid, is_terminal) = zip(*experiences)
+    return {"states":np.stack(states, axis=0),
+            "valid_actions":np.stack(valid, axis=0),
+            "actions":np.array(actions, dtype=np.int32),
+            "rewards":np.array(rewards, dtype=np.float32),
+            "next_states":np.stack(next_states, axis=0),
+            "next_valid_actions":np.stack(next_valid, axis=0),
+            "is_terminal":np.array(is_terminal, dtype=bool)}
+
+def arrays_to_packed_experiences(arrays):
+    """
+    Inverse of packed_experiences_to_arrays().
+    Args:
+        arrays (dict): dictionary of stacked experience fields
+    Returns:
+        experiences (list(tuple)): list of packed experiences
+    """
+    if "actions" not in arrays:
+        return []
+    return [(arrays["states"][k], arrays["valid_actions"][k], int(arrays["actions"][k]), float(arrays["rewards"][k]),
+             arrays["next_states"][k], arrays["next_valid_actions"][k], bool(arrays["is_terminal"][k]))
+            for k in range(len(arrays["actions"]))]
@@ -13,6 +13,7 @@ import data.database_ops as dbo
 
 from models import qNetwork, softmax
 from trainer import DDQNTrainer, SoftmaxTrainer
+from profiler import StepProfiler
 from models.inference_model import QNetInferenceModel, SoftmaxInferenceModel
 
 import tensorflow as tf
@@ -76,6 +77,7 @@ buffer_size = 4096#2048
 n_epoch = 45
 discount_factor = 0.9
 learning_rate = 1.0e-4#2.0e-5#
+profile_training = False
 time.sleep(2.)
 for i in range(1):
     training_matches = dbo.get_matches_by_id(training_ids, PATH_TO_DB)
@@ -86,14 +88,16 @@ for i in range(1):
     name = "softmax"
     out_path = "{}{}_model_E{}.ckpt".format(MODEL_DIR, name, n_epoch)
     softnet = softmax.SoftmaxNetwork(name, out_path, input_size, output_size, filter_size, learning_rate, regularization_coeff)
-    trainer = SoftmaxTrainer(softnet, n_epoch, training_matches, validation_matches, batch_size, load_path=None)
+    profiler = StepProfiler(out_dir="tmp/profile/{}".format(name), enabled=profile_training)
+    trainer = SoftmaxTrainer(softnet, n_epoch, training_matches, validation_matches, batch_size, load_path=None, profiler=profiler)
     summaries = trainer.train()
 
     tf.reset_default_graph()
     name = "ddqn"
     out_path = "{}{}_model_E{}.ckpt".format(MODEL_DIR, name, n_epoch)
     ddqn = qNetwork.Qnetwork(name, out_path, input_size, output_size, filter_size, learning_rate, regularization_coeff, discount_factor)
-    trainer = DDQNTrainer(ddqn, n_epoch, training_matches, validation_matches, batch_size, buffer_size, load_path)
+    profiler = StepProfiler(out_dir="tmp/profile/{}".format(name), enabled=profile_training)
+    trainer = DDQNTrainer(ddqn, n_epoch, training_matches, validation_matches, batch_size, buffer_size, load_path, profiler=profiler)
     summaries = trainer.train()
 
     print("Learning complete!")
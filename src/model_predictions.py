@@ -87,7 +87,7 @@ model_diagnostics = {"full":full_diag, "no_rd1_ban":no_rd1_ban_diag, "no_bans":n
 
 position_distributions = {"phase_1":[0,0,0,0,0], "phase_2":[0,0,0,0,0]}
 actual_pos_distributions = {"phase_1":[0,0,0,0,0], "phase_2":[0,0,0,0,0]}
-augmentable_picks = {DraftState.BLUE_TEAM:[0,1,4,6,8], DraftState.RED_TEAM:[0,1,3,6]}
+augmentable_picks = {team:mp.augmentable_submissions(team) for team in [DraftState.BLUE_TEAM, DraftState.RED_TEAM]}
 targets = [10,10,10,9,8,7,6,6,6,5]
 for match in matches:
 #    if(specific_team):
@@ -1,10 +1,81 @@
+import os
 import tensorflow as tf
+import numpy as np
+
+from features.state_encoding import pack_states, active_indices
+
+def configure_process(session_config=None):
+    """
+    Applies the process-wide settings requested by a session configuration: pinning the process to session_config["cores"]
+    (TensorFlow has no per-session affinity) and enabling XLA's CPU JIT for session_config["xla_jit"]. This should be called
+    once by whatever launches the process (ie. a training script or sweep worker) before any model is built, rather than per
+    model, since it affects every session in the process.
+    Args:
+        session_config (dict, optional): keyword arguments to make_session_config(). Keys other than "cores" and "xla_jit"
+            are ignored.
+    Returns:
+        None
+    """
+    session_config = session_config or {}
+    if session_config.get("cores"):
+        os.sched_setaffinity(0, session_config["cores"])
+    if session_config.get("xla_jit"):
+        flags = os.environ.get("TF_XLA_FLAGS", "")
+        if "--tf_xla_cpu_global_jit" not in flags:
+            # XLA reads its flags when it is first used, so this must be set before any session runs
+            os.environ["TF_XLA_FLAGS"] = "{} --tf_xla_cpu_global_jit".format(flags).strip()
+
+def make_session_config(intra_op_threads=None, inter_op_threads=None, cores=None, optimizer_level=None, xla_jit=False):
+    """
+    Builds the configuration used for a model's session. By default TensorFlow sizes both its intra-op and inter-op thread pools
+    to the number of cores on the host, so several models (or training runs) sharing a host oversubscribe it badly. Limiting the
+    pools (and pinning each process to its own cores, see configure_process()) keeps concurrent models from competing for the
+    same cores. Building the configuration has no side effects on the process.
+    Args:
+        intra_op_threads (int, optional): number of threads used to parallelize individual ops (ie matmuls). Defaults to the
+            number of cores given if cores is set, otherwise TensorFlow's default.
+        inter_op_threads (int, optional): number of threads used to run independent ops concurrently
+        cores (list(int), optional): cores the process is pinned to by configure_process(). Only used to size the intra-op pool.
+        optimizer_level (int, optional): graph optimizer level, either 0 (tf.OptimizerOptions.L0: common subexpression
+            elimination and constant folding disabled) or 1 (tf.OptimizerOptions.L1, TensorFlow's default)
+        xla_jit (bool): if True ops are clustered and compiled with XLA. On CPU this additionally requires the
+            --tf_xla_cpu_global_jit flag, which configure_process() adds to TF_XLA_FLAGS.
+    Returns:
+        config (tf.ConfigProto): session configuration
+    """
+    if cores and intra_op_threads is None:
+        intra_op_threads = len(cores)
+    config = tf.ConfigProto()
+    if intra_op_threads is not None:
+        config.intra_op_parallelism_threads = intra_op_threads
+    if inter_op_threads is not None:
+        config.inter_op_parallelism_threads = inter_op_threads
+    if optimizer_level is not None:
+        levels = {0:tf.OptimizerOptions.L0, 1:tf.OptimizerOptions.L1}
+        config.graph_options.optimizer_options.opt_level = levels[optimizer_level]
+    if xla_jit:
+        config.graph_options.optimizer_options.global_jit_level = tf.OptimizerOptions.ON_1
+    return config
+
 class BaseModel():
-    def __init__(self, name, path):
+    """
+    Args:
+        name (string): label for model namespace
+        path (string): path to save/load model
+        session_config (tf.ConfigProto or dict, optional): configuration for the model's session. A dict is treated as keyword
+            arguments to make_session_config().
+        seed (int, optional): graph-level random seed for the model's graph
+    """
+    def __init__(self, name, path, session_config=None, seed=None):
         self._name = name
         self._path_to_model = path
         self._graph = tf.Graph()
-        self.sess = tf.Session(graph=self._graph)
+        if seed is not None:
+            with self._graph.as_default():
+                tf.set_random_seed(seed)
+        if isinstance(session_config, dict):
+            session_config = make_session_config(**session_config)
+        self.sess = tf.Session(graph=self._graph, config=session_config)
 
     def __del__(self):
         try:
@@ -13,6 +84,98 @@ class BaseModel():
         finally:
             print("Model closed..")
 
+    def unpack_bits(self, packed, size):
+        """
+        Expands a batch of vectors packed with np.packbits (see features.state_encoding) inside the graph.
+        Args:
+            packed (tensor): (n, ceil(size/8)) uint8 tensor of packed vectors
+            size (int): length of unpacked vectors
+        Returns:
+            bits (tensor): (n, size) uint8 tensor of unpacked bits
+        """
+        # np.packbits stores the first element of each group of 8 in the most significant bit
+        shifts = tf.constant([7,6,5,4,3,2,1,0], dtype=tf.uint8)
+        bits = tf.bitwise.bitwise_and(tf.bitwise.right_shift(tf.expand_dims(packed, -1), shifts), tf.constant(1, dtype=tf.uint8))
+        return tf.reshape(bits, (-1, 8*((size+7)//8)))[:, :size]
+
+    def build_inputs(self, input_shape):
+        """
+        Adds the state input placeholders to the current graph. States can either be fed densely through "inputs" or with
+        their bits packed (see features.state_encoding) through "packed_inputs", in which case they are expanded to dense
+        inputs inside the graph. Feeding packed states reduces the data copied into the graph per state by a factor of 32.
+        Args:
+            input_shape (tuple): shape of a single (dense) input state
+        Returns:
+            (packed_input, input) (tuple of tensors): packed uint8 placeholder and dense float32 input tensor
+        """
+        input_size = int(np.prod(input_shape))
+        packed_input = tf.placeholder(tf.uint8, (None, (input_size+7)//8), name="packed_inputs")
+        bits = self.unpack_bits(packed_input, input_size)
+        unpacked = tf.reshape(tf.cast(bits, tf.float32), (-1,)+tuple(input_shape))
+        # Feeding "inputs" directly bypasses the unpacking ops
+        dense_input = tf.placeholder_with_default(unpacked, (None,)+tuple(input_shape), name="inputs")
+        return (packed_input, dense_input)
+
+    def state_feed(self, ops_dict, states):
+        """
+        Builds the feed for a batch of DraftStates into the network inputs held in ops_dict. Networks built with sparse_inputs
+        are fed the indices of each state's set bits through ops_dict["active_inputs"] and ["n_inputs"] (see build_input_layer()),
+        so no dense inputs are built at all. Otherwise states are fed with their bits packed through ops_dict["packed_input"] when
+        the network has one, or (ie. for models saved before packed inputs were added) densely through ops_dict["input"].
+        Args:
+            ops_dict (dict): ops dictionary of the network being fed
+            states (list(DraftState)): states to feed
+        Returns:
+            feed_dict (dict): feed for the network's input tensors
+        """
+        if ops_dict.get("active_inputs") is not None:
+            (active_inputs, n_inputs) = active_indices(states)
+            return {ops_dict["active_inputs"]:active_inputs, ops_dict["n_inputs"]:n_inputs}
+        if ops_dict.get("packed_input") is not None:
+            return {ops_dict["packed_input"]:pack_states(states)}
+        return {ops_dict["input"]:np.stack([state.format_state() for state in states], axis=0)}
+
+    def build_input_layer(self, ops_dict, units, sparse_inputs=False, name="fc_0"):
+        """
+        Adds the first (relu-activated) fully connected layer acting on ops_dict["input"] to the current graph.
+
+        Input states are binary and almost entirely zero, so when sparse_inputs is set the layer is computed as an embedding-bag:
+        the kernel rows belonging to each active input are gathered and summed per state rather than multiplying the full input
+        by the kernel. The active inputs are given by two additional tensors which are added to ops_dict:
+            ops_dict["active_inputs"]: (n_active, 2) int64 array of (state, input index) pairs for every set input bit
+            ops_dict["n_inputs"]: number of states in the batch
+        Both default to being computed from ops_dict["input"] (which may itself be fed packed), but can be fed directly
+        (see features.state_encoding.active_indices) to avoid building dense inputs at all.
+
+        In both cases the layer's variables are named "<name>/kernel" and "<name>/bias", matching tf.layers.dense, so
+        checkpoints can be freely loaded into networks using either form of the layer.
+        Args:
+            ops_dict (dict): ops dictionary for the network being built. Must contain "input".
+            units (int): number of units in the layer
+            sparse_inputs (bool): if True the layer is computed as an embedding-bag sum over active inputs
+            name (str): name of layer
+        Returns:
+            Output tensor of the layer
+        """
+        if not sparse_inputs:
+            return tf.layers.dense(
+                ops_dict["input"],
+                units,
+                activation=tf.nn.relu,
+                bias_initializer=tf.constant_initializer(0.1),
+                name=name)
+
+        input_size = int(ops_dict["input"].shape[1:].num_elements())
+        flat_input = tf.reshape(ops_dict["input"], (-1, input_size))
+        ops_dict["active_inputs"] = tf.placeholder_with_default(tf.where(flat_input > 0.), (None, 2), name="active_inputs")
+        ops_dict["n_inputs"] = tf.placeholder_with_default(tf.shape(flat_input, out_type=tf.int64)[0], (), name="n_inputs")
+        with tf.variable_scope(name):
+            kernel = tf.get_variable("kernel", shape=(input_size, units), initializer=tf.glorot_uniform_initializer())
+            bias = tf.get_variable("bias", shape=(units,), initializer=tf.constant_initializer(0.1))
+        rows = tf.gather(kernel, ops_dict["active_inputs"][:,1])
+        summed = tf.unsorted_segment_sum(rows, ops_dict["active_inputs"][:,0], num_segments=ops_dict["n_inputs"])
+        return tf.nn.relu(summed + bias)
+
     def build_model(self):
         raise NotImplementedError
     def init_saver(self):
@@ -1,9 +1,19 @@
 import tensorflow as tf
 from . import base_model
 
+def get_optional_tensor(name):
+    """
+    Returns the tensor called name from the default graph, or None if the graph (ie. one saved by an older version of the
+    network) doesn't have it.
+    """
+    try:
+        return tf.get_default_graph().get_tensor_by_name(name)
+    except KeyError:
+        return None
+
 class QNetInferenceModel(base_model.BaseModel):
-    def __init__(self, name, path):
-        super().__init__(name=name, path=path)
+    def __init__(self, name, path, session_config=None):
+        super().__init__(name=name, path=path, session_config=session_config)
         self.init_saver()
         self.ops_dict = self.build_model()
 
@@ -17,6 +27,10 @@ class QNetInferenceModel(base_model.BaseModel):
             ops_dict["predict_q"] = tf.get_default_graph().get_tensor_by_name("online/valid_q_vals:0")
             ops_dict["prediction"] = tf.get_default_graph().get_tensor_by_name("online/prediction:0")
             ops_dict["input"] = tf.get_default_graph().get_tensor_by_name("online/inputs:0")
+            ops_dict["packed_input"] = get_optional_tensor("online/packed_inputs:0")
+            # Only present in networks built with sparse_inputs
+            ops_dict["active_inputs"] = get_optional_tensor("online/active_inputs:0")
+            ops_dict["n_inputs"] = get_optional_tensor("online/n_inputs:0")
             ops_dict["valid_actions"] = tf.get_default_graph().get_tensor_by_name("online/valid_actions:0")
         return ops_dict
 
@@ -29,11 +43,8 @@ class QNetInferenceModel(base_model.BaseModel):
             predicted_Q (numpy array): model estimates of Q-values for actions from input states.
               predicted_Q[k,:] holds Q-values for state states[k]
         """
-        inputs = [state.format_state() for state in states]
-        valid_actions = [state.get_valid_actions() for state in states]
-
-        feed_dict = {self.ops_dict["input"]:inputs,
-                     self.ops_dict["valid_actions"]:valid_actions}
+        feed_dict = self.state_feed(self.ops_dict, states)
+        feed_dict[self.ops_dict["valid_actions"]] = [state.get_valid_actions() for state in states]
         predicted_Q = self.sess.run(self.ops_dict["predict_q"], feed_dict=feed_dict)
         return predicted_Q
 
@@ -45,17 +56,14 @@ class QNetInferenceModel(base_model.BaseModel):
         Returns:
             predicted_action (numpy array): array of integer representations of actions recommended by model.
         """
-        inputs = [state.format_state() for state in states]
-        valid_actions = [state.get_valid_actions() for state in states]
-
-        feed_dict = {self.ops_dict["input"]:inputs,
-                     self.ops_dict["valid_actions"]:valid_actions}
+        feed_dict = self.state_feed(self.ops_dict, states)
+        feed_dict[self.ops_dict["valid_actions"]] = [state.get_valid_actions() for state in states]
         predicted_actions = self.sess.run(self.ops_dict["prediction"], feed_dict=feed_dict)
         return predicted_actions
 
 class SoftmaxInferenceModel(base_model.BaseModel):
-    def __init__(self, name, path):
-        super().__init__(name=name, path=path)
+    def __init__(self, name, path, session_config=None):
+        super().__init__(name=name, path=path, session_config=session_config)
         self.init_saver()
         self.ops_dict = self.build_model()
 
@@ -70,6 +78,10 @@ class SoftmaxInferenceModel(base_model.BaseModel):
             ops_dict["probabilities"] = tf.get_default_graph().get_tensor_by_name("softmax/action_probabilites:0")
             ops_dict["prediction"] = tf.get_default_graph().get_tensor_by_name("softmax/predictions:0")
             ops_dict["input"] = tf.get_default_graph().get_tensor_by_name("softmax/inputs:0")
+            ops_dict["packed_input"] = get_optional_tensor("softmax/packed_inputs:0")
+            # Only present in networks built with sparse_inputs
+            ops_dict["active_inputs"] = get_optional_tensor("softmax/active_inputs:0")
+            ops_dict["n_inputs"] = get_optional_tensor("softmax/n_inputs:0")
             ops_dict["valid_actions"] = tf.get_default_graph().get_tensor_by_name("softmax/valid_actions:0")
         return ops_dict
 
@@ -82,11 +94,8 @@ class SoftmaxInferenceModel(base_model.BaseModel):
             probabilities (numpy array): model estimates of probabilities for actions from input states.
               probabilities[k,:] holds Q-values for state states[k]
         """
-        inputs = [state.format_state() for state in states]
-        valid_actions = [state.get_valid_actions() for state in states]
-
-        feed_dict = {self.ops_dict["input"]:inputs,
-                     self.ops_dict["valid_actions"]:valid_actions}
+        feed_dict = self.state_feed(self.ops_dict, states)
+        feed_dict[self.ops_dict["valid_actions"]] = [state.get_valid_actions() for state in states]
         probabilities = self.sess.run(self.ops_dict["probabilities"], feed_dict=feed_dict)
         return probabilities
 
@@ -98,10 +107,7 @@ class SoftmaxInferenceModel(base_model.BaseModel):
         Returns:
             predicted_action (numpy array): array of integer representations of actions recommended by model.
         """
-        inputs = [state.format_state() for state in states]
-        valid_actions = [state.get_valid_actions() for state in states]
-
-        feed_dict = {self.ops_dict["input"]:inputs,
-                     self.ops_dict["valid_actions"]:valid_actions}
+        feed_dict = self.state_feed(self.ops_dict, states)
+        feed_dict[self.ops_dict["valid_actions"]] = [state.get_valid_actions() for state in states]
         predicted_actions = self.sess.run(self.ops_dict["prediction"], feed_dict=feed_dict)
         return predicted_actions
@@ -19,6 +19,10 @@ class Qnetwork(base_model.BaseModel):
               tau = 1.e-3 -> used in original paper
               tau = 0.5 -> average DDQN
               tau = 1.0 -> copy online -> target
+        sparse_inputs (bool): if True the first hidden layer is computed as an embedding-bag sum over the active inputs of each state
+            rather than a dense matmul (see BaseModel.build_input_layer). Checkpoints are compatible between both modes.
+        session_config (tf.ConfigProto or dict, optional): configuration used for the model's session (see base_model.make_session_config)
+        seed (int, optional): graph-level random seed used for the network's initialization and dropout
 
     A Q-network class which is responsible for holding and updating the weights and biases used in predicing Q-values for a given state. This Q-network will consist of
     the following layers:
@@ -35,8 +39,8 @@ class Qnetwork(base_model.BaseModel):
     def discount_factor(self):
         return self._discount_factor
 
-    def __init__(self, name, path, input_shape, output_shape, filter_sizes=(512,512), learning_rate=1.e-5, regularization_coeff=1.e-4, discount_factor=0.9, tau=1.0):
-        super().__init__(name=name, path=path)
+    def __init__(self, name, path, input_shape, output_shape, filter_sizes=(512,512), learning_rate=1.e-5, regularization_coeff=1.e-4, discount_factor=0.9, tau=1.0, sparse_inputs=False, session_config=None, seed=None):
+        super().__init__(name=name, path=path, session_config=session_config, seed=seed)
         self._input_shape = input_shape
         self._output_shape = output_shape
         self._filter_sizes = filter_sizes
@@ -46,6 +50,7 @@ class Qnetwork(base_model.BaseModel):
         self._n_hidden_layers = len(filter_sizes)
         self._n_layers = self._n_hidden_layers + 2
         self._tau = tau
+        self._sparse_inputs = sparse_inputs
 
         self.online_name = "online"
         self.target_name = "target"
@@ -79,16 +84,11 @@ class Qnetwork(base_model.BaseModel):
                 # Incoming state matrices are of size input_size = (nChampions, nPos+2)
                 # 'None' here means the input tensor will flex with the number of training
                 # examples (aka batch size).
-                ops_dict["input"] = tf.placeholder(tf.float32, (None,)+self._input_shape, name="inputs")
+                ops_dict["packed_input"], ops_dict["input"] = self.build_inputs(self._input_shape)
                 ops_dict["dropout_keep_prob"] = tf.placeholder_with_default(1.0,shape=())
 
                 # Fully connected (FC) layers:
-                fc0 = tf.layers.dense(
-                    ops_dict["input"],
-                    self._filter_sizes[0],
-                    activation=tf.nn.relu,
-                    bias_initializer=tf.constant_initializer(0.1),
-                    name="fc_0")
+                fc0 = self.build_input_layer(ops_dict, self._filter_sizes[0], sparse_inputs=self._sparse_inputs, name="fc_0")
                 dropout0 = tf.nn.dropout(fc0, ops_dict["dropout_keep_prob"])
 
                 fc1 = tf.layers.dense(
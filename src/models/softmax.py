@@ -11,6 +11,10 @@ class SoftmaxNetwork(base_model.BaseModel):
         filter_sizes (tuple of 2 ints): number of filters in each of the two hidden layers. Defaults to (16,32).
         learning_rate (float): network's willingness to change current weights given new example
         regularization (float): strength of weights regularization term in loss function
+        sparse_inputs (bool): if True the first hidden layer is computed as an embedding-bag sum over the active inputs of each state
+            rather than a dense matmul (see BaseModel.build_input_layer). Checkpoints are compatible between both modes.
+        session_config (tf.ConfigProto or dict, optional): configuration used for the model's session (see base_model.make_session_config)
+        seed (int, optional): graph-level random seed used for the network's initialization and dropout
 
     A simple softmax network class which is responsible for holding and updating the weights and biases used in predicing actions for given state. This network will consist of
     the following layers:
@@ -18,13 +22,18 @@ class SoftmaxNetwork(base_model.BaseModel):
     2-4) Two layers of relu-activated hidden fc layers
     4) Output- softmax-obtained probability of action submission for output_shape actions available.
 
+    Training batches can either be fed through the input placeholders (and trained on with ops_dict["update"]) or drawn from the network's
+    input pipeline (and trained on with ops_dict["pipeline_update"]). The pipeline holds a fixed set of packed experiences in the graph
+    (loaded once with init_input_pipeline()) and shuffles, batches and prefetches them in the background. The pipeline is only read by
+    "pipeline_update" and "pipeline_loss", which apply the network's variables to its batches; every other op is computed from the
+    placeholders alone.
     """
     @property
     def name(self):
         return self._name
 
-    def __init__(self, name, path, input_shape, output_shape, filter_sizes = (512,512), learning_rate=1.e-3, regularization_coeff = 0.01):
-        super().__init__(name=name, path=path)
+    def __init__(self, name, path, input_shape, output_shape, filter_sizes = (512,512), learning_rate=1.e-3, regularization_coeff = 0.01, sparse_inputs=False, session_config=None, seed=None):
+        super().__init__(name=name, path=path, session_config=session_config, seed=seed)
         self._input_shape = input_shape
         self._output_shape = output_shape
         self._learning_rate = learning_rate
@@ -32,6 +41,7 @@ class SoftmaxNetwork(base_model.BaseModel):
         self._n_hidden_layers = len(filter_sizes)
         self._n_layers = self._n_hidden_layers + 2
         self._filter_sizes = filter_sizes
+        self._sparse_inputs = sparse_inputs
 
         self.ops_dict = self.build_model(name=self._name)
         with self._graph.as_default():
@@ -58,34 +68,10 @@ class SoftmaxNetwork(base_model.BaseModel):
                 # Incoming state matrices are of size input_size = (nChampions, nPos+2)
                 # 'None' here means the input tensor will flex with the number of training
                 # examples (aka batch size).
-                ops_dict["input"] = tf.placeholder(tf.float32, (None,)+self._input_shape, name="inputs")
+                ops_dict["packed_input"], ops_dict["input"] = self.build_inputs(self._input_shape)
                 ops_dict["dropout_keep_prob"] = tf.placeholder_with_default(1.0,shape=())
 
-                # Fully connected (FC) layers:
-                fc0 = tf.layers.dense(
-                    ops_dict["input"],
-                    self._filter_sizes[0],
-                    activation=tf.nn.relu,
-                    bias_initializer=tf.constant_initializer(0.1),
-                    name="fc_0")
-                dropout0 = tf.nn.dropout(fc0, ops_dict["dropout_keep_prob"])
-
-                fc1 = tf.layers.dense(
-                    dropout0,
-                    self._filter_sizes[1],
-                    activation=tf.nn.relu,
-                    bias_initializer=tf.constant_initializer(0.1),
-                    name="fc_1")
-                dropout1 = tf.nn.dropout(fc1, ops_dict["dropout_keep_prob"])
-
-                # Logits layer
-                ops_dict["logits"] = tf.layers.dense(
-                    dropout1,
-                    self._output_shape,
-                    activation=None,
-                    bias_initializer=tf.constant_initializer(0.1),
-                    kernel_regularizer=tf.contrib.layers.l2_regularizer(scale=self._regularization_coeff),
-                    name="logits")
+                ops_dict["logits"] = self.build_network(ops_dict)
 
                 # Placeholder for valid actions filter
                 ops_dict["valid_actions"] = tf.placeholder(tf.bool, shape=ops_dict["logits"].shape, name="valid_actions")
@@ -104,4 +90,89 @@ class SoftmaxNetwork(base_model.BaseModel):
                 ops_dict["trainer"] = tf.train.AdamOptimizer(learning_rate = ops_dict["learning_rate"])
                 ops_dict["update"] = ops_dict["trainer"].minimize(ops_dict["loss"], name="update")
 
+                # Separate copy of the network (sharing its variables) which trains on batches drawn from the input pipeline
+                (pipeline_states, pipeline_actions, pipeline_valid) = self.build_input_pipeline(ops_dict)
+                with tf.variable_scope(tf.get_variable_scope(), reuse=True):
+                    bits = self.unpack_bits(pipeline_states, int(np.prod(self._input_shape)))
+                    pipeline_ops = {"input":tf.reshape(tf.cast(bits, tf.float32), (-1,)+tuple(self._input_shape)),
+                                    "dropout_keep_prob":ops_dict["dropout_keep_prob"]}
+                    logits = self.build_network(pipeline_ops)
+                valid_logits = tf.where(pipeline_valid, logits, tf.scalar_mul(-np.inf, tf.ones_like(logits)))
+                ops_dict["pipeline_loss"] = tf.reduce_mean(tf.nn.sparse_softmax_cross_entropy_with_logits(labels=pipeline_actions, logits=valid_logits), name="pipeline_loss")
+                ops_dict["pipeline_update"] = ops_dict["trainer"].minimize(ops_dict["pipeline_loss"], name="pipeline_update")
+
         return ops_dict
+
+    def build_network(self, ops_dict):
+        """
+        Adds the network's hidden and logits layers acting on ops_dict["input"] to the current graph. The layers are named
+        so that calling this again within a reusing variable scope shares the same variables.
+        Args:
+            ops_dict (dict): ops dictionary holding "input" and "dropout_keep_prob"
+        Returns:
+            logits (tensor): (n, output_shape) logits of each input state
+        """
+        # Fully connected (FC) layers:
+        fc0 = self.build_input_layer(ops_dict, self._filter_sizes[0], sparse_inputs=self._sparse_inputs, name="fc_0")
+        dropout0 = tf.nn.dropout(fc0, ops_dict["dropout_keep_prob"])
+
+        fc1 = tf.layers.dense(
+            dropout0,
+            self._filter_sizes[1],
+            activation=tf.nn.relu,
+            bias_initializer=tf.constant_initializer(0.1),
+            name="fc_1")
+        dropout1 = tf.nn.dropout(fc1, ops_dict["dropout_keep_prob"])
+
+        # Logits layer
+        return tf.layers.dense(
+            dropout1,
+            self._output_shape,
+            activation=None,
+            bias_initializer=tf.constant_initializer(0.1),
+            kernel_regularizer=tf.contrib.layers.l2_regularizer(scale=self._regularization_coeff),
+            name="logits")
+
+    def build_input_pipeline(self, ops_dict, prefetch_batches=4):
+        """
+        Adds the training input pipeline to the current graph. The pipeline's experiences are fed once through the placeholders
+        ops_dict["pipeline_states"], ["pipeline_actions"] and ["pipeline_valid_actions"] (packed states, action indices and packed valid
+        action masks) when ops_dict["pipeline_init"] is run, along with the batch size ops_dict["pipeline_batch_size"]. After that they
+        are reshuffled every pass and batched on TensorFlow's own threads, with up to prefetch_batches batches ready ahead of time.
+        Args:
+            ops_dict (dict): ops dictionary for the network being built
+            prefetch_batches (int): number of batches to prepare in the background
+        Returns:
+            (states, actions, valid_actions) (tuple of tensors): next batch of packed states, action indices and (unpacked) valid actions
+        """
+        input_size = int(np.prod(self._input_shape))
+        ops_dict["pipeline_states"] = tf.placeholder(tf.uint8, (None, (input_size+7)//8), name="pipeline_states")
+        ops_dict["pipeline_actions"] = tf.placeholder(tf.int32, (None,), name="pipeline_actions")
+        ops_dict["pipeline_valid_actions"] = tf.placeholder(tf.uint8, (None, (self._output_shape+7)//8), name="pipeline_valid_actions")
+        ops_dict["pipeline_batch_size"] = tf.placeholder(tf.int64, (), name="pipeline_batch_size")
+
+        n_experiences = tf.shape(ops_dict["pipeline_actions"], out_type=tf.int64)[0]
+        dataset = tf.data.Dataset.from_tensor_slices((ops_dict["pipeline_states"], ops_dict["pipeline_actions"], ops_dict["pipeline_valid_actions"]))
+        dataset = dataset.shuffle(n_experiences, reshuffle_each_iteration=True).repeat()
+        dataset = dataset.batch(ops_dict["pipeline_batch_size"]).prefetch(prefetch_batches)
+        iterator = dataset.make_initializable_iterator()
+        ops_dict["pipeline_init"] = iterator.initializer
+
+        (states, actions, valid_actions) = iterator.get_next()
+        valid_actions = tf.cast(self.unpack_bits(valid_actions, self._output_shape), tf.bool)
+        return (states, actions, valid_actions)
+
+    def init_input_pipeline(self, states, actions, valid_actions, batch_size):
+        """
+        Loads a fixed set of training experiences into the input pipeline.
+        Args:
+            states (numpy array): (n, packed_size) uint8 array of packed states
+            actions (numpy array): (n,) array of submitted action indices
+            valid_actions (numpy array): (n, packed_size) uint8 array of packed valid action masks
+            batch_size (int): size of batches drawn from the pipeline
+        """
+        feed_dict = {self.ops_dict["pipeline_states"]:states,
+                     self.ops_dict["pipeline_actions"]:actions,
+                     self.ops_dict["pipeline_valid_actions"]:valid_actions,
+                     self.ops_dict["pipeline_batch_size"]:batch_size}
+        self.sess.run(self.ops_dict["pipeline_init"], feed_dict=feed_dict)
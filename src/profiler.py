@@ -0,0 +1,170 @@
+import os
+import csv
+import json
+import time
+import cProfile
+import numpy as np
+
+class _NullPhase():
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        return False
+
+class _Phase():
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.record(self.name, time.perf_counter()-self.t0)
+        return False
+
+class StepProfiler():
+    """
+    Args:
+        out_dir (str): directory that per-epoch reports (and any captured profiles) are written to
+        enabled (bool): if False, all profiling calls are no-ops
+        profile_steps (tuple(int), optional): (first, last) range of training steps to capture with cProfile. The capture starts
+            at the first step inside the range (ie. when training resumes part way through it) and is written to
+            out_dir/cprofile_steps_<start>_<end>.prof, where start and end are the first and last steps captured, once a step
+            past the range is reached or close() is called.
+        timeline_steps (tuple(int), optional): (first, last) range of training steps to capture TensorFlow timelines for.
+            One chrome trace is written per traced sess.run to out_dir/timeline_step_<step>_<name>.json.
+
+    StepProfiler breaks training epochs down into named phases (ie. "process_match", "update") and records the wall-clock time spent
+    in each call to a phase. Phases are timed using
+        with profiler.phase("update"):
+            ...
+    At the end of every epoch the count, total, mean, percentiles and max time of each phase are written to out_dir/epoch_<n>.json and
+    appended as rows to out_dir/profile.csv. The reports for every epoch profiled are also kept in StepProfiler.history.
+    """
+    PERCENTILES = [50, 90, 99]
+
+    def __init__(self, out_dir="tmp/profile", enabled=True, profile_steps=None, timeline_steps=None):
+        self.out_dir = out_dir
+        self.enabled = enabled
+        self.profile_steps = profile_steps
+        self.timeline_steps = timeline_steps
+        self.epoch = 0
+        self.step = 0
+        self._timings = {}
+        self._epoch_start = None
+        self._cprofile = None
+        self._cprofile_start = None
+        self.history = []
+        if(self.enabled):
+            os.makedirs(self.out_dir, exist_ok=True)
+
+    def phase(self, name):
+        """
+        Returns a context manager which records the time spent inside it under the phase name.
+        """
+        if not self.enabled:
+            return _NullPhase()
+        return _Phase(self, name)
+
+    def record(self, name, dt):
+        if not self.enabled:
+            return
+        if name not in self._timings:
+            self._timings[name] = []
+        self._timings[name].append(dt)
+
+    def start_epoch(self, epoch):
+        self.epoch = epoch
+        self._timings = {}
+        self._epoch_start = time.perf_counter()
+
+    def set_step(self, step):
+        """
+        Informs the profiler of the current training step so that cProfile captures can be started and stopped.
+        """
+        self.step = step
+        if not self.enabled or not self.profile_steps:
+            return
+        (first, last) = self.profile_steps
+        if first <= step <= last and self._cprofile is None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile_start = step
+            self._cprofile.enable()
+        elif step > last and self._cprofile is not None:
+            self._dump_cprofile(last)
+
+    def _dump_cprofile(self, last_step):
+        self._cprofile.disable()
+        path = os.path.join(self.out_dir, "cprofile_steps_{}_{}.prof".format(self._cprofile_start, last_step))
+        self._cprofile.dump_stats(path)
+        print("Wrote cProfile capture to {}".format(path))
+        self._cprofile = None
+        self.profile_steps = None
+
+    def close(self):
+        """
+        Writes out any cProfile capture which is still open, ie. when training stops inside profile_steps. Trainers call
+        this once training finishes.
+        """
+        if self._cprofile is not None:
+            self._dump_cprofile(self.step)
+
+    def run(self, sess, fetches, feed_dict=None, name="run"):
+        """
+        Wrapper around sess.run which captures a TensorFlow timeline if the current step is inside timeline_steps.
+        """
+        if not self.enabled or not self.timeline_steps or not (self.timeline_steps[0] <= self.step <= self.timeline_steps[1]):
+            return sess.run(fetches, feed_dict=feed_dict)
+
+        import tensorflow as tf
+        from tensorflow.python.client import timeline
+        options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+        run_metadata = tf.RunMetadata()
+        result = sess.run(fetches, feed_dict=feed_dict, options=options, run_metadata=run_metadata)
+        trace = timeline.Timeline(run_metadata.step_stats).generate_chrome_trace_format()
+        with open(os.path.join(self.out_dir, "timeline_step_{}_{}.json".format(self.step, name)), 'w') as outfile:
+            outfile.write(trace)
+        return result
+
+    def summarize(self):
+        """
+        Returns dictionary of statistics for each phase recorded during the current epoch.
+        """
+        summary = {}
+        for name, timings in self._timings.items():
+            timings = np.array(timings)
+            stats = {"count":int(timings.size),
+                     "total":float(np.sum(timings)),
+                     "mean":float(np.mean(timings)),
+                     "max":float(np.max(timings))}
+            for (p, value) in zip(StepProfiler.PERCENTILES, np.percentile(timings, StepProfiler.PERCENTILES)):
+                stats["p{}".format(p)] = float(value)
+            summary[name] = stats
+        return summary
+
+    def end_epoch(self):
+        """
+        Writes the report for the current epoch and returns the per-phase summary.
+        """
+        if not self.enabled:
+            return {}
+        summary = self.summarize()
+        elapsed = time.perf_counter()-self._epoch_start if self._epoch_start else None
+        report = {"epoch":self.epoch, "elapsed":elapsed, "phases":summary}
+        self.history.append(report)
+        with open(os.path.join(self.out_dir, "epoch_{}.json".format(self.epoch)), 'w') as outfile:
+            json.dump(report, outfile, indent=2, sort_keys=True)
+
+        columns = ["epoch", "phase", "count", "total", "mean"] + ["p{}".format(p) for p in StepProfiler.PERCENTILES] + ["max"]
+        csv_path = os.path.join(self.out_dir, "profile.csv")
+        write_header = not os.path.exists(csv_path)
+        with open(csv_path, 'a', newline='') as outfile:
+            writer = csv.writer(outfile)
+            if write_header:
+                writer.writerow(columns)
+            for name in sorted(summary.keys()):
+                row = dict(summary[name], epoch=self.epoch, phase=name)
+                writer.writerow([row[col] for col in columns])
+        return summary
@@ -0,0 +1,40 @@
+import sys
+import argparse
+
+from benchmarks.benchmarks import run, compare, save_report, load_report
+
+parser = argparse.ArgumentParser(description="Run hot path microbenchmarks and optionally compare them against a baseline.")
+parser.add_argument("--db", default="../data/competitiveMatchData.db", help="path to match database")
+parser.add_argument("--out", default="tmp/benchmarks/results.json", help="path to write results to")
+parser.add_argument("--baseline", default=None, help="path to baseline results to compare against")
+parser.add_argument("--tolerance", type=float, default=0.1, help="relative slowdown (of median time) flagged as a regression")
+parser.add_argument("--n-matches", type=int, default=100)
+parser.add_argument("--n-repeat", type=int, default=200)
+parser.add_argument("--model-path", default=None, help="saved DDQN model used for inference benchmarks")
+parser.add_argument("--no-inference", action="store_true", help="skip inference benchmarks (which require tensorflow)")
+args = parser.parse_args()
+# Read the baseline before anything is written in case it is also the output path
+baseline = load_report(args.baseline)["results"] if args.baseline else None
+
+report = run(path_to_db=args.db, n_matches=args.n_matches, n_repeat=args.n_repeat,
+             include_inference=not args.no_inference, model_path=args.model_path)
+save_report(report, args.out)
+print("Wrote results to {}".format(args.out))
+
+results = report["results"]
+if baseline is None:
+    for name in sorted(results.keys()):
+        stats = results[name]
+        print("{:40} p50 {:10.2f}us  p90 {:10.2f}us  mean {:10.2f}us".format(name, 1e6*stats["p50"], 1e6*stats["p90"], 1e6*stats["mean"]))
+    sys.exit(0)
+
+comparison = compare(results, baseline, tolerance=args.tolerance)
+regressions = []
+for name, row in comparison.items():
+    flag = "REGRESSION" if row["regression"] else ""
+    print("{:40} {:10.2f}us -> {:10.2f}us  x{:5.2f} {}".format(name, 1e6*row["baseline"], 1e6*row["current"], row["ratio"], flag))
+    if row["regression"]:
+        regressions.append(name)
+if regressions:
+    print("{} benchmark(s) slower than baseline by more than {:.0%}".format(len(regressions), args.tolerance))
+    sys.exit(1)
@@ -0,0 +1,180 @@
+import os
+import json
+import random
+import shutil
+import argparse
+import numpy as np
+
+from features.draftstate import DraftState
+from data.match_pool import test_train_split, hash_split
+from data.match_store import MatchStore
+
+DEFAULT_CONFIG = {
+    "model":"ddqn",
+    "name":None,
+    "run_dir":"tmp/runs/default",
+    "path_to_db":"../data/competitiveMatchData.db",
+    "split_path":None,
+    # If set, the split is decided by hashing each game (see data.match_pool.hash_split) rather than drawing n_train/n_val games.
+    # ie {"ratios":[["training", 0.9], ["validation", 0.1]], "stratify_by":"patch", "salt":""}
+    "hash_split":None,
+    "n_train":173,
+    "n_val":20,
+    "n_epoch":45,
+    "batch_size":16,
+    "buffer_size":4096,
+    "filter_sizes":[1024,1024],
+    "learning_rate":1.0e-4,
+    "regularization_coeff":7.5e-5,
+    "discount_factor":0.9,
+    "checkpoint_interval":1,
+    "load_path":None,
+    "seed":None,
+    # Keyword arguments to models.base_model.make_session_config, ie {"intra_op_threads":4, "inter_op_threads":1, "xla_jit":true}
+    "session":None,
+}
+
+def load_config(path):
+    """
+    Reads a training config file and fills in any missing values from DEFAULT_CONFIG.
+    Args:
+        path (str): path to JSON config file
+    Returns:
+        config (dict): complete training config
+    """
+    with open(path, 'r') as infile:
+        config = json.load(infile)
+    unknown = set(config.keys())-set(DEFAULT_CONFIG.keys())
+    if unknown:
+        raise ValueError("Unknown config keys: {}".format(sorted(unknown)))
+    config = dict(DEFAULT_CONFIG, **config)
+    if config["name"] is None:
+        config["name"] = config["model"]
+    return config
+
+def prepare_run_dir(config, fresh=False):
+    """
+    Creates the run directory for config and records the config in it. Resuming a run with a config which differs from
+    the one it was started with is refused, since the saved trainer state would no longer match.
+    Args:
+        config (dict): training config
+        fresh (bool): if True any existing run (including its checkpoints) is removed first
+    Returns:
+        None
+    """
+    run_dir = config["run_dir"]
+    if fresh and os.path.exists(run_dir):
+        shutil.rmtree(run_dir)
+    os.makedirs(run_dir, exist_ok=True)
+    config_path = os.path.join(run_dir, "config.json")
+    if os.path.exists(config_path):
+        with open(config_path, 'r') as infile:
+            saved_config = json.load(infile)
+        if saved_config != config:
+            raise ValueError("Config does not match the one {} was started with. Use --fresh to start a new run.".format(run_dir))
+    else:
+        with open(config_path, 'w') as outfile:
+            json.dump(config, outfile, indent=2, sort_keys=True)
+
+def get_split(config):
+    """
+    Returns the training/validation split for the run. The split is saved to the run directory the first time it is built so
+    that resumed runs train on exactly the same matches.
+    """
+    run_split_path = os.path.join(config["run_dir"], "split.txt")
+    if os.path.exists(run_split_path):
+        with open(run_split_path, 'r') as infile:
+            return json.load(infile)
+
+    if config["hash_split"]:
+        options = config["hash_split"]
+        ratios = tuple(tuple(ratio) for ratio in options.get("ratios", [["training", 0.9], ["validation", 0.1]]))
+        split = hash_split(config["path_to_db"], ratios, stratify_by=options.get("stratify_by"), salt=options.get("salt", ""))
+    else:
+        split = test_train_split(config["n_train"], config["n_val"], config["path_to_db"], config["split_path"])
+    with open(run_split_path, 'w') as outfile:
+        json.dump(split, outfile)
+    return split
+
+def build_trainer(config, training_matches, validation_matches, session_config=None, datasets=None, profiler=None, max_steps=None):
+    """
+    Builds the network and trainer described by config.
+    Args:
+        config (dict): training config
+        training_matches (list(dict)): matches to train on
+        validation_matches (list(dict)): matches to validate against
+        session_config (tf.ConfigProto or dict, optional): configuration for the network's session. Defaults to config["session"].
+        datasets (tuple(CompiledDataset), optional): precompiled (training, validation) datasets used to fill the softmax
+            trainer's buffers
+        profiler (StepProfiler, optional): profiler passed to the trainer
+        max_steps (int, optional): if set, training stops after this many steps
+    Returns:
+        trainer (DDQNTrainer or SoftmaxTrainer)
+    """
+    import tensorflow as tf
+    from models import qNetwork, softmax
+    from trainer import DDQNTrainer, SoftmaxTrainer
+
+    state = DraftState(DraftState.BLUE_TEAM)
+    input_size = state.format_state().shape
+    output_size = state.num_actions
+    out_path = os.path.join(config["run_dir"], "{}_model_E{}.ckpt".format(config["name"], config["n_epoch"]))
+    filter_sizes = tuple(config["filter_sizes"])
+    if session_config is None:
+        session_config = config["session"]
+
+    tf.reset_default_graph()
+    if config["model"] == "ddqn":
+        net = qNetwork.Qnetwork(config["name"], out_path, input_size, output_size, filter_sizes, config["learning_rate"],
+                                config["regularization_coeff"], config["discount_factor"], session_config=session_config,
+                                seed=config["seed"])
+        return DDQNTrainer(net, config["n_epoch"], training_matches, validation_matches, config["batch_size"], config["buffer_size"],
+                           config["load_path"], profiler=profiler, max_steps=max_steps)
+    elif config["model"] == "softmax":
+        net = softmax.SoftmaxNetwork(config["name"], out_path, input_size, output_size, filter_sizes, config["learning_rate"],
+                                     config["regularization_coeff"], session_config=session_config,
+                                     seed=config["seed"])
+        return SoftmaxTrainer(net, config["n_epoch"], training_matches, validation_matches, config["batch_size"], config["load_path"],
+                              profiler=profiler, max_steps=max_steps, datasets=datasets)
+    raise ValueError("Unknown model type {}".format(config["model"]))
+
+def run(config, fresh=False):
+    """
+    Trains the model described by config, resuming from the latest checkpoint in the run directory if there is one.
+    Args:
+        config (dict): training config (see DEFAULT_CONFIG)
+        fresh (bool): if True any existing checkpoints for the run are discarded
+    Returns:
+        summaries (dict): training summaries returned by the trainer
+    """
+    prepare_run_dir(config, fresh)
+    if config["seed"] is not None:
+        random.seed(config["seed"])
+        np.random.seed(config["seed"])
+
+    split = get_split(config)
+    store = MatchStore(config["path_to_db"])
+    training_matches = store.get_matches(split["training_ids"])
+    validation_matches = store.get_matches(split["validation_ids"])
+    print("Found {} training matches and {} validation matches in pool.".format(len(training_matches), len(validation_matches)))
+
+    trainer = build_trainer(config, training_matches, validation_matches)
+    summaries = trainer.train(checkpoint_dir=os.path.join(config["run_dir"], "checkpoints"),
+                              checkpoint_interval=config["checkpoint_interval"])
+    with open(os.path.join(config["run_dir"], "summaries.json"), 'w') as outfile:
+        json.dump({key:[float(v) for v in values] for key, values in summaries.items()}, outfile, indent=2)
+    return summaries
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a model from a config file. Interrupted runs are resumed from their latest checkpoint.")
+    parser.add_argument("config", help="path to JSON training config (see configs/)")
+    parser.add_argument("--fresh", action="store_true", help="discard any existing checkpoints and start the run over")
+    args = parser.parse_args()
+
+    from models.base_model import configure_process
+    config = load_config(args.config)
+    configure_process(config["session"])
+    summaries = run(config, fresh=args.fresh)
+    print("Learning complete!")
+    if summaries["train_acc"]:
+        print("..final training accuracy: {:.4f}".format(summaries["train_acc"][-1]))
@@ -0,0 +1,40 @@
+import argparse
+
+from benchmarks.benchmarks import save_report
+from benchmarks.training import PRESETS, run_training_benchmark
+from models.base_model import configure_process
+
+parser = argparse.ArgumentParser(description="Measure end-to-end training throughput of the DDQN and softmax trainers.")
+parser.add_argument("--trainer", choices=["ddqn", "softmax", "both"], default="both")
+parser.add_argument("--preset", choices=sorted(PRESETS.keys()), default="small")
+parser.add_argument("--db", default="../data/competitiveMatchData.db", help="path to match database")
+parser.add_argument("--out-dir", default="tmp/benchmarks", help="directory to write models, profiles and results to")
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--intra-op-threads", type=int, default=None)
+parser.add_argument("--inter-op-threads", type=int, default=None)
+parser.add_argument("--optimizer-level", type=int, choices=[0,1], default=None)
+parser.add_argument("--xla", action="store_true", help="compile the networks with XLA")
+args = parser.parse_args()
+session_config = {"intra_op_threads":args.intra_op_threads, "inter_op_threads":args.inter_op_threads,
+                  "optimizer_level":args.optimizer_level, "xla_jit":args.xla}
+configure_process(session_config)
+
+trainer_types = ["ddqn", "softmax"] if args.trainer == "both" else [args.trainer]
+reports = {}
+for trainer_type in trainer_types:
+    # Peak RSS is measured over the whole process, so when both trainers are benchmarked the figure
+    # reported for the second includes the first. Run them separately for independent memory figures.
+    report = run_training_benchmark(trainer_type, args.preset, args.db, args.out_dir, args.seed, session_config)
+    reports[trainer_type] = report
+    print("***")
+    print("{} ({} preset): {} steps, {} gradient steps in {:.1f}s".format(trainer_type, args.preset, report["steps"], report["gradient_steps"], report["elapsed"]))
+    print("  experiences/sec: {:.1f}".format(report["experiences_per_sec"]))
+    print("  gradient steps/sec: {:.2f}".format(report["gradient_steps_per_sec"]))
+    print("  peak RSS: {:.1f}MB".format(report["peak_rss_mb"]))
+    for name in sorted(report["phases"].keys(), key=lambda name: -report["phases"][name]["total"]):
+        phase = report["phases"][name]
+        print("  {:16} {:8.2f}s ({:5.1%}) over {} calls".format(name, phase["total"], phase["total"]/report["elapsed"], phase["count"]))
+
+out_path = "{}/training_{}.json".format(args.out_dir, args.preset)
+save_report(reports, out_path)
+print("Wrote results to {}".format(out_path))
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import random
+import argparse
+import itertools
+import traceback
+import contextlib
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+
+from data.match_store import MatchStore
+from features.compiled_dataset import compile_dataset, CompiledDataset
+from run_training import DEFAULT_CONFIG, get_split, build_trainer
+
+# Set in each worker process by _init_worker()
+_worker_cores = None
+
+def expand_grid(base_config, grid):
+    """
+    Builds one training config for every combination of values in grid.
+    Args:
+        base_config (dict): training config shared by all runs (see run_training.DEFAULT_CONFIG)
+        grid (dict): dictionary mapping config keys to lists of values to sweep over
+    Returns:
+        configs (list(dict)): list of training configs
+    """
+    keys = sorted(grid.keys())
+    configs = []
+    for values in itertools.product(*[grid[key] for key in keys]):
+        config = dict(DEFAULT_CONFIG, **base_config)
+        config.update(dict(zip(keys, values)))
+        configs.append(config)
+    return configs
+
+def core_groups(cores_per_run, n_workers=None):
+    """
+    Partitions the cores available to this process into disjoint groups of cores_per_run cores, one per worker.
+    """
+    cores = sorted(os.sched_getaffinity(0))
+    n_groups = len(cores)//cores_per_run
+    if n_workers:
+        n_groups = min(n_groups, n_workers)
+    if n_groups == 0:
+        raise ValueError("Not enough cores ({}) for {} cores per run".format(len(cores), cores_per_run))
+    return [cores[k*cores_per_run:(k+1)*cores_per_run] for k in range(n_groups)]
+
+def _init_worker(core_queue):
+    global _worker_cores
+    _worker_cores = core_queue.get()
+    os.sched_setaffinity(0, _worker_cores)
+
+def _run_trial(args):
+    (trial_id, config, data_path, dataset_paths) = args
+
+    os.makedirs(config["run_dir"], exist_ok=True)
+    # Each run gets a single inter-op thread and one intra-op thread per pinned core by default so that runs do not
+    # oversubscribe the cores they share a node with
+    session_config = {"intra_op_threads":len(_worker_cores), "inter_op_threads":1}
+    if config["session"]:
+        session_config.update(config["session"])
+    # The worker was pinned to its cores by _init_worker(), which any cores given in the run's config must not override
+    session_config.pop("cores", None)
+
+    t0 = time.perf_counter()
+    summaries = {"loss":[], "train_acc":[], "val_acc":[]}
+    error = None
+    with open(os.path.join(config["run_dir"], "log.txt"), 'w') as log, contextlib.redirect_stdout(log):
+        try:
+            from models.base_model import configure_process
+            configure_process(session_config)
+            if config["seed"] is not None:
+                # The network's graph is seeded from config["seed"] by build_trainer()
+                random.seed(config["seed"])
+                np.random.seed(config["seed"])
+            with open(data_path, 'r') as infile:
+                data = json.load(infile)
+            datasets = None
+            if config["model"] == "softmax":
+                datasets = tuple(CompiledDataset(path) for path in dataset_paths)
+            trainer = build_trainer(config, data["training_matches"], data["validation_matches"], session_config=session_config, datasets=datasets)
+            summaries = trainer.train()
+        except Exception:
+            error = traceback.format_exc()
+            print(error)
+    elapsed = time.perf_counter()-t0
+    summaries = {key:[float(v) for v in values] for key, values in summaries.items()}
+    return {"trial":trial_id, "config":config, "cores":list(_worker_cores), "elapsed":elapsed, "summaries":summaries, "error":error}
+
+def run_sweep(base_config, grid, sweep_dir, cores_per_run=2, n_workers=None):
+    """
+    Trains a model for every combination of hyperparameters in grid using a pool of worker processes. Each worker is pinned
+    to its own group of cores_per_run cores and sizes its TensorFlow thread pools to match. The training/validation split is
+    built once, and the matches (and for softmax runs the compiled experiences) are written to sweep_dir and shared by all runs.
+    Args:
+        base_config (dict): training config shared by all runs
+        grid (dict): dictionary mapping config keys to lists of values to sweep over
+        sweep_dir (str): directory that shared data, run directories and results are written to
+        cores_per_run (int): number of cores given to each run
+        n_workers (int, optional): maximum number of runs trained at once. Defaults to as many as there are core groups.
+    Returns:
+        results (pandas DataFrame): one row per run holding its swept hyperparameters and final/best metrics
+    """
+    os.makedirs(sweep_dir, exist_ok=True)
+    configs = expand_grid(base_config, grid)
+    for trial_id, config in enumerate(configs):
+        config["run_dir"] = os.path.join(sweep_dir, "run_{}".format(trial_id))
+        config["name"] = "{}_{}".format(config["model"], trial_id)
+
+    # Prepare data shared by every run
+    split = get_split(dict(configs[0], run_dir=sweep_dir))
+    store = MatchStore(configs[0]["path_to_db"])
+    training_matches = store.get_matches(split["training_ids"])
+    validation_matches = store.get_matches(split["validation_ids"])
+    data_path = os.path.join(sweep_dir, "matches.json")
+    with open(data_path, 'w') as outfile:
+        json.dump({"training_matches":training_matches, "validation_matches":validation_matches}, outfile)
+    dataset_paths = None
+    if any(config["model"] == "softmax" for config in configs):
+        dataset_paths = (os.path.join(sweep_dir, "training_experiences.bin"), os.path.join(sweep_dir, "validation_experiences.bin"))
+        compile_dataset(training_matches, dataset_paths[0], augment_data=True)
+        compile_dataset(validation_matches, dataset_paths[1], augment_data=True)
+
+    groups = core_groups(cores_per_run, n_workers)
+    print("Running {} trials on {} workers with cores {}".format(len(configs), len(groups), groups))
+    ctx = mp.get_context("spawn")
+    manager = ctx.Manager()
+    core_queue = manager.Queue()
+    for group in groups:
+        core_queue.put(group)
+
+    trials = [(trial_id, config, data_path, dataset_paths) for trial_id, config in enumerate(configs)]
+    rows = []
+    reports = []
+    with ctx.Pool(len(groups), initializer=_init_worker, initargs=(core_queue,)) as pool:
+        for result in pool.imap_unordered(_run_trial, trials):
+            reports.append(result)
+            summaries = result["summaries"]
+            row = {"trial":result["trial"], "elapsed":result["elapsed"], "error":result["error"]}
+            row.update({key:result["config"][key] for key in sorted(grid.keys())})
+            row["final_loss"] = summaries["loss"][-1] if summaries["loss"] else None
+            row["final_train_acc"] = summaries["train_acc"][-1] if summaries["train_acc"] else None
+            row["final_val_acc"] = summaries["val_acc"][-1] if summaries["val_acc"] else None
+            row["best_val_acc"] = max(summaries["val_acc"]) if summaries["val_acc"] else None
+            rows.append(row)
+            print("Finished trial {} in {:.1f}s (val acc {})".format(result["trial"], result["elapsed"], row["final_val_acc"]), flush=True)
+
+    results = pd.DataFrame(rows).sort_values("trial").reset_index(drop=True)
+    results.to_csv(os.path.join(sweep_dir, "results.csv"), index=False)
+    with open(os.path.join(sweep_dir, "results.json"), 'w') as outfile:
+        json.dump(sorted(reports, key=lambda report: report["trial"]), outfile, indent=2)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a hyperparameter sweep over a grid of training configs.")
+    parser.add_argument("sweep_config", help="JSON file with keys 'base' (training config), 'grid' (key -> list of values), 'sweep_dir' and optionally 'cores_per_run' and 'n_workers'")
+    args = parser.parse_args()
+    with open(args.sweep_config, 'r') as infile:
+        sweep = json.load(infile)
+
+    results = run_sweep(sweep["base"], sweep["grid"], sweep["sweep_dir"], sweep.get("cores_per_run", 2), sweep.get("n_workers"))
+    print(results.to_string())
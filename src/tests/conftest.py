@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Modules are imported relative to src/ and read their data files using paths relative to it
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+os.chdir(SRC_DIR)
+
+PATH_TO_DB = "../data/competitiveMatchData.db"
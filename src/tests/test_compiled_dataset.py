@@ -0,0 +1,37 @@
+import numpy as np
+
+from conftest import PATH_TO_DB
+from data.match_store import MatchStore
+from features.draftstate import DraftState
+from features.match_processing import process_match
+from features.compiled_dataset import compile_dataset, CompiledDataset
+from features.state_encoding import pack_state, unpack_bits
+
+def test_compiled_dataset_matches_process_match(tmp_path):
+    store = MatchStore(PATH_TO_DB)
+    matches = store.get_matches(store.all().ids()[:5])
+    out_path = str(tmp_path/"experiences.bin")
+    header = compile_dataset(matches, out_path, orderings=[0])
+    dataset = CompiledDataset(out_path)
+    assert len(dataset) == header["num_experiences"]
+
+    row = 0
+    for match in matches:
+        for team in [DraftState.BLUE_TEAM, DraftState.RED_TEAM]:
+            for (start, (cid, pos), reward, end) in process_match(match, team, augment_data=False, ordering=0):
+                if cid is None:
+                    continue
+                assert dataset["match_id"][row] == match["id"]
+                assert dataset["team"][row] == team
+                assert np.array_equal(dataset["state"][row], pack_state(start))
+                assert np.array_equal(dataset["next_state"][row], pack_state(end))
+                assert dataset["action"][row] == start.get_action(cid, pos)
+                assert dataset["reward"][row] == np.float32(reward)
+                assert dataset["next_status"][row] == end.evaluate()
+                assert np.array_equal(unpack_bits(dataset["valid_actions"][row], dataset.num_actions), start.get_valid_actions())
+                row += 1
+    assert row == len(dataset)
+
+    batch = dataset.get_batch(np.arange(len(dataset)))
+    assert batch["states"].shape == (len(dataset), dataset.state_size)
+    assert np.array_equal(batch["actions"], dataset["action"])
@@ -0,0 +1,88 @@
+import pytest
+
+from features.draft import Draft, InvalidDraftFormat, InvalidSubmissionCount
+
+B, R = Draft.BLUE_TEAM, Draft.RED_TEAM
+BAN, PICK = Draft.BAN, Draft.PICK
+
+# Submission lists the built-in formats were originally written out as
+STRUCTURES = {
+    "default":[(B,BAN), (R,BAN), (B,BAN), (R,BAN), (B,BAN), (R,BAN),
+               (B,PICK), (R,PICK), (R,PICK), (B,PICK), (B,PICK), (R,PICK),
+               (R,BAN), (B,BAN), (R,BAN), (B,BAN),
+               (R,PICK), (B,PICK), (B,PICK), (R,PICK)],
+    "no_bans":[(B,PICK), (R,PICK), (R,PICK), (B,PICK), (B,PICK), (R,PICK),
+               (R,PICK), (B,PICK), (B,PICK), (R,PICK)],
+}
+
+def reference_phase_lengths(structure):
+    phase_lengths = {phase:[] for phase in Draft.PHASES}
+    phase_length = 0
+    current_phase = None
+    for (team, phase) in structure:
+        if not current_phase:
+            current_phase = phase
+        if phase == current_phase:
+            phase_length += 1
+        else:
+            phase_lengths[current_phase].append(phase_length)
+            current_phase = phase
+            phase_length = 1
+    phase_lengths[current_phase].append(phase_length)
+    return phase_lengths
+
+def reference_submission_dist(structure):
+    submission_dist = [(0,0,0)]
+    for (team, phase) in structure:
+        (cur_ban, cur_blue, cur_red) = submission_dist[-1]
+        if phase == BAN:
+            submission_dist.append((cur_ban+1, cur_blue, cur_red))
+        elif team == B:
+            submission_dist.append((cur_ban, cur_blue+1, cur_red))
+        else:
+            submission_dist.append((cur_ban, cur_blue, cur_red+1))
+    return submission_dist
+
+@pytest.mark.parametrize("draft_type", sorted(STRUCTURES.keys()))
+def test_compiled_tables_match_structure(draft_type):
+    structure = STRUCTURES[draft_type]
+    draft = Draft(draft_type)
+    assert Draft.draft_structures[draft_type] == structure
+    assert len(draft) == draft.NUM_SUBMISSIONS == len(structure)
+    assert draft.PHASE_LENGTHS == reference_phase_lengths(structure)
+    assert draft.NUM_BANS == sum(1 for (_, phase) in structure if phase == BAN)
+    assert draft.NUM_PICKS == sum(1 for (_, phase) in structure if phase == PICK)
+    assert draft.submission_dist == reference_submission_dist(structure)
+    assert [tuple(counts) for counts in draft.expected_counts.tolist()] == draft.submission_dist
+
+    for k, (team, phase) in enumerate(structure):
+        assert draft.get_active_team(k) == team
+        assert draft.get_active_phase(k) == phase
+        assert draft.active_team[k] == team
+        assert draft.active_phase[k] == phase
+        assert draft.submission_slot[k] == sum(1 for submission in structure[:k] if submission == (team, phase))
+    assert draft.get_active_team(len(structure)) is None
+    assert draft.get_active_phase(len(structure)) is None
+    assert draft.active_team[len(structure)] == Draft.TERMINAL
+    with pytest.raises(InvalidSubmissionCount):
+        draft.get_active_team(len(structure)+1)
+    with pytest.raises(InvalidSubmissionCount):
+        draft.get_active_phase(-1)
+
+@pytest.mark.parametrize("draft_type", sorted(STRUCTURES.keys()))
+def test_augment_permutations_only_exchange_equivalent_submissions(draft_type):
+    structure = STRUCTURES[draft_type]
+    draft = Draft(draft_type)
+    permutations = draft.augment_permutations()
+    assert permutations[0].tolist() == list(range(len(structure)))
+    assert len(set(tuple(p) for p in permutations.tolist())) == len(permutations)
+    for ordering in permutations.tolist():
+        assert sorted(ordering) == list(range(len(structure)))
+        for k, submission in enumerate(ordering):
+            assert structure[submission] == structure[k]
+            if submission != k:
+                assert draft.augment_group[k] == draft.augment_group[submission] != Draft.TERMINAL
+
+def test_unknown_format_raises():
+    with pytest.raises(InvalidDraftFormat):
+        Draft("not_a_format")
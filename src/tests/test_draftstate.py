@@ -0,0 +1,60 @@
+import numpy as np
+
+from conftest import PATH_TO_DB
+from data.match_store import MatchStore
+from features.draftstate import DraftState
+from features.match_processing import process_match, process_match_dual, augmentation_orderings
+from features.state_encoding import pack_state, hash_packed_states
+
+def load_matches(n_matches=3):
+    store = MatchStore(PATH_TO_DB)
+    return store.get_matches(store.all().ids()[:n_matches])
+
+def test_zobrist_hash_matches_compute_hash():
+    for match in load_matches():
+        for team in [DraftState.BLUE_TEAM, DraftState.RED_TEAM]:
+            experiences = process_match(match, team, augment_data=False, ordering=0)
+            for (start, _, _, end) in experiences:
+                assert start.zobrist_hash == start.compute_hash()
+                assert end.zobrist_hash == end.compute_hash()
+            states = [start for (start, _, _, _) in experiences]
+            packed = np.stack([pack_state(state) for state in states], axis=0)
+            counts = [len(state.picks)+len(state.bans) for state in states]
+            hashes = hash_packed_states(packed, [team]*len(states), counts)
+            assert hashes.tolist() == [state.zobrist_hash for state in states]
+
+def test_dual_views_match_single_perspective_hashes():
+    for match in load_matches():
+        dual = process_match_dual(match, augment_data=False, ordering=0)
+        for team in [DraftState.BLUE_TEAM, DraftState.RED_TEAM]:
+            single = process_match(match, team, augment_data=False, ordering=0)
+            assert [exp[0].zobrist_hash for exp in dual[team]] == [exp[0].zobrist_hash for exp in single]
+            assert [exp[3].zobrist_hash for exp in dual[team]] == [exp[3].compute_hash() for exp in dual[team]]
+
+def test_zobrist_hash_invariant_across_orderings():
+    for match in load_matches(1):
+        # Every ordering submits the same picks and bans, so a handful of them is enough
+        orderings = augmentation_orderings(match)[::97][:8]
+        assert len(orderings) > 1
+        for team in [DraftState.BLUE_TEAM, DraftState.RED_TEAM]:
+            final_hashes = set()
+            for ordering in orderings:
+                final_state = process_match(match, team, augment_data=False, ordering=ordering)[-1][3]
+                final_hashes.add(final_state.zobrist_hash)
+            assert len(final_hashes) == 1
+
+def test_zobrist_hash_distinguishes_teams_and_positions():
+    blue = DraftState(DraftState.BLUE_TEAM)
+    red = DraftState(DraftState.RED_TEAM)
+    assert blue.zobrist_hash != red.zobrist_hash
+
+    champion_id = blue.get_champ_id(0)
+    as_ban = blue.copy()
+    as_ban.update(champion_id, -1)
+    as_pick = blue.copy()
+    as_pick.update(champion_id, 1)
+    assert as_ban.zobrist_hash != as_pick.zobrist_hash
+    assert blue.zobrist_hash == blue.compute_hash()
+
+    as_ban.reset()
+    assert as_ban.zobrist_hash == blue.zobrist_hash
@@ -0,0 +1,47 @@
+import shutil
+import sqlite3
+
+from conftest import PATH_TO_DB
+from data.match_pool import split_hash, assign_split, hash_split, get_match_metadata
+
+def test_split_hash_is_pinned():
+    # Assignments must not change between runs, machines or Python versions
+    assert split_hash("2018/NA/Summer_Season", 1) == 0.3211235440638333
+    assert split_hash("2018/NA/Summer_Season", 1, salt="x") == 0.13336240629398144
+    assert [assign_split("2018/NA/Summer_Season", k) for k in range(8)] == ["validation"] + ["training"]*6 + ["validation"]
+
+def test_assign_split_respects_ratios():
+    ratios = (("a", 1), ("b", 2), ("c", 1))
+    assignments = [assign_split("tournament", k, ratios) for k in range(4000)]
+    for (name, expected) in [("a", 0.25), ("b", 0.5), ("c", 0.25)]:
+        assert abs(assignments.count(name)/4000. - expected) < 0.03
+
+def test_hash_split_stable_across_inserts(tmp_path):
+    path_to_db = str(tmp_path/"matches.db")
+    shutil.copy(PATH_TO_DB, path_to_db)
+    conn = sqlite3.connect(path_to_db)
+    cur = conn.cursor()
+    cur.execute("SELECT DISTINCT tournament FROM game")
+    match_sources = {"patches":[], "tournaments":sorted(row[0] for row in cur.fetchall())}
+
+    before = hash_split(path_to_db, match_sources=match_sources)
+    assert before == hash_split(path_to_db, match_sources=match_sources)
+    assert len(before["training_ids"]) > 8*len(before["validation_ids"])
+
+    # Add copies of some games under new tournament game ids
+    cur.execute("SELECT tournament, week, patch, blue_teamid, red_teamid, winning_team FROM game LIMIT 50")
+    for k, row in enumerate(cur.fetchall()):
+        cur.execute("INSERT INTO game (tournament, tourn_game_id, week, patch, blue_teamid, red_teamid, winning_team) VALUES (?,?,?,?,?,?,?)",
+                    (row[0], 100000+k) + row[1:])
+    conn.commit()
+    conn.close()
+
+    after = hash_split(path_to_db, match_sources=match_sources)
+    for name in before:
+        assert set(before[name]) <= set(after[name])
+    new_ids = set(after["training_ids"]+after["validation_ids"]) - set(before["training_ids"]+before["validation_ids"])
+    assert len(new_ids) == 50
+    metadata = get_match_metadata(list(new_ids), path_to_db, columns=("tournament", "tourn_game_id"))
+    for match_id in new_ids:
+        name = assign_split(metadata[match_id]["tournament"], metadata[match_id]["tourn_game_id"])
+        assert match_id in after["{}_ids".format(name)]
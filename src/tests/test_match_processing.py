@@ -0,0 +1,48 @@
+import copy
+import pytest
+
+from conftest import PATH_TO_DB
+from data.match_store import MatchStore
+from features.draft import Draft
+from features.draftstate import DraftState
+from features.match_processing import build_action_queue, process_match, MissingSubmissions
+from features.compiled_dataset import compile_dataset
+from features.draft_similarity import DraftSimilarityIndex
+
+def load_matches(n_matches=2):
+    store = MatchStore(PATH_TO_DB)
+    return store.get_matches(store.all().ids()[:n_matches])
+
+def incomplete_match(match, side="red", kind="bans"):
+    match = copy.deepcopy(match)
+    match[side][kind] = match[side][kind][:-1]
+    return match
+
+def test_build_action_queue_follows_draft():
+    draft = Draft("default")
+    for match in load_matches():
+        queue = list(build_action_queue(match))
+        assert len(queue) == len(draft)
+        for (side_id, _, position), (team, phase) in zip(queue, draft.draft_structures["default"]):
+            assert side_id == team
+            assert (position == -1) == (phase == Draft.BAN)
+
+@pytest.mark.parametrize("side,kind", [("blue", "bans"), ("red", "bans"), ("blue", "picks"), ("red", "picks")])
+def test_missing_submissions_raise(side, kind):
+    match = incomplete_match(load_matches(1)[0], side, kind)
+    with pytest.raises(MissingSubmissions):
+        build_action_queue(match)
+    with pytest.raises(MissingSubmissions):
+        process_match(match, DraftState.BLUE_TEAM, augment_data=False)
+
+def test_incomplete_matches_are_skipped(tmp_path):
+    matches = load_matches()
+    matches.append(incomplete_match(matches[0]))
+
+    header = compile_dataset(matches, str(tmp_path/"experiences.bin"), orderings=[0])
+    assert header["skipped_matches"] == 1
+    assert header["num_matches"] == len(matches)
+
+    index = DraftSimilarityIndex()
+    assert index.add_matches(matches) == 1
+    assert len(index.game_ids) == 2*(len(matches)-1)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from conftest import PATH_TO_DB
+from data.match_store import MatchStore
+from features.draftstate import DraftState
+from features.match_processing import process_match
+from features.rewards import get_reward, get_rewards, get_winning_team
+
+def test_get_rewards_matches_get_reward():
+    store = MatchStore(PATH_TO_DB)
+    matches = store.get_matches(store.all().ids()[:4])
+    # Include a match with no recorded winner
+    matches.append(dict(matches[0], winner=None))
+
+    transitions = []
+    for match in matches:
+        for team in [DraftState.BLUE_TEAM, DraftState.RED_TEAM]:
+            for (start, (cid, pos), _, end) in process_match(match, team, augment_data=False, ordering=0):
+                if cid is None:
+                    continue
+                transitions.append((end, match, start.get_action(cid, pos)))
+    # Picking during the ban phase and picking a banned champion both give invalid states
+    template = DraftState(DraftState.BLUE_TEAM)
+    champion_id = template.get_champ_id(0)
+    for positions in [[1], [-1, 2]]:
+        invalid = template.copy()
+        for position in positions:
+            invalid.update(champion_id, position)
+        assert invalid.evaluate() in DraftState.invalid_states
+        transitions.append((invalid, matches[0], 0))
+
+    # Alternate between submitted actions which match and differ from the observed ones
+    submitted = [action if k % 2 == 0 else action+1 for k, (_, _, action) in enumerate(transitions)]
+    expected = [get_reward(state, match, submitted_action, action) for ((state, match, action), submitted_action) in zip(transitions, submitted)]
+
+    winners = [get_winning_team(match) for (_, match, _) in transitions]
+    rewards = get_rewards([state.evaluate() for (state, _, _) in transitions],
+                          [state.team for (state, _, _) in transitions],
+                          [-1 if winner is None else winner for winner in winners],
+                          submitted,
+                          [action for (_, _, action) in transitions])
+    assert rewards.dtype == np.float32
+    assert np.array_equal(rewards, np.array(expected, dtype=np.float32))
+    assert len(set(expected)) > 3
@@ -1,6 +1,9 @@
+import os
 import time
+import json
+import pickle
 import random
-from copy import deepcopy
+import shutil
 
 import tensorflow as tf
 import pandas as pd
@@ -11,10 +14,102 @@ import data.match_pool as pool
 from features.draftstate import DraftState
 import features.experience_replay as er
 import features.match_processing as mp
-from features.rewards import get_reward
+from features.rewards import get_rewards, REWARD_TABLE
+from features.state_encoding import pack_experience, stack_packed_experiences, packed_experiences_to_arrays, arrays_to_packed_experiences, unpack_bits
+from profiler import StepProfiler
 
 class BaseTrainer():
-    pass
+    """
+    BaseTrainer holds the checkpointing logic shared by the trainers. A trainer checkpoint holds everything needed to resume training
+    exactly where it stopped: the network variables (which include the optimizer state and learning rate), the trainer's counters
+    and schedule state, the contents of its experience buffers and the states of the Python and NumPy random number generators.
+
+    Checkpoints are written to <checkpoint_dir>/ckpt_<epoch>. Each checkpoint is first written to a temporary directory which is
+    renamed into place once complete, after which the file <checkpoint_dir>/latest is atomically replaced to point at it. A run
+    interrupted part way through writing a checkpoint therefore always resumes from the last complete one.
+
+    Subclasses implement get_network(), get_checkpoint_state(), set_checkpoint_state() and get_checkpoint_buffers().
+    """
+    CHECKPOINT_KEEP = 2 # Number of most recent checkpoints kept in checkpoint_dir
+
+    def get_network(self):
+        raise NotImplementedError
+    def get_checkpoint_state(self):
+        raise NotImplementedError
+    def set_checkpoint_state(self, state):
+        raise NotImplementedError
+    def get_checkpoint_buffers(self):
+        raise NotImplementedError
+
+    def save_checkpoint(self, checkpoint_dir):
+        """
+        Writes a checkpoint of the current (end of epoch) training state to checkpoint_dir.
+        Args:
+            checkpoint_dir (str): directory to write checkpoint into
+        Returns:
+            path (str): path to written checkpoint
+        """
+        name = "ckpt_{}".format(self.epoch_count+1)
+        path = os.path.join(checkpoint_dir, name)
+        tmp_path = "{}.tmp".format(path)
+        for stale in [tmp_path, path]:
+            if os.path.exists(stale):
+                shutil.rmtree(stale)
+        os.makedirs(tmp_path)
+
+        self.get_network().save(path=os.path.join(tmp_path, "model.ckpt"))
+        for buffer_name, buf in self.get_checkpoint_buffers().items():
+            # Experiences are stored packed so the buffers are written as stacked arrays of their fields
+            arrays = packed_experiences_to_arrays(buf.buffer)
+            np.savez_compressed(os.path.join(tmp_path, "{}.npz".format(buffer_name)), oldest_experience=buf.oldest_experience, **arrays)
+        with open(os.path.join(tmp_path, "rng.pkl"), 'wb') as outfile:
+            pickle.dump({"random":random.getstate(), "numpy":np.random.get_state()}, outfile)
+        with open(os.path.join(tmp_path, "trainer_state.json"), 'w') as outfile:
+            json.dump(self.get_checkpoint_state(), outfile, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+        latest_path = os.path.join(checkpoint_dir, "latest")
+        with open("{}.tmp".format(latest_path), 'w') as outfile:
+            outfile.write(name)
+        os.replace("{}.tmp".format(latest_path), latest_path)
+
+        # Remove older checkpoints
+        checkpoints = [d for d in os.listdir(checkpoint_dir) if d.startswith("ckpt_") and not d.endswith(".tmp")]
+        checkpoints.sort(key=lambda d: int(d.split("_")[1]))
+        for old in checkpoints[:-self.CHECKPOINT_KEEP]:
+            if old != name:
+                shutil.rmtree(os.path.join(checkpoint_dir, old))
+        return path
+
+    def restore_checkpoint(self, checkpoint_dir):
+        """
+        Restores training state from the latest checkpoint in checkpoint_dir (if any). Must be called after the network
+        variables have been initialized.
+        Args:
+            checkpoint_dir (str): directory containing checkpoints written by save_checkpoint()
+        Returns:
+            restored (bool): True if a checkpoint was found and restored
+        """
+        latest_path = os.path.join(checkpoint_dir, "latest")
+        if not os.path.exists(latest_path):
+            return False
+        with open(latest_path, 'r') as infile:
+            path = os.path.join(checkpoint_dir, infile.read().strip())
+
+        self.get_network().load(os.path.join(path, "model.ckpt"))
+        for buffer_name, buf in self.get_checkpoint_buffers().items():
+            with np.load(os.path.join(path, "{}.npz".format(buffer_name))) as data:
+                arrays = {key:data[key] for key in data.files if key != "oldest_experience"}
+                buf.buffer = arrays_to_packed_experiences(arrays)
+                buf.oldest_experience = int(data["oldest_experience"])
+        with open(os.path.join(path, "rng.pkl"), 'rb') as infile:
+            rng = pickle.load(infile)
+        random.setstate(rng["random"])
+        np.random.set_state(rng["numpy"])
+        with open(os.path.join(path, "trainer_state.json"), 'r') as infile:
+            self.set_checkpoint_state(json.load(infile))
+        print("Resumed training from {} (epoch {}, step {})".format(path, self.start_epoch, self.step_count))
+        return True
 
 class DDQNTrainer(BaseTrainer):
     """
@@ -27,8 +122,10 @@ class DDQNTrainer(BaseTrainer):
         batch_size (int): size of each training set sampled from the replay buffer which will be used to update Qnet at a time
         buffer_size (int): size of replay buffer used
         load_path (string): path to reload existing model
+        profiler (StepProfiler, optional): profiler used to time each phase of training. If None, profiling is disabled.
+        max_steps (int, optional): if given, training stops once this many steps have been taken, even part way through an epoch
     """
-    def __init__(self, q_network, n_epoch, training_data, validation_data, batch_size, buffer_size, load_path=None):
+    def __init__(self, q_network, n_epoch, training_data, validation_data, batch_size, buffer_size, load_path=None, profiler=None, max_steps=None):
         num_episodes = len(training_data)
         print("***")
         print("Beginning training..")
@@ -45,20 +142,30 @@ class DDQNTrainer(BaseTrainer):
         self.batch_size = batch_size
         self.buffer_size = buffer_size
         self.load_path = load_path
+        self.profiler = profiler if profiler else StepProfiler(enabled=False)
+        self.max_steps = max_steps
 
         self.replay = er.ExperienceBuffer(self.buffer_size)
+        template = DraftState(DraftState.BLUE_TEAM)
+        self.state_size = template.state.size
+        self.num_actions = template.num_actions
         self.step_count = 0
         self.epoch_count = 0
 
         self.dampen_states = False
+        self.reward_table = REWARD_TABLE # Reward schedule used for training experiences (see features.rewards)
         self.teams = [DraftState.BLUE_TEAM, DraftState.RED_TEAM]
 
         self.N_TEMP_TRAIN_MATCHES = 25
         self.TEMP_TRAIN_PATCHES = ["8.13","8.14","8.15"]
 
-    def train(self):
+    def train(self, checkpoint_dir=None, checkpoint_interval=1):
         """
         Core training loop over epochs
+        Args:
+            checkpoint_dir (str, optional): directory to write trainer checkpoints to. If it already holds a checkpoint, training
+                is resumed from it.
+            checkpoint_interval (int): number of epochs between trainer checkpoints
         """
         self.target_update_frequency = 10000 # How often to update target network
 
@@ -79,10 +186,11 @@ class DDQNTrainer(BaseTrainer):
         lr_decay_freq = 10 # Decay learning rate after a set number of epochs
         min_learning_rate = 1.e-8 # Minimum learning rate allowed to decay to
 
-        summaries = {}
-        summaries["loss"] = []
-        summaries["train_acc"] = []
-        summaries["val_acc"] = []
+        self.summaries = {}
+        self.summaries["loss"] = []
+        self.summaries["train_acc"] = []
+        self.summaries["val_acc"] = []
+        self.start_epoch = 0
         # Load existing model
         self.ddq_net.sess.run(self.ddq_net.online_ops["init"])
         if(self.load_path):
@@ -92,7 +200,12 @@ class DDQNTrainer(BaseTrainer):
         # Initialize target network
         self.ddq_net.sess.run(self.ddq_net.target_ops["target_init"])
 
-        for self.epoch_count in range(self.n_epoch):
+        # Resume from trainer checkpoint
+        if(checkpoint_dir):
+            self.restore_checkpoint(checkpoint_dir)
+        summaries = self.summaries
+
+        for self.epoch_count in range(self.start_epoch, self.n_epoch):
             t0 = time.time()
             learning_rate = self.ddq_net.online_ops["learning_rate"].eval(self.ddq_net.sess)
             if((self.epoch_count>0) and (self.epoch_count % lr_decay_freq == 0) and (learning_rate>= min_learning_rate)):
@@ -101,6 +214,7 @@ class DDQNTrainer(BaseTrainer):
                 self.ddq_net.sess.run(self.ddq_net.online_ops["learning_rate"].assign(learning_rate))
 
             # Run single epoch of training
+            self.profiler.start_epoch(self.epoch_count+1)
             loss, train_acc, val_acc = self.train_epoch()
             dt = time.time()-t0
 
@@ -113,9 +227,17 @@ class DDQNTrainer(BaseTrainer):
                 if(self.epoch_count>0 and (self.epoch_count+1)%model_stash_interval==0):
                     # Stash a copy of the current model
                     out_path = "tmp/models/{}_model_E{}.ckpt".format(self.ddq_net._name, self.epoch_count+1)
-                    self.ddq_net.save(path=out_path)
+                    with self.profiler.phase("checkpoint"):
+                        self.ddq_net.save(path=out_path)
                     print("Stashed a copy of the current model in {}".format(out_path))
-
+            if(checkpoint_dir and (self.epoch_count+1)%checkpoint_interval==0):
+                with self.profiler.phase("checkpoint"):
+                    self.save_checkpoint(checkpoint_dir)
+            self.profiler.end_epoch()
+            if(self.finished()):
+                break
+
+        self.profiler.close()
         self.ddq_net.save(path=self.ddq_net._path_to_model)
         return summaries
 
@@ -123,10 +245,6 @@ class DDQNTrainer(BaseTrainer):
         """
         Training loop for a single epoch
         """
-        # We can't validate a winner for submissions generated by the learner,
-        # so we will use a winner-less match when getting rewards for such states
-        blank_match = {"winner":None}
-
         learner_submitted_actions = 0
         null_actions = 0
 
@@ -135,78 +253,162 @@ class DDQNTrainer(BaseTrainer):
             path_to_db = "../data/competitiveMatchData.db"
             sources = {"patches":self.TEMP_TRAIN_PATCHES, "tournaments":[]}
             print("Adding {} matches to training pool from {}.".format(self.N_TEMP_TRAIN_MATCHES, path_to_db))
-            temp_matches = pool.match_pool(self.N_TEMP_TRAIN_MATCHES, path_to_db, randomize=True, match_sources=sources)["matches"]
+            with self.profiler.phase("load_matches"):
+                temp_matches = pool.match_pool(self.N_TEMP_TRAIN_MATCHES, path_to_db, randomize=True, match_sources=sources)["matches"]
         else:
             temp_matches = []
         data = self.training_data + temp_matches
 
         shuffled_matches = random.sample(data, len(data))
         for match in shuffled_matches:
+            if(self.finished()):
+                break
+            # Process match into individual experiences for both teams
+            with self.profiler.phase("process_match"):
+                match_experiences = mp.process_match_dual(match, reward_table=self.reward_table)
+            # Some experiences include NULL submissions (usually missing bans)
+            # The learner isn't allowed to submit NULL picks so skip adding these
+            # to the buffer.
+            experiences = []
             for team in self.teams:
-                # Process match into individual experiences
-                experiences = mp.process_match(match, team)
-                for pick_id, experience in enumerate(experiences):
-                    # Some experiences include NULL submissions (usually missing bans)
-                    # The learner isn't allowed to submit NULL picks so skip adding these
-                    # to the buffer.
-                    state,actual,_,_ = experience
-                    (cid,pos) = actual
-                    if cid is None:
+                for experience in match_experiences[team]:
+                    if experience[1][0] is None:
                         null_actions += 1
-                        continue
-                    # Store original experience
-                    self.replay.store([experience])
-                    self.step_count += 1
-
-                    # Give model feedback on current estimations
-                    if(self.step_count > self.observations):
-                        # Let the network predict the next action
-                        feed_dict = {self.ddq_net.online_ops["input"]:[state.format_state()],
-                                     self.ddq_net.online_ops["valid_actions"]:[state.get_valid_actions()]}
-                        q_vals = self.ddq_net.sess.run(self.ddq_net.online_ops["valid_outQ"], feed_dict=feed_dict)
-                        sorted_actions = q_vals[0,:].argsort()[::-1]
-                        top_actions = sorted_actions[0:4]
-
-                        if(random.random() < self.epsilon):
-                            pred_act = random.sample(list(top_actions), 1)
-                        else:
-                            # Use model's top prediction
-                            pred_act = [sorted_actions[0]]
-
-                        for action in pred_act:
-                            (cid,pos) = state.format_action(action)
-                            if((cid,pos)!=actual):
-                                pred_state = deepcopy(state)
-                                pred_state.update(cid,pos)
-                                r = get_reward(pred_state, blank_match, (cid,pos), actual)
-                                new_experience = (state, (cid,pos), r, pred_state)
-
-                                self.replay.store([new_experience])
-                                learner_submitted_actions += 1
-
-                    if(self.epsilon > 0.1):
-                        # Reduce epsilon over time
-                        self.epsilon -= self.eps_decay_rate
-
-                    # Use minibatch sample to update online network
-                    if(self.step_count > self.pre_training_steps):
-                        self.train_step()
-
-                    if(self.step_count % self.target_update_frequency == 0):
-                        # After the online network has been updated, update target network
+                    else:
+                        experiences.append(experience)
+
+            # Learner actions for every state in the match are chosen from a single batched evaluation of the
+            # online network before any of the match's experiences are trained on
+            learner_experiences = {}
+            if(self.step_count+len(experiences) > self.observations):
+                learner_actions = self.choose_learner_actions([experience[0] for experience in experiences])
+                # Only experiences stored after the observation period are given learner feedback
+                first = max(0, self.observations-self.step_count)
+                learner_experiences = self.build_learner_experiences(experiences, learner_actions, first)
+
+            for k, experience in enumerate(experiences):
+                state,actual,_,_ = experience
+                # Store original experience
+                with self.profiler.phase("replay_store"):
+                    self.replay.store([pack_experience(experience)])
+                self.step_count += 1
+                self.profiler.set_step(self.step_count)
+
+                # Give model feedback on current estimations
+                if(k in learner_experiences):
+                    with self.profiler.phase("replay_store"):
+                        self.replay.store([pack_experience(learner_experiences[k])])
+                    learner_submitted_actions += 1
+
+                if(self.epsilon > 0.1):
+                    # Reduce epsilon over time
+                    self.epsilon -= self.eps_decay_rate
+
+                # Use minibatch sample to update online network
+                if(self.step_count > self.pre_training_steps):
+                    self.train_step()
+
+                if(self.step_count % self.target_update_frequency == 0):
+                    # After the online network has been updated, update target network
+                    with self.profiler.phase("target_update"):
                         _ = self.ddq_net.sess.run(self.ddq_net.target_ops["target_update"])
 
         # Get training loss, training_acc, and val_acc to return
-        loss, train_acc = self.validate_model(self.training_data)
-        _, val_acc = self.validate_model(self.validation_data)
+        with self.profiler.phase("validation"):
+            loss, train_acc = self.validate_model(self.training_data)
+            _, val_acc = self.validate_model(self.validation_data)
         return (loss, train_acc, val_acc)
 
+    def choose_learner_actions(self, states, n_top=4):
+        """
+        Chooses the actions submitted by the learner from each of a batch of states. With probability epsilon the learner submits
+        one of the n_top actions with highest estimated Q-value (chosen uniformly), otherwise it submits the highest valued action.
+        Args:
+            states (list(DraftState)): states to choose actions from
+            n_top (int): number of highest valued actions explored from
+        Returns:
+            actions (numpy array): index of chosen action for each state
+        """
+        feed_dict = self.ddq_net.state_feed(self.ddq_net.online_ops, states)
+        feed_dict[self.ddq_net.online_ops["valid_actions"]] = np.stack([state.get_valid_actions() for state in states], axis=0)
+        with self.profiler.phase("learner_predict"):
+            q_vals = self.profiler.run(self.ddq_net.sess, self.ddq_net.online_ops["valid_outQ"], feed_dict=feed_dict, name="learner_predict")
+        n_states = len(states)
+        best_actions = np.argmax(q_vals, axis=1)
+        top_actions = np.argpartition(-q_vals, n_top-1, axis=1)[:,:n_top]
+        explored_actions = top_actions[np.arange(n_states), np.random.randint(0, n_top, size=n_states)]
+        explore = np.random.random(n_states) < self.epsilon
+        return np.where(explore, explored_actions, best_actions)
+
+    def build_learner_experiences(self, experiences, learner_actions, first=0):
+        """
+        Builds the experiences resulting from the learner submitting its own actions in place of the observed ones.
+        Args:
+            experiences (list(tuple)): observed experiences of the form (s, a, r, s')
+            learner_actions (array of ints): index of action chosen by the learner from each state s
+            first (int): index of first experience to build a learner experience for
+        Returns:
+            learner_experiences (dict): dictionary mapping index k to the experience (s, a_learner, r, s_learner) for every experience
+                from first on where the learner's action differs from the observed action
+        """
+        indices = []
+        transitions = []
+        for k in range(first, len(experiences)):
+            (state, actual, _, _) = experiences[k]
+            (cid,pos) = state.format_action(learner_actions[k])
+            if((cid,pos)!=actual):
+                with self.profiler.phase("copy"):
+                    pred_state = state.copy()
+                pred_state.update(cid,pos)
+                indices.append(k)
+                transitions.append((state, (cid,pos), pred_state))
+        if not transitions:
+            return {}
+
+        # We can't validate a winner for submissions generated by the learner, so these are always rewarded as if the winner is unknown
+        with self.profiler.phase("reward"):
+            status = [pred_state.evaluate() for (_, _, pred_state) in transitions]
+            teams = [state.team for (state, _, _) in transitions]
+            submitted = [learner_actions[k] for k in indices]
+            actual = [experiences[k][0].get_action(*experiences[k][1]) for k in indices]
+            rewards = get_rewards(status, teams, [-1]*len(indices), submitted, actual, self.reward_table).tolist()
+        return {k:(state, action, r, pred_state) for k, (state, action, pred_state), r in zip(indices, transitions, rewards)}
+
+    def finished(self):
+        """
+        Returns True if the trainer has taken max_steps steps.
+        """
+        return self.max_steps is not None and self.step_count >= self.max_steps
+
+    def get_network(self):
+        return self.ddq_net
+
+    def get_checkpoint_state(self):
+        return {"next_epoch":self.epoch_count+1,
+                "step_count":self.step_count,
+                "epsilon":self.epsilon,
+                "dampen_states":self.dampen_states,
+                "summaries":{key:[float(v) for v in values] for key, values in self.summaries.items()}}
+
+    def set_checkpoint_state(self, state):
+        self.start_epoch = state["next_epoch"]
+        self.step_count = state["step_count"]
+        self.epsilon = state["epsilon"]
+        self.dampen_states = state["dampen_states"]
+        self.summaries = state["summaries"]
+
+    def get_checkpoint_buffers(self):
+        return {"replay":self.replay}
+
     def train_step(self):
         """
         Training logic for a single mini-batch update sampled from replay
         """
-        # Sample training batch from replay
-        training_batch = self.replay.sample(self.batch_size)
+        # Sample training batch from replay. Experiences are stored with their states packed (see
+        # features.state_encoding) and are only expanded to dense inputs inside the network.
+        with self.profiler.phase("replay_sample"):
+            training_batch = self.replay.sample(self.batch_size)
+            batch = stack_packed_experiences(training_batch, self.state_size, self.num_actions)
 
         # Calculate target Q values for each example:
         # For non-terminal states, targetQ is estimated according to
@@ -214,40 +416,35 @@ class DDQNTrainer(BaseTrainer):
         # where Q' denotes the target network.
         # For terminating states the target is computed as
         #   targetQ = r
-        updates = []
-        for exp in training_batch:
-            start,_,reward,end = exp
-            if(self.dampen_states):
-                # To dampen states (usually done after major patches or when the meta shifts)
-                # we replace winning rewards with 0.
-                reward = 0.
-            state_code = end.evaluate()
-            if(state_code==DraftState.DRAFT_COMPLETE or state_code in DraftState.invalid_states):
-                # Action moves to terminal state
-                updates.append(reward)
-            else:
-                # Follwing double DQN paper (https://arxiv.org/abs/1509.06461).
-                #  Action is chosen by online network, but the target network is used to evaluate this policy.
-                # Each row in predicted_Q gives estimated Q(s',a) values for all possible actions for the input state s'.
-                feed_dict = {self.ddq_net.online_ops["input"]:[end.format_state()],
-                             self.ddq_net.online_ops["valid_actions"]:[end.get_valid_actions()]}
-                predicted_action = self.ddq_net.sess.run(self.ddq_net.online_ops["prediction"], feed_dict=feed_dict)[0]
-
-                feed_dict = {self.ddq_net.target_ops["input"]:[end.format_state()]}
-                predicted_Q = self.ddq_net.sess.run(self.ddq_net.target_ops["outQ"], feed_dict=feed_dict)
-
-                updates.append(reward + self.ddq_net.discount_factor*predicted_Q[0,predicted_action])
+        rewards = batch["rewards"]
+        if(self.dampen_states):
+            # To dampen states (usually done after major patches or when the meta shifts)
+            # we replace winning rewards with 0.
+            rewards = np.zeros_like(rewards)
+        targetQ = np.array(rewards)
+        non_terminal = np.logical_not(batch["is_terminal"])
+        if(np.any(non_terminal)):
+            # Follwing double DQN paper (https://arxiv.org/abs/1509.06461).
+            #  Action is chosen by online network, but the target network is used to evaluate this policy.
+            # Each row in predicted_Q gives estimated Q(s',a) values for all possible actions for the input state s'.
+            next_states = batch["next_states"][non_terminal]
+            feed_dict = {self.ddq_net.online_ops["packed_input"]:next_states,
+                         self.ddq_net.online_ops["valid_actions"]:batch["next_valid_actions"][non_terminal]}
+            with self.profiler.phase("target_q"):
+                predicted_action = self.profiler.run(self.ddq_net.sess, self.ddq_net.online_ops["prediction"], feed_dict=feed_dict, name="target_action")
+
+                feed_dict = {self.ddq_net.target_ops["packed_input"]:next_states}
+                predicted_Q = self.profiler.run(self.ddq_net.sess, self.ddq_net.target_ops["outQ"], feed_dict=feed_dict, name="target_q")
+
+            targetQ[non_terminal] = rewards[non_terminal] + self.ddq_net.discount_factor*predicted_Q[np.arange(len(predicted_action)),predicted_action]
 
         # Update online net using target Q
-        # Experience replay stores action = (champion_id, position) pairs
-        # these need to be converted into the corresponding index of the input vector to the Qnet
-        actions = np.array([start.get_action(*exp[1]) for exp in training_batch])
-        targetQ = np.array(updates)
-        feed_dict = {self.ddq_net.online_ops["input"]:np.stack([exp[0].format_state() for exp in training_batch],axis=0),
-                     self.ddq_net.online_ops["actions"]:actions,
+        feed_dict = {self.ddq_net.online_ops["packed_input"]:batch["states"],
+                     self.ddq_net.online_ops["actions"]:batch["actions"],
                      self.ddq_net.online_ops["target"]:targetQ,
                      self.ddq_net.online_ops["dropout_keep_prob"]:0.5}
-        _ = self.ddq_net.sess.run(self.ddq_net.online_ops["update"],feed_dict=feed_dict)
+        with self.profiler.phase("update"):
+            _ = self.profiler.run(self.ddq_net.sess, self.ddq_net.online_ops["update"], feed_dict=feed_dict, name="update")
 
     def validate_model(self, data):
         """
@@ -272,30 +469,28 @@ class DDQNTrainer(BaseTrainer):
                 buf.append(exp)
 
         n_exp = len(buf)
-        targets = []
-        for exp in buf:
-            start,_,reward,end = exp
-            state_code = end.evaluate()
-            if(state_code==DraftState.DRAFT_COMPLETE or state_code in DraftState.invalid_states):
-                # Action moves to terminal state
-                targets.append(reward)
-            else:
-                feed_dict = {self.ddq_net.online_ops["input"]:[end.format_state()],
-                             self.ddq_net.online_ops["valid_actions"]:[end.get_valid_actions()]}
-                predicted_action = self.ddq_net.sess.run(self.ddq_net.online_ops["prediction"], feed_dict=feed_dict)[0]
-
-                feed_dict = {self.ddq_net.target_ops["input"]:[end.format_state()]}
-                predicted_Q = self.ddq_net.sess.run(self.ddq_net.target_ops["outQ"], feed_dict=feed_dict)
-
-                targets.append(reward + self.ddq_net.discount_factor*predicted_Q[0,predicted_action])
-
-        actions = np.array([start.get_action(*exp[1]) for exp in buf])
-        targets = np.array(targets)
-
-        feed_dict = {self.ddq_net.online_ops["input"]:np.stack([exp[0].format_state() for exp in buf],axis=0),
-                     self.ddq_net.online_ops["actions"]:actions,
-                     self.ddq_net.online_ops["target"]:targets,
-                     self.ddq_net.online_ops["valid_actions"]:np.stack([exp[0].get_valid_actions() for exp in buf],axis=0)}
+        (starts, submissions, rewards, ends) = zip(*buf)
+        # Actions moving to terminal states are valued by their reward alone, the rest are valued using the target network
+        # (as in train_step()) with all of their next states evaluated in a single batch.
+        targets = np.array(rewards, dtype=np.float32)
+        status = [end.evaluate() for end in ends]
+        non_terminal = [k for k in range(n_exp) if not (status[k]==DraftState.DRAFT_COMPLETE or status[k] in DraftState.invalid_states)]
+        if non_terminal:
+            next_states = [ends[k] for k in non_terminal]
+            feed_dict = self.ddq_net.state_feed(self.ddq_net.online_ops, next_states)
+            feed_dict[self.ddq_net.online_ops["valid_actions"]] = np.stack([end.get_valid_actions() for end in next_states], axis=0)
+            predicted_action = self.ddq_net.sess.run(self.ddq_net.online_ops["prediction"], feed_dict=feed_dict)
+
+            feed_dict = self.ddq_net.state_feed(self.ddq_net.target_ops, next_states)
+            predicted_Q = self.ddq_net.sess.run(self.ddq_net.target_ops["outQ"], feed_dict=feed_dict)
+            targets[non_terminal] += self.ddq_net.discount_factor*predicted_Q[np.arange(len(non_terminal)), predicted_action]
+
+        actions = np.array([start.get_action(*submission) for (start, submission) in zip(starts, submissions)])
+
+        feed_dict = self.ddq_net.state_feed(self.ddq_net.online_ops, starts)
+        feed_dict.update({self.ddq_net.online_ops["actions"]:actions,
+                          self.ddq_net.online_ops["target"]:targets,
+                          self.ddq_net.online_ops["valid_actions"]:np.stack([start.get_valid_actions() for start in starts], axis=0)})
 
         loss, pred_q = self.ddq_net.sess.run([self.ddq_net.online_ops["loss"], self.ddq_net.online_ops["valid_outQ"]],feed_dict=feed_dict)
 
@@ -319,7 +514,7 @@ class DDQNTrainer(BaseTrainer):
         return (loss, accuracy)
 
 class SoftmaxTrainer(BaseTrainer):
-    def __init__(self, network, n_epoch, training_data, validation_data, batch_size, load_path=None):
+    def __init__(self, network, n_epoch, training_data, validation_data, batch_size, load_path=None, profiler=None, max_steps=None, datasets=None, use_input_pipeline=True):
         num_episodes = len(training_data)
         print("***")
         print("Beginning training..")
@@ -334,46 +529,92 @@ class SoftmaxTrainer(BaseTrainer):
         self.validation_data = validation_data
         self.batch_size = batch_size
         self.load_path = load_path
+        self.profiler = profiler if profiler else StepProfiler(enabled=False)
+        self.max_steps = max_steps
+        # If set, training batches are drawn from the network's input pipeline rather than being sampled and fed each step
+        self.use_input_pipeline = use_input_pipeline
 
         self.step_count = 0
         self.epoch_count = 0
 
         self.teams = [DraftState.BLUE_TEAM, DraftState.RED_TEAM]
+        template = DraftState(DraftState.BLUE_TEAM)
+        self.state_size = template.state.size
+        self.num_actions = template.num_actions
 
         self._buffer = er.ExperienceBuffer(max_buffer_size=20*len(training_data))
         self._val_buffer = er.ExperienceBuffer(max_buffer_size=20*len(validation_data))
 
-        self.fill_buffer(training_data, self._buffer)
-        self.fill_buffer(validation_data, self._val_buffer)
+        # Precompiled (training, validation) datasets are read in place rather than being copied into the buffers
+        self.datasets = datasets
+        if(not datasets):
+            self.fill_buffer(training_data, self._buffer)
+            self.fill_buffer(validation_data, self._val_buffer)
 
     def fill_buffer(self, data, buf):
         for match in data:
+            with self.profiler.phase("process_match"):
+                match_experiences = mp.process_match_dual(match)
             for team in self.teams:
-                experiences = mp.process_match(match, team)
+                experiences = match_experiences[team]
                 # remove null actions (usually missing bans)
                 for exp in experiences:
                     _,act,_,_ = exp
                     cid,pos = act
                     if(cid):
-                        buf.store([exp])
+                        buf.store([pack_experience(exp)])
+
+    def init_input_pipeline(self):
+        """
+        Loads the (fixed) training experiences into the network's input pipeline. When training from a compiled dataset its
+        memory mapped arrays are fed directly.
+        """
+        if(self.datasets):
+            (training_dataset, _) = self.datasets
+            arrays = {"states":training_dataset["state"],
+                      "actions":training_dataset["action"],
+                      "valid_actions":training_dataset["valid_actions"]}
+        else:
+            arrays = packed_experiences_to_arrays(self._buffer.buffer)
+        self.model.init_input_pipeline(arrays["states"], arrays["actions"], arrays["valid_actions"], self.batch_size)
+
+    def num_training_experiences(self):
+        if(self.datasets):
+            return len(self.datasets[0])
+        return self._buffer.buffer_size
 
     def sample_buffer(self, buf, n_samples):
-        experiences = buf.sample(n_samples)
-        states = []
-        actions = []
-        valid_actions = []
-        for (state, action, _, _) in experiences:
-            states.append(state.format_state())
-            valid_actions.append(state.get_valid_actions())
-            actions.append(state.get_action(*action))
-
-        return (states, actions, valid_actions)
-
-    def train(self):
-        summaries = {}
-        summaries["loss"] = []
-        summaries["train_acc"] = []
-        summaries["val_acc"] = []
+        with self.profiler.phase("replay_sample"):
+            experiences = buf.sample(n_samples)
+            batch = stack_packed_experiences(experiences, self.state_size, self.num_actions)
+        return (batch["states"], batch["actions"], batch["valid_actions"])
+
+    def sample_dataset(self, dataset, n_samples=None):
+        """
+        Returns packed states, actions and (unpacked) valid action masks for experiences in a compiled dataset. If n_samples
+        is None every experience is returned, with the states and actions read straight from the dataset's memory maps.
+        """
+        with self.profiler.phase("replay_sample"):
+            if n_samples is None:
+                indices = slice(None)
+            else:
+                indices = np.sort(np.random.choice(len(dataset), n_samples, replace=False))
+            valid_actions = unpack_bits(dataset["valid_actions"][indices], self.num_actions)
+        return (dataset["state"][indices], dataset["action"][indices], valid_actions)
+
+    def train(self, checkpoint_dir=None, checkpoint_interval=1):
+        """
+        Core training loop over epochs
+        Args:
+            checkpoint_dir (str, optional): directory to write trainer checkpoints to. If it already holds a checkpoint, training
+                is resumed from it.
+            checkpoint_interval (int): number of epochs between trainer checkpoints
+        """
+        self.summaries = {}
+        self.summaries["loss"] = []
+        self.summaries["train_acc"] = []
+        self.summaries["val_acc"] = []
+        self.start_epoch = 0
 
         lr_decay_freq = 10
         min_learning_rate = 1.e-8 # Minimum learning rate allowed to decay to
@@ -387,7 +628,15 @@ class SoftmaxTrainer(BaseTrainer):
             self.model.load(self.load_path)
             print("\nCheckpoint loaded from {}".format(self.load_path))
 
-        for self.epoch_count in range(self.n_epoch):
+        # Resume from trainer checkpoint
+        if(checkpoint_dir):
+            self.restore_checkpoint(checkpoint_dir)
+        summaries = self.summaries
+
+        if(self.use_input_pipeline):
+            self.init_input_pipeline()
+
+        for self.epoch_count in range(self.start_epoch, self.n_epoch):
             learning_rate = self.model.ops_dict["learning_rate"].eval(self.model.sess)
             if((self.epoch_count>0) and (self.epoch_count % lr_decay_freq == 0) and (learning_rate>= min_learning_rate)):
                 # Decay learning rate accoring to schedule
@@ -395,6 +644,7 @@ class SoftmaxTrainer(BaseTrainer):
                 self.model.sess.run(self.model.ops_dict["learning_rate"].assign(learning_rate))
 
             t0 =  time.time()
+            self.profiler.start_epoch(self.epoch_count+1)
             loss, train_acc, val_acc = self.train_epoch()
             dt = time.time()-t0
             print(" Finished epoch {:2}/{}: lr: {:.4e}, dt {:.2f}, loss {:.6f}, train {:.6f}, val {:.6f}".format(self.epoch_count+1, self.n_epoch, learning_rate, dt, loss, train_acc, val_acc), flush=True)
@@ -406,37 +656,96 @@ class SoftmaxTrainer(BaseTrainer):
                 if(self.epoch_count>0 and (self.epoch_count+1)%model_stash_interval==0):
                     # Stash a copy of the current model
                     out_path = "tmp/models/{}_model_E{}.ckpt".format(self.model._name, self.epoch_count+1)
-                    self.model.save(path=out_path)
+                    with self.profiler.phase("checkpoint"):
+                        self.model.save(path=out_path)
                     print("Stashed a copy of the current model in {}".format(out_path))
-
+            if(checkpoint_dir and (self.epoch_count+1)%checkpoint_interval==0):
+                with self.profiler.phase("checkpoint"):
+                    self.save_checkpoint(checkpoint_dir)
+            self.profiler.end_epoch()
+            if(self.finished()):
+                break
+
+        self.profiler.close()
         self.model.save(path=self.model._path_to_model)
         return summaries
 
     def train_epoch(self):
-        n_iter = self._buffer.buffer_size // self.batch_size
+        n_iter = self.num_training_experiences() // self.batch_size
 
         for it in range(n_iter):
+            if(self.finished()):
+                break
+            self.step_count += 1
+            self.profiler.set_step(self.step_count)
             self.train_step()
 
-        loss, train_acc = self.validate_model(self._buffer)
-        _, val_acc = self.validate_model(self._val_buffer)
+        with self.profiler.phase("validation"):
+            if(self.datasets):
+                (training_dataset, validation_dataset) = self.datasets
+                loss, train_acc = self.validate_model(self.sample_dataset(training_dataset))
+                _, val_acc = self.validate_model(self.sample_dataset(validation_dataset))
+            else:
+                loss, train_acc = self.validate_model(self.sample_buffer(self._buffer, self._buffer.get_buffer_size()))
+                _, val_acc = self.validate_model(self.sample_buffer(self._val_buffer, self._val_buffer.get_buffer_size()))
 
         return (loss, train_acc, val_acc)
 
-    def train_step(self):
-        states, actions, valid_actions = self.sample_buffer(self._buffer, self.batch_size)
+    def finished(self):
+        """
+        Returns True if the trainer has taken max_steps steps.
+        """
+        return self.max_steps is not None and self.step_count >= self.max_steps
+
+    def get_network(self):
+        return self.model
+
+    def get_checkpoint_state(self):
+        return {"next_epoch":self.epoch_count+1,
+                "step_count":self.step_count,
+                "summaries":{key:[float(v) for v in values] for key, values in self.summaries.items()}}
 
-        feed_dict = {self.model.ops_dict["input"]:np.stack(states, axis=0),
-                     self.model.ops_dict["valid_actions"]:np.stack(valid_actions, axis=0),
-                     self.model.ops_dict["actions"]:actions,
-                     self.model.ops_dict["dropout_keep_prob"]:0.5}
-        _  = self.model.sess.run(self.model.ops_dict["update"], feed_dict=feed_dict)
+    def set_checkpoint_state(self, state):
+        self.start_epoch = state["next_epoch"]
+        self.step_count = state["step_count"]
+        self.summaries = state["summaries"]
 
-    def validate_model(self, buf):
-        states, actions, valid_actions = self.sample_buffer(buf, buf.get_buffer_size())
+    def get_checkpoint_buffers(self):
+        if(self.datasets):
+            # The compiled datasets are read only, so there's nothing to save
+            return {}
+        return {"train":self._buffer, "validation":self._val_buffer}
+
+    def train_step(self):
+        if(self.use_input_pipeline):
+            # Inputs are drawn from the pipeline inside the graph
+            update = self.model.ops_dict["pipeline_update"]
+            feed_dict = {self.model.ops_dict["dropout_keep_prob"]:0.5}
+        else:
+            update = self.model.ops_dict["update"]
+            if(self.datasets):
+                states, actions, valid_actions = self.sample_dataset(self.datasets[0], self.batch_size)
+            else:
+                states, actions, valid_actions = self.sample_buffer(self._buffer, self.batch_size)
+            feed_dict = {self.model.ops_dict["packed_input"]:states,
+                         self.model.ops_dict["valid_actions"]:valid_actions,
+                         self.model.ops_dict["actions"]:actions,
+                         self.model.ops_dict["dropout_keep_prob"]:0.5}
+        with self.profiler.phase("update"):
+            _  = self.profiler.run(self.model.sess, update, feed_dict=feed_dict, name="update")
+
+    def validate_model(self, experiences):
+        """
+        Computes the loss and top 5 accuracy of the model over a set of experiences.
+        Args:
+            experiences (tuple): (states, actions, valid_actions) arrays as returned by sample_buffer() or sample_dataset()
+        Returns:
+            stats (tuple(float)): (loss, accuracy)
+        """
+        states, actions, valid_actions = experiences
 
-        feed_dict = {self.model.ops_dict["input"]:np.stack(states, axis=0),
-                     self.model.ops_dict["valid_actions"]:np.stack(valid_actions, axis=0),
+        feed_dict = {self.model.ops_dict["packed_input"]:states,
+                     self.model.ops_dict["valid_actions"]:valid_actions,
                      self.model.ops_dict["actions"]:actions}
         loss, train_probs = self.model.sess.run([self.model.ops_dict["loss"], self.model.ops_dict["probabilities"]], feed_dict=feed_dict)
 
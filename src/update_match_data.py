@@ -3,9 +3,12 @@ import requests
 import json
 import time
 import sqlite3
+import os
 from data.create_database import create_tables
 import data.database_ops as dbo
 from data.query_wiki import query_wiki
+from data.champion_index import ChampionIndex
+from data.draft_stats import DraftStatistics
 
 class CreateMatchDB(luigi.Task):
     path_to_db = luigi.Parameter(default="../data/competitiveMatchData.db")
@@ -41,6 +44,32 @@ class CreateMatchDB(luigi.Task):
 
         return 1
 
+def load_synced(cls, path, cursor, recorded_ids, **kwargs):
+    """
+    Loads the index or statistics pickled at path and brings them up to date with the games in the database. Saved data is
+    only reused if every game it holds is still in the database, otherwise it is rebuilt from scratch (in game id order).
+    Args:
+        cls (class): ChampionIndex or DraftStatistics
+        path (str): path the index or statistics are saved to
+        cursor (sqlite cursor): cursor used to execute commands
+        recorded_ids (function): returns the set of game ids held by a loaded object
+        kwargs: arguments used to construct a new object
+    Returns:
+        obj: the up to date index or statistics
+    """
+    cursor.execute("SELECT id FROM game")
+    game_ids = set(row[0] for row in cursor.fetchall())
+    obj = None
+    if os.path.exists(path):
+        obj = cls.load(path)
+        if not recorded_ids(obj) <= game_ids:
+            print("{} holds games which are no longer in the database.. rebuilding".format(path))
+            obj = None
+    if obj is None:
+        obj = cls(**kwargs)
+    obj.update(cursor)
+    return obj
+
 def validate_match_data(match_data):
     """
     validate_match_data performs basic match data validation by examining the following:
@@ -94,6 +123,15 @@ if __name__ == "__main__":
     conn = sqlite3.connect(path_to_db)
     cur = conn.cursor()
 
+    # Load the index and statistics saved by previous runs (catching up on any games added since), then keep them in sync
+    # as new games are committed. Games inserted by this script are recorded into the statistics' rolling windows in the
+    # order they are ingested.
+    path_to_index = "../data/champion_index.pkl"
+    champion_index = load_synced(ChampionIndex, path_to_index, cur, lambda index: set(index.game_ids))
+    path_to_stats = "../data/draft_stats.pkl"
+    draft_stats = load_synced(DraftStatistics, path_to_stats, cur, lambda stats: stats.recorded_ids(),
+                              windows=(100, 500))
+
 #    deleted_match_ids = [770]
 #    dbo.delete_game_from_table(cur, game_ids = deleted_match_ids, table_name="pick")
 #    dbo.delete_game_from_table(cur, game_ids = deleted_match_ids, table_name="ban")
@@ -126,10 +164,13 @@ if __name__ == "__main__":
                     print("Attempting to insert {} games..".format(len(gameData)))
                     status = dbo.insert_team(cur,gameData)
                     status = dbo.insert_game(cur,gameData)
-                    status = dbo.insert_ban(cur,gameData)
-                    status = dbo.insert_pick(cur,gameData)
+                    status = dbo.insert_ban(cur,gameData,stats=draft_stats)
+                    status = dbo.insert_pick(cur,gameData,stats=draft_stats)
                     print("Committing changes to db..")
                     conn.commit()
+                    print("Indexed {} new games.".format(champion_index.update(cur)))
+                    champion_index.save(path_to_index)
+                    draft_stats.save(path_to_stats)
                 else:
                     print("Errors found in match data.. skipping commit")
                     raise